@@ -7,8 +7,9 @@ import re
 
 from app.core.security import create_access_token, verify_password
 from app.core.config import settings
-from app.db.session import get_user_db
-from app.services.auth_service import authenticate_user, create_user, get_user_by_username, is_password_unique
+from app.core.executors import run_db, run_hashing
+from app.core.dependencies import get_current_user
+from app.services.auth_service import authenticate_user, create_user, get_user_by_username, get_user_by_email, is_password_unique
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
@@ -18,7 +19,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 @router.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     print(f"Login attempt: {form_data.username}")
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await run_hashing(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,29 +75,28 @@ async def register_user(
         )
     
     # Check if password is unique
-    if not is_password_unique(password):
+    if not await run_hashing(is_password_unique, password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This password is already in use by another user"
         )
     
     # Check if username already exists (case-insensitive)
-    users_db = get_user_db()
-    if any(user["username"].lower() == username.lower() for user in users_db):
+    if await run_db(get_user_by_username, username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
     # Check if email already exists
-    if any(user["email"] == email for user in users_db):
+    if await run_db(get_user_by_email, email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     try:
-        user = create_user(username, email, password)
+        user = await run_hashing(create_user, username, email, password)
         return {"username": user["username"], "email": user["email"], "message": "User created successfully"}
     except ValueError as e:
         raise HTTPException(
@@ -110,30 +110,8 @@ async def register_user(
         )
 
 @router.get("/users/me")
-async def read_users_me(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    user = get_user_by_username(username)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    
+async def read_users_me(user: Dict = Depends(get_current_user)):
+    # Token verification and user lookup are shared with (and cached by) get_current_user
     # Remove sensitive information
     safe_user = {k: v for k, v in user.items() if k != "hashed_password" and k != "plain_password"}
     return safe_user
@@ -1,14 +1,16 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Body
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Body, Query, Response
+from typing import List, Dict, Any, Optional
 import uuid
 from datetime import datetime
 import asyncio
 from pydantic import BaseModel
 
 from app.core.dependencies import get_current_user
+from app.core.executors import run_db
 from app.db.session import get_chat_db
-from app.services.chat_service import create_chat, get_chats, add_message, get_chat
+from app.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.chat_service import create_chat, get_chats, get_chats_page, add_message, get_chat, get_messages_page
 from app.rag.rag_engine import process_query, retrieve_context
 
 router = APIRouter()
@@ -18,12 +20,27 @@ class MessageRequest(BaseModel):
 
 @router.post("/")
 async def create_new_chat(user: Dict[str, Any] = Depends(get_current_user)):
-    chat_id = create_chat(user["id"])
+    chat_id = await run_db(create_chat, user["id"])
     return {"chat_id": chat_id}
 
 @router.get("/")
-async def get_user_chats(user: Dict[str, Any] = Depends(get_current_user)):
-    chats = get_chats(user["id"])
+async def get_user_chats(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    # Without paging parameters keep returning the full list
+    if limit is None and cursor is None:
+        return await run_db(get_chats, user["id"])
+    
+    try:
+        chats, next_cursor = await run_db(get_chats_page, user["id"], limit or DEFAULT_PAGE_SIZE, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return chats
 
 @router.post("/{chat_id}/messages")
@@ -33,7 +50,7 @@ async def send_message(
     user: Dict[str, Any] = Depends(get_current_user)
 ):
     # Verify chat belongs to user
-    chat = get_chat(chat_id)
+    chat = await run_db(get_chat, chat_id, include_messages=False)
     if not chat or chat["user_id"] != user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -41,7 +58,7 @@ async def send_message(
         )
     
     # Add user message to chat
-    message_id = add_message(chat_id, "user", request.message)
+    message_id = await run_db(add_message, chat_id, "user", request.message)
     
     try:
         # Process query through RAG
@@ -49,7 +66,7 @@ async def send_message(
         response = await process_query(request.message, context)
         
         # Add assistant response
-        assistant_message_id = add_message(chat_id, "assistant", response)
+        assistant_message_id = await run_db(add_message, chat_id, "assistant", response)
         
         # Get the context texts for frontend display (optional)
         context_texts = context if context else []
@@ -63,7 +80,7 @@ async def send_message(
     except Exception as e:
         # Return a fallback response in case of processing error
         error_response = "I apologize, but I'm having trouble connecting to the analysis database. This demo version has limited functionality. Please try again later or sign up for the full experience."
-        assistant_message_id = add_message(chat_id, "assistant", error_response)
+        assistant_message_id = await run_db(add_message, chat_id, "assistant", error_response)
         return {
             "user_message_id": message_id,
             "assistant_message_id": assistant_message_id,
@@ -74,13 +91,31 @@ async def send_message(
 @router.get("/{chat_id}")
 async def get_chat_details(
     chat_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    latest: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Return the newest N messages"),
     user: Dict[str, Any] = Depends(get_current_user)
 ):
-    chat = get_chat(chat_id)
+    paged = limit is not None or cursor is not None or latest is not None
+    chat = await run_db(get_chat, chat_id, include_messages=not paged)
     if not chat or chat["user_id"] != user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found"
         )
     
+    if paged:
+        # Messages are always returned oldest first; with ``latest`` the
+        # cursor walks back towards older messages
+        try:
+            chat["messages"], next_cursor = await run_db(
+                get_messages_page, chat_id, latest or limit or DEFAULT_PAGE_SIZE, cursor, latest=latest is not None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    
     return chat
@@ -7,7 +7,8 @@ import psutil
 from typing import Dict, Any, List
 
 from app.core.dependencies import get_current_user
-from app.db.session import get_document_db, get_user_db, get_chat_db, get_message_db
+from app.core.executors import run_db
+from app.db.session import get_document_db, get_user_db, get_chat_db, get_storage_metrics
 from app.services.document_service import list_documents
 
 router = APIRouter()
@@ -16,10 +17,9 @@ router = APIRouter()
 async def get_dashboard_stats(user: Dict[str, Any] = Depends(get_current_user)):
     """Get dashboard statistics for the admin panel"""
     # Get database content
-    documents_db = get_document_db()
-    users_db = get_user_db()
-    chats_db = get_chat_db()
-    messages_db = get_message_db()
+    documents_db = await run_db(get_document_db)
+    users_db = await run_db(get_user_db)
+    chats_db = await run_db(get_chat_db)
     
     # Documents stats
     total_documents = len(documents_db)
@@ -129,6 +129,11 @@ async def get_dashboard_stats(user: Dict[str, Any] = Depends(get_current_user)):
         }
     }
 
+@router.get("/storage")
+async def get_storage_stats(user: Dict[str, Any] = Depends(get_current_user)):
+    """Get write path metrics (flushes, fsyncs, pending mutations) of the database"""
+    return await run_db(get_storage_metrics)
+
 def generate_recent_activity(users_db, documents_db):
     """Generate realistic recent activity data"""
     activity = []
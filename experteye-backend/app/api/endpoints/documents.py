@@ -1,26 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, BackgroundTasks
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
 import os
 import uuid
 from datetime import datetime
 import asyncio
 
 from app.core.dependencies import get_current_user
-from app.services.document_service import save_document, list_documents, get_document, delete_document
-from app.rag.processor_core import DocumentProcessor  # Using the updated import
+from app.core.executors import run_db, run_indexing
+from app.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.config import settings
+from app.core.progress import progress_bus
+from app.services.document_service import save_document, save_zip_documents, list_documents, list_documents_page, get_document, delete_document, find_sas_symbol, UploadTooLargeError
+from app.services.ingestion_service import (
+    ingest_document, ingest_documents, create_batch, get_batch_progress,
+    document_progress_event, is_final_document_event, is_final_batch_event
+)
+from app.services.rag_service import answer_dataset_question
+from app.rag.processor_core import SUPPORTED_EXTENSIONS
+from app.rag.sas_symbol_index import SYMBOL_KINDS
+from app.rag.structured_query import run_dataset_query, validate_query
 
 router = APIRouter()
 
-# Add the missing process_document function for background tasks
+# Server-sent events: no caching or proxy buffering of the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+class DatasetQueryRequest(BaseModel):
+    columns: List[str] = []
+    filters: List[List[Any]] = []
+    group_by: List[str] = []
+    aggregations: List[List[str]] = []
+    order_by: List[List[str]] = []
+    limit: Optional[int] = None
+
+class DatasetQuestionRequest(BaseModel):
+    question: str
+
 async def process_document(document_id: str):
     """Process document in the background"""
-    try:
-        # This function would typically call the document processor service
-        # to extract text, create embeddings, and store in vector database
-        print(f"Processing document {document_id} in background")
-        # In a real implementation, this would use the DocumentProcessor
-    except Exception as e:
-        print(f"Error processing document {document_id}: {str(e)}")
+    await ingest_document(document_id)
 
 @router.post("/upload")
 async def upload_document(
@@ -28,8 +48,8 @@ async def upload_document(
     background_tasks: BackgroundTasks = None,
     user: Dict[str, Any] = Depends(get_current_user)
 ):
-    # Check file type
-    allowed_extensions = [".pdf", ".docx", ".xlsx", ".pptx", ".txt", ".sas"]
+    # Check file type (only what the processor can extract)
+    allowed_extensions = SUPPORTED_EXTENSIONS
     file_ext = os.path.splitext(file.filename)[1].lower()
     
     if file_ext not in allowed_extensions:
@@ -39,7 +59,13 @@ async def upload_document(
         )
     
     # Save document
-    document_id = await save_document(file, user["id"])
+    try:
+        document_id = await save_document(file, user["id"])
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     
     # Process document in background
     if background_tasks:
@@ -54,17 +80,134 @@ async def upload_document(
         "message": "Document uploaded successfully and is being processed"
     }
 
+@router.post("/upload/batch")
+async def upload_document_batch(
+    files: List[UploadFile] = File(...),
+    background_tasks: BackgroundTasks = None,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Upload many files (and/or zip archives of them) as one batch"""
+    batch_id = str(uuid.uuid4())
+    document_ids = []
+    skipped = []
+    
+    for file in files:
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        remaining = settings.MAX_BATCH_FILES - len(document_ids)
+        
+        if file_ext == ".zip":
+            member_ids, member_skipped = await save_zip_documents(
+                file, user["id"], batch_id, SUPPORTED_EXTENSIONS, remaining
+            )
+            document_ids.extend(member_ids)
+            skipped.extend(member_skipped)
+        elif file_ext not in SUPPORTED_EXTENSIONS:
+            skipped.append({"filename": file.filename, "reason": "File type not allowed"})
+        elif remaining <= 0:
+            skipped.append({"filename": file.filename, "reason": "Batch file limit reached"})
+        else:
+            try:
+                document_ids.append(await save_document(file, user["id"], batch_id))
+            except UploadTooLargeError as e:
+                skipped.append({"filename": file.filename, "reason": str(e)})
+    
+    if not document_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "No supported files in upload", "skipped": skipped}
+        )
+    
+    create_batch(batch_id, user["id"], document_ids)
+    
+    # Process the whole batch in background
+    if background_tasks:
+        background_tasks.add_task(ingest_documents, document_ids, batch_id)
+    else:
+        asyncio.create_task(ingest_documents(document_ids, batch_id))
+    
+    return {
+        "batch_id": batch_id,
+        "document_ids": document_ids,
+        "skipped": skipped,
+        "status": "processing",
+        "message": f"{len(document_ids)} documents uploaded and queued for processing"
+    }
+
+@router.get("/batches/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    progress = get_batch_progress(batch_id)
+    if progress is None or progress["user_id"] != user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+    
+    return progress
+
+@router.get("/batches/{batch_id}/events")
+async def stream_batch_progress(
+    batch_id: str,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Live batch progress as server-sent events, until the batch finishes"""
+    progress = get_batch_progress(batch_id)
+    if progress is None or progress["user_id"] != user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+    
+    return StreamingResponse(
+        progress_bus.stream(f"batch:{batch_id}", progress, is_final_batch_event),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.get("/")
-async def get_user_documents(user: Dict[str, Any] = Depends(get_current_user)):
-    documents = list_documents(user["id"])
+async def get_user_documents(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    # Without paging parameters keep returning the full list
+    if limit is None and cursor is None:
+        return await run_db(list_documents, user["id"])
+    
+    try:
+        documents, next_cursor = await run_db(list_documents_page, user["id"], limit or DEFAULT_PAGE_SIZE, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return documents
 
+@router.get("/sas-symbols")
+async def get_sas_symbol(
+    name: str,
+    kind: str = "dataset",
+    role: Optional[str] = None,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Where the user's SAS programs define or use a symbol, e.g. the sections
+    that create a dataset (kind=dataset&role=created)"""
+    if kind not in SYMBOL_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"kind must be one of: {', '.join(SYMBOL_KINDS)}"
+        )
+    return await run_db(find_sas_symbol, user["id"], kind, name, role)
+
 @router.get("/{document_id}")
 async def get_document_details(
     document_id: str,
     user: Dict[str, Any] = Depends(get_current_user)
 ):
-    document = get_document(document_id)
+    document = await run_db(get_document, document_id)
     if not document or document["user_id"] != user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -73,19 +216,44 @@ async def get_document_details(
     
     return document
 
+@router.get("/{document_id}/events")
+async def stream_document_progress(
+    document_id: str,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Live processing progress as server-sent events, until it completes or fails"""
+    document = await run_db(get_document, document_id)
+    if not document or document["user_id"] != user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    initial = document_progress_event(
+        document_id,
+        document.get("processing_status", "pending"),
+        document.get("processing_timings"),
+        document.get("processing_error")
+    )
+    return StreamingResponse(
+        progress_bus.stream(f"document:{document_id}", initial, is_final_document_event),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.delete("/{document_id}")
 async def delete_user_document(
     document_id: str,
     user: Dict[str, Any] = Depends(get_current_user)
 ):
-    document = get_document(document_id)
+    document = await run_db(get_document, document_id)
     if not document or document["user_id"] != user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    success = delete_document(document_id)
+    success = await run_db(delete_document, document_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -93,3 +261,55 @@ async def delete_user_document(
         )
     
     return {"status": "success", "message": "Document deleted successfully"}
+
+async def _get_dataset_document(document_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    document = await run_db(get_document, document_id)
+    if not document or document["user_id"] != user["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    if not document.get("dataset"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document has no queryable dataset (not tabular, or not processed yet)"
+        )
+    return document
+
+@router.get("/{document_id}/dataset")
+async def get_dataset_schema(
+    document_id: str,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Schema of a processed tabular document (columns, types, labels, rows)"""
+    document = await _get_dataset_document(document_id, user)
+    return document["dataset"]
+
+@router.post("/{document_id}/query")
+async def query_dataset(
+    document_id: str,
+    request: DatasetQueryRequest,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Filter/aggregate query over the document's columnar copy"""
+    document = await _get_dataset_document(document_id, user)
+    try:
+        query = validate_query(request.model_dump(), document["dataset"])
+        return await run_indexing(
+            run_dataset_query, document["dataset"]["parquet_path"], query, settings.STRUCTURED_QUERY_MAX_ROWS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/{document_id}/ask")
+async def ask_dataset(
+    document_id: str,
+    request: DatasetQuestionRequest,
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Answer a question from a query over the dataset rather than from retrieved text"""
+    document = await _get_dataset_document(document_id, user)
+    try:
+        return await answer_dataset_question(document, request.question)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -6,12 +6,84 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "ExpertEyeSecretKey123"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # Key for password fingerprints (defaults to SECRET_KEY)
+    PASSWORD_FINGERPRINT_KEY: str = ""
     
     # Paths
     DATA_DIR: str = "../data"
     DOCUMENTS_DIR: str = "../data/documents"
+    # Uploaded content, stored once per SHA-256 and shared by every document row
+    BLOBS_DIR: str = "../data/documents/blobs"
     DATABASE_DIR: str = "../database"
     
+    # Uploads are copied to disk in chunks of this size; larger ones are rejected (0 = no limit)
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_UPLOAD_SIZE: int = 512 * 1024 * 1024
+    
+    # Storage backend: "json" (files in DATABASE_DIR) or "sqlite"
+    STORAGE_BACKEND: str = "json"
+    SQLITE_PATH: str = "../database/experteye.db"
+    # JSON backend: mutations within this window are flushed together (0 = write through)
+    DB_COMMIT_WINDOW_MS: int = 50
+    
+    # Thread pools for blocking work called from async endpoints
+    STORAGE_WORKERS: int = 8
+    HASHING_WORKERS: int = 2
+    
+    # Document ingestion: extraction processes, embedding/index threads, chunking
+    EXTRACTION_WORKERS: int = 2
+    INDEXING_WORKERS: int = 2
+    CHUNK_SIZE: int = 500
+    CHUNK_OVERLAP: int = 100
+    # PDFs longer than one shard are split into page ranges extracted in
+    # parallel processes. PDF_PAGE_WORKERS is shared by the extraction
+    # workers (each gets PDF_PAGE_WORKERS // EXTRACTION_WORKERS, at least one:
+    # serial); 0 = one per CPU
+    PDF_PAGE_WORKERS: int = 4
+    PDF_PAGES_PER_SHARD: int = 50
+    # OCR of pages without a usable text layer, rasterized one page at a time
+    OCR_DPI: int = 200
+    OCR_WORKERS: int = 2
+    # Text files are streamed in sections of about this many characters
+    TEXT_SECTION_CHARS: int = 64 * 1024
+    # Spreadsheet rows per Document (the header row is repeated in each)
+    SPREADSHEET_ROWS_PER_BLOCK: int = 50
+    # SAS datasets are read SAS_READ_CHUNK_ROWS rows at a time and indexed as
+    # column-profile "dataset cards" plus a sample of rows. Raw rows are only
+    # indexed with SAS_INCLUDE_ROWS, in blocks of SAS_ROWS_PER_BLOCK rows, at
+    # most SAS_MAX_ROWS per dataset (0 = all)
+    SAS_READ_CHUNK_ROWS: int = 10000
+    SAS_INCLUDE_ROWS: bool = False
+    SAS_ROWS_PER_BLOCK: int = 100
+    SAS_MAX_ROWS: int = 10000
+    SAS_SAMPLE_ROWS: int = 10
+    SAS_PROFILE_TOP_K: int = 5
+    SAS_CARD_COLUMNS: int = 40
+    # Parquet copy of each SAS dataset for structured (filter/aggregate) queries
+    SAS_PARQUET_CACHE: bool = True
+    STRUCTURED_QUERY_MAX_ROWS: int = 50
+    # Extracted text by content hash + extractor version ("" disables the cache)
+    EXTRACTION_CACHE_DIR: str = "../data/extraction_cache"
+    # Chunks sent to the embedding model per call, across documents
+    EMBEDDING_BATCH_SIZE: int = 256
+    # Most documents one batch upload (including zip members) may create
+    MAX_BATCH_FILES: int = 1000
+    
+    # Cache of verified bearer tokens -> user records
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_SIZE: int = 4096
+    
+    # Ollama models and the vector store used for retrieval
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    LLM_MODEL: str = "deepseek:1.5b"
+    EMBEDDING_MODEL: str = "deepseek:1.5b"
+    VECTOR_STORE_DIR: str = "../data/vector_store"
+    
+    # Warm-up (vector index, models) that gates /api/readiness. In the background
+    # the server starts accepting requests right away; failed stages are retried
+    WARMUP_IN_BACKGROUND: bool = False
+    WARMUP_RETRY_SECONDS: int = 30
+    
     class Config:
         env_file = ".env"
 
@@ -20,4 +92,5 @@ settings = Settings()
 # Ensure directories exist
 os.makedirs(settings.DATA_DIR, exist_ok=True)
 os.makedirs(settings.DOCUMENTS_DIR, exist_ok=True)
+os.makedirs(settings.BLOBS_DIR, exist_ok=True)
 os.makedirs(settings.DATABASE_DIR, exist_ok=True)
@@ -1,20 +1,41 @@
 
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-from app.db.session import get_user_db
+from app.db.session import users_table
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.executors import run_db
+from app.services.auth_service import get_user_by_username
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+# Verified tokens -> user records, so repeat requests skip JWT decoding and the lookup
+user_cache = TTLCache(ttl=settings.USER_CACHE_TTL_SECONDS, max_size=settings.USER_CACHE_SIZE)
+
+def _invalidate_cached_user(user_id):
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate_tag(user_id)
+
+# Any change to a user (password, rename, deletion) drops its cached tokens
+users_table.subscribe(_invalidate_cached_user)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+    user = user_cache.get(token)
+    if user is not None:
+        return dict(user)
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -22,11 +43,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    users_db = get_user_db()
-    user = next((user for user in users_db if user["username"] == username), None)
-    
+
+    user = await run_db(get_user_by_username, username)
+
     if user is None:
         raise credentials_exception
-    
-    return user
+
+    # Never cache a token beyond its own expiry
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    user_cache.set(token, user, tag=user["id"], ttl=expires_in)
+
+    return dict(user)
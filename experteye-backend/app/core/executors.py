@@ -0,0 +1,93 @@
+
+"""Bounded executors that keep blocking work off the event loop"""
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+# Storage calls (file / SQLite I/O) and password hashing get separate pools so
+# a burst of logins can't starve chat and document requests, and vice versa.
+storage_executor = ThreadPoolExecutor(
+    max_workers=settings.STORAGE_WORKERS, thread_name_prefix="storage"
+)
+hashing_executor = ThreadPoolExecutor(
+    max_workers=settings.HASHING_WORKERS, thread_name_prefix="hashing"
+)
+# Embedding calls and FAISS updates: slow, so kept away from the storage pool
+indexing_executor = ThreadPoolExecutor(
+    max_workers=settings.INDEXING_WORKERS, thread_name_prefix="indexing"
+)
+
+# CPU-bound extraction (PDF parsing, OCR) runs in worker processes so it doesn't
+# hold the API's GIL. Created on first use; "spawn" because the API process has
+# threads running that a fork would copy in an arbitrary state.
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+_extraction_lock = threading.Lock()
+_is_extraction_worker = False
+
+def _mark_extraction_worker() -> None:
+    global _is_extraction_worker
+    _is_extraction_worker = True
+
+def in_extraction_worker() -> bool:
+    """True inside an extraction pool process (so nested pools can size down)"""
+    return _is_extraction_worker
+
+def _get_extraction_executor() -> ProcessPoolExecutor:
+    global _extraction_executor
+    with _extraction_lock:
+        if _extraction_executor is None:
+            _extraction_executor = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_mark_extraction_worker,
+            )
+        return _extraction_executor
+
+def _reset_extraction_executor(broken: ProcessPoolExecutor) -> None:
+    global _extraction_executor
+    with _extraction_lock:
+        if _extraction_executor is broken:
+            _extraction_executor = None
+    broken.shutdown(wait=False)
+
+async def _run(executor: Executor, fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking data-access call (service or session function) on the storage pool"""
+    return await _run(storage_executor, fn, *args, **kwargs)
+
+async def run_hashing(fn: Callable, *args, **kwargs) -> Any:
+    """Run CPU-heavy password hashing / verification on the hashing pool"""
+    return await _run(hashing_executor, fn, *args, **kwargs)
+
+async def run_indexing(fn: Callable, *args, **kwargs) -> Any:
+    """Run embedding / vector index work on the indexing pool"""
+    return await _run(indexing_executor, fn, *args, **kwargs)
+
+async def run_extraction(fn: Callable, *args, **kwargs) -> Any:
+    """Run a picklable, module-level function in the extraction process pool.
+    
+    A worker that dies (e.g. out of memory on a huge PDF) breaks the pool; it is
+    replaced so the next call gets a fresh one, and this call raises.
+    """
+    executor = _get_extraction_executor()
+    try:
+        return await _run(executor, fn, *args, **kwargs)
+    except BrokenProcessPool:
+        _reset_extraction_executor(executor)
+        raise
+
+def shutdown_executors() -> None:
+    storage_executor.shutdown(wait=True)
+    hashing_executor.shutdown(wait=True)
+    indexing_executor.shutdown(wait=True)
+    if _extraction_executor is not None:
+        _extraction_executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,76 @@
+
+"""In-memory progress bus for document processing, exposed as server-sent events"""
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+
+class ProgressBus:
+    """Publish/subscribe of progress events by topic (e.g. "document:<id>").
+
+    The latest event of each topic is kept so late subscribers start from the
+    current state. Must be used from the event loop thread.
+    """
+
+    def __init__(self, max_topics: int = 1000, queue_size: int = 100):
+        self.max_topics = max_topics
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        self._last[topic] = event
+        self._last.move_to_end(topic)
+        while len(self._last) > self.max_topics:
+            self._last.popitem(last=False)
+
+        for queue in self._subscribers.get(topic, ()):
+            if queue.full():
+                # A slow client only needs the newest state
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def last(self, topic: str) -> Optional[Dict[str, Any]]:
+        return self._last.get(topic)
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(topic)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[topic]
+
+    async def stream(
+        self,
+        topic: str,
+        initial: Optional[Dict[str, Any]],
+        is_final: Callable[[Dict[str, Any]], bool],
+        keepalive: float = 15.0
+    ) -> AsyncIterator[str]:
+        """Server-sent events for ``topic``, starting with the current state and
+        ending after the first event ``is_final`` accepts."""
+        queue = self.subscribe(topic)
+        try:
+            # Subscribed first, so nothing published from here on is missed
+            event = self.last(topic) or initial
+            while True:
+                if event is not None:
+                    yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                    if is_final(event):
+                        return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    event = None
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(topic, queue)
+
+progress_bus = ProgressBus()
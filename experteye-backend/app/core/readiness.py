@@ -0,0 +1,54 @@
+
+"""Warm-up stages that decide whether this replica is ready for traffic"""
+import threading
+import time
+from typing import Any, Awaitable, Dict, List
+
+
+class ReadinessTracker:
+    """Status and timing of each warm-up stage.
+
+    A stage is "pending", "running", "ready" or "failed"; the replica is ready
+    once every stage is ready. Liveness is separate and doesn't depend on this.
+    """
+
+    def __init__(self, stages: List[str]):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending", "seconds": None} for name in stages
+        }
+
+    async def run(self, name: str, work: Awaitable) -> Any:
+        """Await ``work`` as stage ``name``, recording its outcome. Errors are re-raised."""
+        self._set(name, status="running", seconds=None, error=None)
+        start = time.perf_counter()
+        try:
+            result = await work
+        except Exception as e:
+            self._set(name, status="failed", seconds=round(time.perf_counter() - start, 4), error=str(e))
+            raise
+        self._set(name, status="ready", seconds=round(time.perf_counter() - start, 4))
+        if isinstance(result, dict):
+            self._set(name, details=result)
+        return result
+
+    def status(self, name: str) -> str:
+        with self._lock:
+            return self._stages[name]["status"]
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(stage["status"] == "ready" for stage in self._stages.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: {k: v for k, v in stage.items() if v is not None} for name, stage in self._stages.items()}
+        return {"ready": all(stage["status"] == "ready" for stage in stages.values()), "stages": stages}
+
+    def _set(self, name: str, **fields) -> None:
+        with self._lock:
+            self._stages[name].update(fields)
+
+# storage: JSON/SQLite loaded; vector_index: FAISS index and metadata read;
+# models: LLM and embedding model loaded in Ollama
+readiness = ReadinessTracker(["storage", "vector_index", "models"])
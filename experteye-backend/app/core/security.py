@@ -1,10 +1,13 @@
 
+import hashlib
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.executors import run_hashing
 
 # Use a simple context without bcrypt to avoid compatibility issues
 pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
@@ -15,6 +18,28 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def password_hash_needs_update(hashed_password) -> bool:
+    """True if the hash isn't in the current scheme/rounds (or isn't recognised at all)"""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except (TypeError, ValueError):
+        return True
+
+def password_fingerprint(password: str) -> str:
+    """Keyed (HMAC-SHA256) fingerprint of a password for the uniqueness index.
+    
+    Cheap to compute, unlike the sha256_crypt hash, and useless without the
+    server-side key.
+    """
+    key = (settings.PASSWORD_FINGERPRINT_KEY or settings.SECRET_KEY).encode("utf-8")
+    return hmac.new(key, password.encode("utf-8"), hashlib.sha256).hexdigest()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_hashing(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
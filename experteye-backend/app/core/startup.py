@@ -0,0 +1,39 @@
+
+"""Startup timing report"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+class StartupReport:
+    """Wall-clock cost of each import and init step during application startup"""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        entry: Dict[str, Any] = {"name": name}
+        try:
+            yield
+        except Exception as e:
+            entry["error"] = str(e)
+            raise
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+            self.stages.append(entry)
+
+    def total_seconds(self) -> float:
+        return round(sum(stage["seconds"] for stage in self.stages), 4)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total_seconds": self.total_seconds(), "stages": list(self.stages)}
+
+    def log(self) -> None:
+        print(f"Startup finished in {self.total_seconds():.3f}s")
+        for stage in self.stages:
+            status = f" (failed: {stage['error']})" if "error" in stage else ""
+            print(f"  {stage['name']:<24}{stage['seconds'] * 1000:>9.1f} ms{status}")
+
+startup_report = StartupReport()
@@ -0,0 +1,416 @@
+
+"""Append-only message log with a per-chat offset index"""
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.db.pagination import sort_key, encode_cursor, decode_cursor
+
+# Version 2 entries are (created_at, id, offset, length) so chats can be paged
+INDEX_VERSION = 2
+
+# Compaction kicks in once at least half of the log (and 1 MB) is garbage
+COMPACTION_MIN_DEAD_BYTES = 1 << 20
+COMPACTION_DEAD_RATIO = 0.5
+
+# Persist the index after this many appends; anything newer is recovered by
+# re-scanning the tail of the log on startup
+INDEX_CHECKPOINT_INTERVAL = 1000
+
+
+class _Reader:
+    """A read in progress: the index entries left to read and a handle on the log"""
+
+    def __init__(self, entries: List[Tuple[str, str, int, int]], path: str):
+        self.entries = entries
+        self.position = 0
+        self.file = open(path, "rb")
+
+
+class MessageLog:
+    """Messages stored as JSON lines, one record per line, never rewritten in place.
+
+    The in-memory index maps chat_id to the (created_at, id, offset, length) of
+    each of its records, kept sorted for keyset pagination, so appending is a single write at the end of the file and reading a
+    chat only touches that chat's lines. Deleting a chat appends a tombstone and
+    drops it from the index; the bytes are reclaimed later by ``compact``, which
+    runs in a background thread once enough of the log is dead.
+    """
+
+    def __init__(self, log_path: str, index_path: str, legacy_path: Optional[str] = None, writer=None):
+        self.log_path = log_path
+        self.index_path = index_path
+        self.legacy_path = legacy_path
+        self.writer = writer
+        self._lock = threading.RLock()
+        self._chats: Dict[str, List[Tuple[str, str, int, int]]] = {}
+        self._size = 0
+        self._dead_bytes = 0
+        self._appends_since_checkpoint = 0
+        self._loaded = False
+        self._compacting = False
+        self._readers: Set[_Reader] = set()
+
+    # Loading
+
+    def ensure_file(self) -> None:
+        """Create the log, importing the legacy messages.json on first run"""
+        if os.path.exists(self.log_path):
+            return
+
+        rows = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "r") as f:
+                    rows = json.load(f)
+            except json.JSONDecodeError:
+                rows = []
+
+        self._rewrite(rows)
+        if rows:
+            print(f"Imported {len(rows)} messages from {self.legacy_path} into {self.log_path}")
+
+    def load(self) -> None:
+        """Load the persisted index and catch up with records appended after it"""
+        with self._lock:
+            self.ensure_file()
+            size = os.path.getsize(self.log_path)
+
+            index = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, "r") as f:
+                        index = json.load(f)
+                except json.JSONDecodeError:
+                    index = {}
+
+            if index.get("version") == INDEX_VERSION and index.get("log_size", 0) <= size:
+                self._chats = {chat_id: [tuple(entry) for entry in entries]
+                               for chat_id, entries in index.get("chats", {}).items()}
+                self._dead_bytes = index.get("dead_bytes", 0)
+                start = index.get("log_size", 0)
+            else:
+                # Missing or stale index: rebuild it from the whole log
+                self._chats = {}
+                self._dead_bytes = 0
+                start = 0
+
+            self._size = self._scan(start)
+            self._loaded = True
+            if self._size != index.get("log_size"):
+                self._save_index()
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _scan(self, start: int) -> int:
+        """Index records from ``start`` to the end of the log, returning the new size.
+
+        A torn last line (crash mid-append) is truncated away.
+        """
+        with open(self.log_path, "rb+") as f:
+            f.seek(start)
+            offset = start
+            for line in iter(f.readline, b""):
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    f.truncate(offset)
+                    print(f"Truncated damaged message log tail at offset {offset}")
+                    break
+                self._apply(record, offset, len(line))
+                offset += len(line)
+            return offset
+
+    def _apply(self, record: Dict[str, Any], offset: int, length: int) -> None:
+        """Update the index for one record found at ``offset``"""
+        if record.get("_tombstone"):
+            dropped = self._chats.pop(record["chat_id"], [])
+            self._dead_bytes += length + sum(entry[3] for entry in dropped)
+        else:
+            insort(self._chats.setdefault(record["chat_id"], []), (*sort_key(record), offset, length))
+
+    def _save_index(self) -> None:
+        """Atomically persist the index as a checkpoint of the log"""
+        index = {
+            "version": INDEX_VERSION,
+            "log_size": self._size,
+            "dead_bytes": self._dead_bytes,
+            "chats": self._chats,
+        }
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+        self._appends_since_checkpoint = 0
+
+    # Reads
+
+    def _open_reader(self, chat_id: Optional[str] = None, select=None) -> _Reader:
+        """Snapshot index entries together with a handle on the log file.
+
+        The reader is registered so a compaction swapping the log can close
+        its handle first (Windows can't replace an open file), then remap its
+        offsets and reopen it. ``select`` may narrow a chat's entries (e.g. to
+        one page).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if chat_id is None:
+                entries = sorted((entry for chat in self._chats.values() for entry in chat),
+                                 key=lambda entry: entry[2])
+            else:
+                entries = self._chats.get(chat_id, [])
+                entries = select(entries) if select else list(entries)
+            reader = _Reader(entries, self.log_path)
+            self._readers.add(reader)
+            return reader
+
+    def _iter_entries(self, chat_id: Optional[str] = None, select=None):
+        reader = self._open_reader(chat_id, select)
+        try:
+            while True:
+                # Each record is read under the lock, so a compaction never
+                # swaps the handle in the middle of one
+                with self._lock:
+                    if reader.position >= len(reader.entries):
+                        return
+                    _, _, offset, length = reader.entries[reader.position]
+                    reader.position += 1
+                    reader.file.seek(offset)
+                    line = reader.file.read(length)
+                yield json.loads(line)
+        finally:
+            with self._lock:
+                self._readers.discard(reader)
+                reader.file.close()
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Return every live message in log order (reads the whole log)"""
+        return list(self._iter_entries())
+
+    def iter_live(self):
+        """Stream live messages in log order without materializing them"""
+        return self._iter_entries()
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return sum(len(entries) for entries in self._chats.values())
+
+    def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get all messages of a chat, reading only that chat's records"""
+        if field != "chat_id":
+            raise KeyError(f"Field '{field}' is not indexed in {self.log_path}")
+        return list(self._iter_entries(value))
+
+    def page(
+        self,
+        field: str,
+        value: Any,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of a chat's messages in (created_at, id) order.
+
+        Only the records on the page are read from the log.
+        """
+        if field != "chat_id":
+            raise KeyError(f"Field '{field}' is not indexed in {self.log_path}")
+        position = decode_cursor(cursor) if cursor else None
+        state = {}
+
+        def select(entries):
+            if descending:
+                end = bisect_left(entries, position) if position else len(entries)
+                state["has_more"] = end - limit > 0
+                return entries[max(0, end - limit):end][::-1]
+            # Entries extend the (created_at, id) key, so sort past the cursor row itself
+            start = bisect_right(entries, (*position, float("inf"))) if position else 0
+            state["has_more"] = start + limit < len(entries)
+            return entries[start:start + limit]
+
+        rows = list(self._iter_entries(value, select))
+        next_cursor = encode_cursor(rows[-1]) if rows and state["has_more"] else None
+        return rows, next_cursor
+
+    # Writes
+
+    def _append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(line)
+        offset = self._size
+        self._size += len(line)
+        return offset, len(line)
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Append a message to the end of the log"""
+        with self._lock:
+            self._ensure_loaded()
+            offset, length = self._append(row)
+            insort(self._chats.setdefault(row["chat_id"], []), (*sort_key(row), offset, length))
+            self._appended()
+        if self.writer is not None:
+            # Appends are visible immediately; the fsync is group-committed
+            self.writer.schedule(self)
+        return dict(row)
+
+    def _appended(self) -> None:
+        # Checkpoint the index every INDEX_CHECKPOINT_INTERVAL records; load()
+        # replays the ones after the checkpoint from the log
+        self._appends_since_checkpoint += 1
+        if self._appends_since_checkpoint >= INDEX_CHECKPOINT_INTERVAL:
+            self._save_index()
+
+    def persist(self) -> None:
+        """Make every append so far durable with a single fsync"""
+        with open(self.log_path, "ab") as f:
+            os.fsync(f.fileno())
+        if self.writer is not None:
+            self.writer.record_fsync()
+
+    def delete_where(self, field: str, value: Any) -> int:
+        """Delete every message of a chat by appending a tombstone.
+
+        Like an append, the tombstone reaches the index checkpoint on the
+        usual interval (or at compaction); until then load() replays it from
+        the tail of the log.
+        """
+        if field != "chat_id":
+            raise KeyError(f"Field '{field}' is not indexed in {self.log_path}")
+        with self._lock:
+            self._ensure_loaded()
+            if value not in self._chats:
+                return 0
+            offset, length = self._append({"_tombstone": True, "chat_id": value})
+            deleted = len(self._chats[value])
+            self._apply({"_tombstone": True, "chat_id": value}, offset, length)
+            self._appended()
+        if self.writer is not None:
+            self.writer.schedule(self)
+        self.maybe_compact()
+        return deleted
+
+    def replace_all(self, rows: List[Dict[str, Any]]) -> None:
+        """Rewrite the log from scratch (used by the legacy save_message_db helper)"""
+        with self._lock:
+            # Reads in progress end here: their records don't exist any more
+            for reader in self._readers:
+                reader.file.close()
+                reader.entries = []
+            self._rewrite(rows)
+            self._loaded = False
+            self.load()
+
+    def _rewrite(self, rows: List[Dict[str, Any]]) -> None:
+        temp_path = self.log_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+        os.replace(temp_path, self.log_path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    # Compaction
+
+    def maybe_compact(self) -> bool:
+        """Start a background compaction if enough of the log is garbage"""
+        with self._lock:
+            if self._compacting or self._dead_bytes < COMPACTION_MIN_DEAD_BYTES:
+                return False
+            if self._dead_bytes < self._size * COMPACTION_DEAD_RATIO:
+                return False
+            self._compacting = True
+
+        threading.Thread(target=self.compact, daemon=True).start()
+        return True
+
+    def compact(self) -> None:
+        """Copy live records to a new log and swap it in, reclaiming dead space.
+
+        The bulk copy runs without holding the lock so appends keep flowing;
+        only the records appended meanwhile are copied under the lock at swap
+        time.
+        """
+        temp_path = self.log_path + ".compact"
+        try:
+            with self._lock:
+                self._compacting = True
+                self._ensure_loaded()
+                snapshot_size = self._size
+                live = sorted((entry for chat in self._chats.values() for entry in chat),
+                              key=lambda entry: entry[2])
+
+            moved: Dict[int, int] = {}
+            src = open(self.log_path, "rb")
+            dst = open(temp_path, "wb")
+            try:
+                for _, _, offset, length in live:
+                    src.seek(offset)
+                    moved[offset] = dst.tell()
+                    dst.write(src.read(length))
+
+                with self._lock:
+                    # Carry over everything appended since the snapshot verbatim
+                    tail_start = dst.tell()
+                    src.seek(snapshot_size)
+                    dst.write(src.read(self._size - snapshot_size))
+                    new_size = dst.tell()
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                    # Windows can't replace a file that is open: close our
+                    # handles, and the readers' until the new log is in place
+                    src.close()
+                    dst.close()
+
+                    shift = tail_start - snapshot_size
+
+                    def remap(entries):
+                        # Records of chats deleted since the snapshot weren't copied
+                        return [
+                            (created_at, row_id, moved[offset] if offset < snapshot_size else offset + shift, length)
+                            for created_at, row_id, offset, length in entries
+                            if offset >= snapshot_size or offset in moved
+                        ]
+
+                    chats = {chat_id: remap(entries) for chat_id, entries in self._chats.items()}
+                    live_bytes = sum(entry[3] for entries in chats.values() for entry in entries)
+
+                    for reader in self._readers:
+                        reader.file.close()
+                    os.replace(temp_path, self.log_path)
+                    for reader in self._readers:
+                        reader.entries = remap(reader.entries[reader.position:])
+                        reader.position = 0
+                        reader.file = open(self.log_path, "rb")
+
+                    reclaimed = self._size - new_size
+                    self._chats = chats
+                    self._size = new_size
+                    self._dead_bytes = new_size - live_bytes
+                    self._save_index()
+            finally:
+                src.close()
+                dst.close()
+
+            print(f"Compacted message log, reclaimed {reclaimed} bytes")
+        except Exception as e:
+            print(f"Message log compaction failed: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def close(self) -> None:
+        """Checkpoint the index so the next start doesn't need to scan the tail"""
+        with self._lock:
+            if self._loaded and self._appends_since_checkpoint:
+                self._save_index()
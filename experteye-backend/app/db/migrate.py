@@ -0,0 +1,104 @@
+
+"""One-shot migration of the JSON database files into SQLite"""
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Union
+
+from app.db.sqlite_store import SqliteDatabase
+
+MIGRATION_KEY = "json_migrated"
+BATCH_SIZE = 500
+
+def iter_json_array(path: str, read_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Yield the items of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and separators between items
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError(f"{path} does not contain a JSON array")
+                started = True
+                position += 1
+                continue
+            if started and position < len(buffer) and buffer[position] == "]":
+                return
+            if position < len(buffer):
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    position = end
+                    continue
+            if eof:
+                return
+            # Need more input: drop consumed text and read the next block
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+def migrate_json_to_sqlite(
+    database: SqliteDatabase,
+    json_paths: Dict[str, Union[str, Iterable[Dict[str, Any]]]],
+    force: bool = False
+) -> Dict[str, int]:
+    """Copy each JSON collection into its SQLite table, once.
+
+    ``json_paths`` maps table names to JSON files (or to an iterable of rows,
+    e.g. the live records of the message log). Rows are streamed in batches
+    and inserted with INSERT OR IGNORE, so an interrupted run can be repeated.
+    Returns the number of rows inserted per table.
+    """
+    if database.get_meta(MIGRATION_KEY) and not force:
+        return {}
+
+    counts = {}
+    for table_name, path in json_paths.items():
+        counts[table_name] = 0
+        if isinstance(path, str):
+            if not os.path.exists(path):
+                continue
+            rows = iter_json_array(path)
+        else:
+            rows, path = path, table_name
+
+        table = database.table(table_name)
+        batch = []
+        read = 0
+        try:
+            for row in rows:
+                batch.append(row)
+                read += 1
+                if len(batch) >= BATCH_SIZE:
+                    counts[table_name] += table.insert_many(batch)
+                    batch = []
+        except ValueError as e:
+            print(f"Skipping unreadable JSON collection {path}: {str(e)}")
+        if batch:
+            counts[table_name] += table.insert_many(batch)
+
+        if read != counts[table_name]:
+            # Duplicate ids, or usernames/emails that only differ by case
+            print(f"Skipped {read - counts[table_name]} conflicting rows from {path}")
+
+    database.set_meta(MIGRATION_KEY, "1")
+    print(f"Migrated JSON database into SQLite: {counts}")
+    return counts
+
+if __name__ == "__main__":
+    from app.core.config import settings
+    from app.db.session import json_migration_sources
+
+    db = SqliteDatabase(settings.SQLITE_PATH)
+    db.init_schema()
+    migrate_json_to_sqlite(db, json_migration_sources(), force=True)
@@ -0,0 +1,28 @@
+
+"""Keyset pagination helpers shared by the storage backends"""
+import base64
+import json
+from typing import Any, Dict, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def sort_key(row: Dict[str, Any]) -> Tuple[str, str]:
+    """Rows are ordered by (created_at, id); id breaks ties between equal timestamps"""
+    return (row.get("created_at") or "", row["id"])
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just after ``row`` in (created_at, id) order"""
+    raw = json.dumps(list(sort_key(row)), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created_at, row_id
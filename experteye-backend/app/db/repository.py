@@ -0,0 +1,243 @@
+
+"""In-memory indexed collections backed by the JSON database files"""
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.db.pagination import sort_key, encode_cursor, decode_cursor
+from app.db.writer import atomic_write
+
+
+class JsonCollection:
+    """A JSON file loaded once and served from memory through indexes.
+
+    Rows are kept in a dict keyed by primary key ("id") and every field listed
+    in ``indexes`` gets a secondary index mapping a value to the sorted
+    (created_at, id) keys of the rows that hold it, which also serves keyset
+    pagination. Lookups never touch the disk; mutations update the indexes and then go
+    through ``_write`` which is the only place the file is rewritten. With a
+    ``writer`` the rewrite is deferred and coalesced with other mutations.
+    Fields listed in ``case_insensitive`` are indexed and looked up lowercased.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        indexes: Iterable[str] = (),
+        writer=None,
+        case_insensitive: Iterable[str] = ()
+    ):
+        self.path = path
+        self.index_fields = tuple(indexes)
+        self.case_insensitive = frozenset(case_insensitive)
+        self.writer = writer
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._indexes: Dict[str, Dict[Any, List[Tuple[str, str]]]] = {}
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+        self._loaded = False
+
+    # Loading
+
+    def ensure_file(self) -> None:
+        """Create an empty collection file if it does not exist yet"""
+        if not os.path.exists(self.path):
+            with open(self.path, "w") as f:
+                json.dump([], f)
+
+    def load(self) -> None:
+        """(Re)load the collection from disk and rebuild the indexes"""
+        with self._lock:
+            try:
+                with open(self.path, "r") as f:
+                    rows = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                rows = []
+            self._reset(rows)
+            self._loaded = True
+            self._notify(None)
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _reset(self, rows: List[Dict[str, Any]]) -> None:
+        self._rows = {}
+        self._indexes = {field: {} for field in self.index_fields}
+        for row in rows:
+            self._rows[row["id"]] = row
+            self._index_row(row)
+
+    # Change notification
+
+    def subscribe(self, listener: Callable[[Optional[str]], None]) -> None:
+        """Call ``listener(row_id)`` after a row changes (row_id None: everything may have)"""
+        self._listeners.append(listener)
+
+    def _notify(self, row_id: Optional[str]) -> None:
+        for listener in self._listeners:
+            listener(row_id)
+
+    # Index maintenance
+
+    def _index_value(self, field: str, value: Any) -> Any:
+        if field in self.case_insensitive and isinstance(value, str):
+            return value.lower()
+        return value
+
+    def _index_row(self, row: Dict[str, Any]) -> None:
+        key = sort_key(row)
+        for field in self.index_fields:
+            value = self._index_value(field, row.get(field))
+            # New rows normally sort last, so this is an append in practice
+            insort(self._indexes[field].setdefault(value, []), key)
+
+    def _unindex_row(self, row: Dict[str, Any]) -> None:
+        key = sort_key(row)
+        for field in self.index_fields:
+            value = self._index_value(field, row.get(field))
+            bucket = self._indexes[field].get(value)
+            if bucket is None:
+                continue
+            position = bisect_left(bucket, key)
+            if position < len(bucket) and bucket[position] == key:
+                del bucket[position]
+            if not bucket:
+                del self._indexes[field][value]
+
+    # Reads - always return copies so callers can't corrupt the indexes
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Return every row in insertion order"""
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(row) for row in self._rows.values()]
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._rows)
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """Get a row by primary key"""
+        with self._lock:
+            self._ensure_loaded()
+            row = self._rows.get(row_id)
+            return dict(row) if row is not None else None
+
+    def _bucket(self, field: str, value: Any) -> List[Tuple[str, str]]:
+        self._ensure_loaded()
+        if field not in self._indexes:
+            raise KeyError(f"Field '{field}' is not indexed in {self.path}")
+        return self._indexes[field].get(self._index_value(field, value), [])
+
+    def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Get all rows whose indexed ``field`` equals ``value``, oldest first"""
+        with self._lock:
+            return [dict(self._rows[row_id]) for _, row_id in self._bucket(field, value)]
+
+    def page(
+        self,
+        field: str,
+        value: Any,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of ``find(field, value)`` in (created_at, id) order.
+
+        Seeks into the sorted index with bisect, so a page costs
+        O(log n + limit). Returns the rows and the cursor of the next page
+        (None when there are no more rows).
+        """
+        with self._lock:
+            bucket = self._bucket(field, value)
+            if descending:
+                end = bisect_left(bucket, decode_cursor(cursor)) if cursor else len(bucket)
+                keys = bucket[max(0, end - limit):end][::-1]
+                has_more = end - limit > 0
+            else:
+                start = bisect_right(bucket, decode_cursor(cursor)) if cursor else 0
+                keys = bucket[start:start + limit]
+                has_more = start + limit < len(bucket)
+            rows = [dict(self._rows[row_id]) for _, row_id in keys]
+        next_cursor = encode_cursor(rows[-1]) if rows and has_more else None
+        return rows, next_cursor
+
+    # Writes
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a new row"""
+        with self._lock:
+            self._ensure_loaded()
+            if row["id"] in self._rows:
+                raise ValueError(f"Duplicate id {row['id']} in {self.path}")
+            row = dict(row)
+            self._rows[row["id"]] = row
+            self._index_row(row)
+            self._write()
+            return dict(row)
+
+    def update(self, row_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply ``changes`` to an existing row, returning the updated row"""
+        with self._lock:
+            self._ensure_loaded()
+            row = self._rows.get(row_id)
+            if row is None:
+                return None
+            self._unindex_row(row)
+            row.update(changes)
+            self._index_row(row)
+            self._write()
+            self._notify(row_id)
+            return dict(row)
+
+    def delete(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a row by primary key, returning it if it existed"""
+        with self._lock:
+            self._ensure_loaded()
+            row = self._rows.pop(row_id, None)
+            if row is None:
+                return None
+            self._unindex_row(row)
+            self._write()
+            self._notify(row_id)
+            return row
+
+    def delete_where(self, field: str, value: Any) -> int:
+        """Remove all rows whose indexed ``field`` equals ``value``"""
+        with self._lock:
+            self._ensure_loaded()
+            ids = [row_id for _, row_id in self._bucket(field, value)]
+            for row_id in ids:
+                self._unindex_row(self._rows.pop(row_id))
+            if ids:
+                self._write()
+            for row_id in ids:
+                self._notify(row_id)
+            return len(ids)
+
+    def replace_all(self, rows: List[Dict[str, Any]]) -> None:
+        """Replace the whole collection (used by the legacy save_*_db helpers)"""
+        with self._lock:
+            self._reset([dict(row) for row in rows])
+            self._loaded = True
+            self._write()
+            self._notify(None)
+
+    def _write(self) -> None:
+        """Persist now, or hand the collection to the group-commit writer"""
+        if self.writer is not None:
+            self.writer.schedule(self)
+        else:
+            self.persist()
+
+    def persist(self) -> None:
+        """Snapshot the in-memory rows and atomically replace the file"""
+        with self._lock:
+            data = json.dumps(list(self._rows.values()), default=str).encode("utf-8")
+        atomic_write(self.path, data)
+        if self.writer is not None:
+            self.writer.record_fsync()
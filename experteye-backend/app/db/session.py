@@ -1,68 +1,127 @@
 
-import json
+import atexit
 import os
-import uuid
-from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from app.core.config import settings
+from app.db.repository import JsonCollection
+from app.db.message_log import MessageLog
+from app.db.sqlite_store import SqliteDatabase
+from app.db.migrate import migrate_json_to_sqlite, MIGRATION_KEY
+from app.db.writer import WriteBehindWriter
 
 # JSON database paths
 USERS_DB_PATH = os.path.join(settings.DATABASE_DIR, "users.json")
 CHATS_DB_PATH = os.path.join(settings.DATABASE_DIR, "chats.json")
 DOCUMENTS_DB_PATH = os.path.join(settings.DATABASE_DIR, "documents.json")
 MESSAGES_DB_PATH = os.path.join(settings.DATABASE_DIR, "messages.json")
+MESSAGES_LOG_PATH = os.path.join(settings.DATABASE_DIR, "messages.log")
+MESSAGES_INDEX_PATH = os.path.join(settings.DATABASE_DIR, "messages.idx.json")
+
+JSON_DB_PATHS = {
+    "users": USERS_DB_PATH,
+    "chats": CHATS_DB_PATH,
+    "documents": DOCUMENTS_DB_PATH,
+    "messages": MESSAGES_DB_PATH,
+}
+
+# Storage backend selection. Both backends expose the same collection API
+# (get/find/insert/update/delete/...) so the services don't care which is used.
+if settings.STORAGE_BACKEND == "sqlite":
+    sqlite_db = SqliteDatabase(settings.SQLITE_PATH)
+    db_writer = None
+    users_table = sqlite_db.table("users")
+    chats_table = sqlite_db.table("chats")
+    documents_table = sqlite_db.table("documents")
+    messages_table = sqlite_db.table("messages")
+elif settings.STORAGE_BACKEND == "json":
+    sqlite_db = None
+    # Mutations are group-committed off the request path by a background writer
+    db_writer = None
+    if settings.DB_COMMIT_WINDOW_MS > 0:
+        db_writer = WriteBehindWriter(window=settings.DB_COMMIT_WINDOW_MS / 1000)
+        atexit.register(db_writer.close)
+    # Collections are loaded once and then served from memory
+    users_table = JsonCollection(
+        USERS_DB_PATH,
+        indexes=["username", "email", "password_fingerprint"],
+        writer=db_writer,
+        case_insensitive=["username", "email"]
+    )
+    chats_table = JsonCollection(CHATS_DB_PATH, indexes=["user_id"], writer=db_writer)
+    documents_table = JsonCollection(DOCUMENTS_DB_PATH, indexes=["user_id", "content_hash"], writer=db_writer)
+    # Messages are append-only; the legacy messages.json is imported on first run
+    messages_table = MessageLog(
+        MESSAGES_LOG_PATH, MESSAGES_INDEX_PATH, legacy_path=MESSAGES_DB_PATH, writer=db_writer
+    )
+    atexit.register(messages_table.close)
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+
+ALL_TABLES = [users_table, chats_table, documents_table, messages_table]
+
+def json_migration_sources():
+    """Where the JSON backend keeps each collection, for the SQLite migration"""
+    sources = dict(JSON_DB_PATHS)
+    if os.path.exists(MESSAGES_LOG_PATH):
+        # The message log supersedes messages.json once it exists
+        sources["messages"] = MessageLog(MESSAGES_LOG_PATH, MESSAGES_INDEX_PATH).iter_live()
+    return sources
 
 # Ensure database files exist
 def init_db():
-    for db_path in [USERS_DB_PATH, CHATS_DB_PATH, DOCUMENTS_DB_PATH, MESSAGES_DB_PATH]:
-        if not os.path.exists(db_path):
-            with open(db_path, "w") as f:
-                json.dump([], f)
+    if sqlite_db is not None:
+        sqlite_db.init_schema()
+        # Imports the JSON files the first time the SQLite backend is used
+        if not sqlite_db.get_meta(MIGRATION_KEY):
+            migrate_json_to_sqlite(sqlite_db, json_migration_sources())
+        return
+
+    for table in ALL_TABLES:
+        table.ensure_file()
+        table.load()
+
+def close_db() -> None:
+    """Write out anything pending and checkpoint the message log (application shutdown)"""
+    if db_writer is not None:
+        db_writer.close()
+    if sqlite_db is None:
+        messages_table.close()
+
+def flush_db(timeout: Optional[float] = None) -> bool:
+    """Durability barrier: wait until every write issued so far is on disk"""
+    if db_writer is None:
+        return True
+    return db_writer.flush(timeout=timeout)
 
-init_db()
+def get_storage_metrics() -> Dict[str, Any]:
+    """Write path counters (flushes, fsyncs, coalesced mutations)"""
+    metrics = {"backend": settings.STORAGE_BACKEND}
+    if db_writer is not None:
+        metrics.update(db_writer.get_metrics())
+    return metrics
 
-# Database access functions
-def get_user_db():
-    try:
-        with open(USERS_DB_PATH, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+# Legacy whole-collection accessors, served from the active backend
+def get_user_db() -> List[Dict[str, Any]]:
+    return users_table.all()
 
 def save_user_db(users):
-    with open(USERS_DB_PATH, "w") as f:
-        json.dump(users, f, indent=2, default=str)
+    users_table.replace_all(users)
 
-def get_chat_db():
-    try:
-        with open(CHATS_DB_PATH, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+def get_chat_db() -> List[Dict[str, Any]]:
+    return chats_table.all()
 
 def save_chat_db(chats):
-    with open(CHATS_DB_PATH, "w") as f:
-        json.dump(chats, f, indent=2, default=str)
+    chats_table.replace_all(chats)
 
-def get_document_db():
-    try:
-        with open(DOCUMENTS_DB_PATH, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+def get_document_db() -> List[Dict[str, Any]]:
+    return documents_table.all()
 
 def save_document_db(documents):
-    with open(DOCUMENTS_DB_PATH, "w") as f:
-        json.dump(documents, f, indent=2, default=str)
+    documents_table.replace_all(documents)
 
-def get_message_db():
-    try:
-        with open(MESSAGES_DB_PATH, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+def get_message_db() -> List[Dict[str, Any]]:
+    return messages_table.all()
 
 def save_message_db(messages):
-    with open(MESSAGES_DB_PATH, "w") as f:
-        json.dump(messages, f, indent=2, default=str)
+    messages_table.replace_all(messages)
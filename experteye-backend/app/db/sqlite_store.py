@@ -0,0 +1,272 @@
+
+"""SQLite storage backend exposing the same collection API as JsonCollection"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.db.pagination import encode_cursor, decode_cursor
+
+# Every table stores the full row as JSON in ``data``; the columns listed here
+# are copied out of the row so they can be indexed and queried.
+TABLE_SCHEMAS = {
+    "users": {
+        "columns": {
+            "username": "TEXT NOT NULL COLLATE NOCASE",
+            "email": "TEXT NOT NULL COLLATE NOCASE",
+            "created_at": "TEXT",
+            "password_fingerprint": "TEXT",
+        },
+        "indexes": [
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_users_username ON users(username COLLATE NOCASE)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email ON users(email COLLATE NOCASE)",
+            "CREATE INDEX IF NOT EXISTS ix_users_password_fingerprint ON users(password_fingerprint)",
+        ],
+        "order_by": "rowid",
+    },
+    "chats": {
+        "columns": {
+            "user_id": "TEXT NOT NULL",
+            "created_at": "TEXT",
+        },
+        "indexes": [
+            "CREATE INDEX IF NOT EXISTS ix_chats_user_created ON chats(user_id, created_at, id)",
+        ],
+        "dropped_indexes": ["ix_chats_user_id"],
+        "order_by": "created_at, id",
+    },
+    "messages": {
+        "columns": {
+            "chat_id": "TEXT NOT NULL",
+            "created_at": "TEXT",
+        },
+        "indexes": [
+            "CREATE INDEX IF NOT EXISTS ix_messages_chat_created_id ON messages(chat_id, created_at, id)",
+        ],
+        "dropped_indexes": ["ix_messages_chat_created"],
+        "order_by": "created_at, id",
+    },
+    "documents": {
+        "columns": {
+            "user_id": "TEXT NOT NULL",
+            "created_at": "TEXT",
+            "content_hash": "TEXT",
+        },
+        "indexes": [
+            "CREATE INDEX IF NOT EXISTS ix_documents_user_created ON documents(user_id, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents(content_hash)",
+        ],
+        "dropped_indexes": ["ix_documents_user_id"],
+        "order_by": "created_at, id",
+    },
+}
+
+
+class SqliteDatabase:
+    """Owns the SQLite file, its schema and one connection per thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit mode; multi-statement work uses transaction() explicitly
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside a write transaction, taking the lock up front"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def init_schema(self) -> None:
+        """Create tables and indexes if they don't exist yet"""
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_meta (key TEXT PRIMARY KEY, value TEXT)")
+            for name, schema in TABLE_SCHEMAS.items():
+                columns = ", ".join(f"{column} {ddl}" for column, ddl in schema["columns"].items())
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, {columns}, data TEXT NOT NULL)"
+                )
+                # Columns added after the table was first created
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({name})")}
+                for column, ddl in schema["columns"].items():
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {name} ADD COLUMN {column} {ddl}")
+                        conn.execute(f"UPDATE {name} SET {column} = json_extract(data, '$.{column}')")
+                for index_sql in schema["indexes"]:
+                    conn.execute(index_sql)
+                # Superseded by the (fk, created_at, id) pagination indexes
+                for index_name in schema.get("dropped_indexes", []):
+                    conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.connect().execute("SELECT value FROM schema_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.connect().execute(
+            "INSERT OR REPLACE INTO schema_meta (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def table(self, name: str) -> "SqliteCollection":
+        return SqliteCollection(self, name)
+
+
+class SqliteCollection:
+    """A table that behaves like JsonCollection (dict rows, get/find/insert/...)"""
+
+    def __init__(self, database: SqliteDatabase, name: str):
+        if name not in TABLE_SCHEMAS:
+            raise ValueError(f"Unknown table: {name}")
+        self.database = database
+        self.name = name
+        self.columns = tuple(TABLE_SCHEMAS[name]["columns"])
+        self.order_by = TABLE_SCHEMAS[name]["order_by"]
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+
+    def subscribe(self, listener: Callable[[Optional[str]], None]) -> None:
+        """Call ``listener(row_id)`` after a row changes (row_id None: everything may have)"""
+        self._listeners.append(listener)
+
+    def _notify(self, row_id: Optional[str]) -> None:
+        for listener in self._listeners:
+            listener(row_id)
+
+    def _params(self, row: Dict[str, Any]) -> tuple:
+        return (row["id"], *(row.get(column) for column in self.columns), json.dumps(row, default=str))
+
+    def _insert_sql(self, verb: str = "INSERT") -> str:
+        names = ", ".join(("id",) + self.columns + ("data",))
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 2))
+        return f"{verb} INTO {self.name} ({names}) VALUES ({placeholders})"
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+        sql = f"SELECT data FROM {self.name} {where} ORDER BY {self.order_by}"
+        return [json.loads(data) for (data,) in self.database.connect().execute(sql, params)]
+
+    def _check_field(self, field: str) -> None:
+        if field != "id" and field not in self.columns:
+            raise KeyError(f"Field '{field}' is not indexed in table {self.name}")
+
+    # Reads
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._select()
+
+    def count(self) -> int:
+        return self.database.connect().execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        row = self.database.connect().execute(
+            f"SELECT data FROM {self.name} WHERE id = ?", (row_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        self._check_field(field)
+        return self._select(f"WHERE {field} = ?", (value,))
+
+    def page(
+        self,
+        field: str,
+        value: Any,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of ``find(field, value)`` in (created_at, id) order, via the
+        (field, created_at, id) index"""
+        self._check_field(field)
+        conditions = [f"{field} = ?"]
+        params: List[Any] = [value]
+        if cursor:
+            conditions.append(f"(created_at, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(decode_cursor(cursor))
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT data FROM {self.name} WHERE {' AND '.join(conditions)} "
+            f"ORDER BY created_at {direction}, id {direction} LIMIT ?"
+        )
+        # Fetch one extra row to learn whether another page exists
+        rows = [json.loads(data) for (data,) in self.database.connect().execute(sql, (*params, limit + 1))]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, (encode_cursor(rows[-1]) if rows and has_more else None)
+
+    # Writes
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            self.database.connect().execute(self._insert_sql(), self._params(row))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Duplicate {self.name} row: {e}") from e
+        return dict(row)
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk insert, skipping rows whose id or unique keys already exist.
+
+        Returns the number of rows actually inserted.
+        """
+        with self.database.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(self._insert_sql("INSERT OR IGNORE"), [self._params(row) for row in rows])
+            return conn.total_changes - before
+
+    def update(self, row_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            with self.database.transaction() as conn:
+                found = conn.execute(f"SELECT data FROM {self.name} WHERE id = ?", (row_id,)).fetchone()
+                if found is None:
+                    return None
+                row = json.loads(found[0])
+                row.update(changes)
+                assignments = ", ".join(f"{column} = ?" for column in self.columns + ("data",))
+                conn.execute(
+                    f"UPDATE {self.name} SET {assignments} WHERE id = ?",
+                    (*self._params(row)[1:], row_id)
+                )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Conflicting {self.name} row: {e}") from e
+        self._notify(row_id)
+        return row
+
+    def delete(self, row_id: str) -> Optional[Dict[str, Any]]:
+        with self.database.transaction() as conn:
+            found = conn.execute(f"SELECT data FROM {self.name} WHERE id = ?", (row_id,)).fetchone()
+            if found is None:
+                return None
+            conn.execute(f"DELETE FROM {self.name} WHERE id = ?", (row_id,))
+        self._notify(row_id)
+        return json.loads(found[0])
+
+    def delete_where(self, field: str, value: Any) -> int:
+        self._check_field(field)
+        cursor = self.database.connect().execute(f"DELETE FROM {self.name} WHERE {field} = ?", (value,))
+        if cursor.rowcount:
+            self._notify(None)
+        return cursor.rowcount
+
+    def replace_all(self, rows: List[Dict[str, Any]]) -> None:
+        with self.database.transaction() as conn:
+            conn.execute(f"DELETE FROM {self.name}")
+            conn.executemany(self._insert_sql("INSERT OR IGNORE"), [self._params(row) for row in rows])
+        self._notify(None)
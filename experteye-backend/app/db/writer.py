@@ -0,0 +1,170 @@
+
+"""Write-behind writer that group-commits JSON database mutations"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write ``data`` to a temp file, fsync it and rename it over ``path``"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class WriteBehindWriter:
+    """Coalesces mutations that arrive within a short window into one flush.
+
+    Collections call ``schedule(self)`` after changing their in-memory state
+    instead of writing the file themselves. A background thread waits
+    ``window`` seconds for more mutations to pile up, then asks every dirty
+    collection to ``persist()`` once. ``flush()`` is a durability barrier: it
+    returns only after every mutation scheduled before the call is on disk.
+    """
+
+    def __init__(self, window: float = 0.05):
+        self.window = window
+        self._cond = threading.Condition()
+        self._dirty: Dict[int, Any] = {}
+        self._requested = 0   # sequence number of the last scheduled mutation
+        self._completed = 0   # every mutation up to this number is on disk
+        self._urgent = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._metrics = {
+            "mutations": 0,
+            "flushes": 0,
+            "files_written": 0,
+            "fsyncs": 0,
+            "flush_errors": 0,
+            "last_flush_seconds": 0.0,
+            "max_batch_size": 0,
+        }
+
+    def schedule(self, target) -> None:
+        """Mark ``target`` as needing a ``persist()`` in the next flush"""
+        with self._cond:
+            self._dirty[id(target)] = target
+            self._requested += 1
+            self._metrics["mutations"] += 1
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+        if self._closed:
+            # After shutdown there is no worker left; write through
+            self._flush_pending()
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """Block until everything scheduled so far has been persisted.
+
+        Returns False if that didn't happen within ``timeout`` seconds.
+        """
+        with self._cond:
+            target = self._requested
+            if self._completed >= target:
+                return True
+            if self._thread is None:
+                worker_running = False
+            else:
+                worker_running = True
+                self._urgent = True
+                self._cond.notify_all()
+
+        if not worker_running:
+            self._flush_pending()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._completed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def record_fsync(self, count: int = 1) -> None:
+        """Let targets report the fsyncs they issued while persisting"""
+        with self._cond:
+            self._metrics["fsyncs"] += count
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["pending_mutations"] = self._requested - self._completed
+            metrics["window_seconds"] = self.window
+            return metrics
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Flush outstanding writes and stop the background thread.
+
+        Gives up after ``timeout`` seconds (e.g. a file that keeps failing to
+        persist) and reports what is left unflushed.
+        """
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5.0)
+        self._flush_pending()
+        with self._cond:
+            pending = self._requested - self._completed
+            unflushed = [str(getattr(target, 'path', target)) for target in self._dirty.values()]
+        if pending:
+            print(f"Database writer closed with {pending} mutations not on disk: {', '.join(unflushed) or 'unknown files'}")
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    # close() does the final flush itself
+                    return
+                # Give other mutations a chance to join this batch; schedule()
+                # notifies on every mutation, so wait out the whole window
+                deadline = time.monotonic() + self.window
+                while not self._urgent and not self._closed and (left := deadline - time.monotonic()) > 0:
+                    self._cond.wait(left)
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        with self._cond:
+            batch = list(self._dirty.values())
+            self._dirty.clear()
+            sequence = self._requested
+            self._urgent = False
+            batch_size = sequence - self._completed
+
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        failed = []
+        for target in batch:
+            try:
+                target.persist()
+            except Exception as e:
+                print(f"Error persisting {getattr(target, 'path', target)}: {str(e)}")
+                failed.append(target)
+
+        with self._cond:
+            self._metrics["flushes"] += 1
+            self._metrics["files_written"] += len(batch) - len(failed)
+            self._metrics["last_flush_seconds"] = time.perf_counter() - start
+            self._metrics["max_batch_size"] = max(self._metrics["max_batch_size"], batch_size)
+            if failed:
+                # Retry on the next round; the barrier stays closed until they succeed
+                self._metrics["flush_errors"] += len(failed)
+                for target in failed:
+                    self._dirty[id(target)] = target
+            else:
+                self._completed = max(self._completed, sequence)
+            self._cond.notify_all()
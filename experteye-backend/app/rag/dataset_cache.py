@@ -0,0 +1,87 @@
+
+"""Columnar (Parquet) copies of tabular datasets and their registered schema"""
+import os
+import json
+import logging
+import uuid
+from importlib.util import find_spec
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("DocumentIntelligence.DatasetCache")
+
+PARQUET_SUPPORT = find_spec("pyarrow") is not None
+
+# Schema metadata key holding column labels and the dataset label
+_METADATA_KEY = b"experteye"
+
+def dataset_cache_path(file_path: str) -> str:
+    """The Parquet copy lives next to the dataset (content-addressed blobs share it)"""
+    return f"{file_path}.parquet"
+
+class DatasetCacheWriter:
+    """Writes DataFrame chunks as row groups of one Parquet file.
+    
+    The file only appears at its final path on close(); abort() (or an error)
+    leaves nothing behind. The schema is fixed by the first chunk.
+    """
+    
+    def __init__(self, file_path: str, column_labels: Optional[Dict[str, str]] = None, label: Optional[str] = None):
+        self.path = dataset_cache_path(file_path)
+        self.temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self.metadata = json.dumps({"column_labels": column_labels or {}, "label": label or ""})
+        self._writer = None
+        self._schema = None
+    
+    def write(self, df) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        if self._writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._schema = table.schema.with_metadata({_METADATA_KEY: self.metadata})
+            self._writer = pq.ParquetWriter(self.temp_path, self._schema, compression="zstd")
+            table = table.replace_schema_metadata(self._schema.metadata)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+    
+    def close(self) -> Optional[str]:
+        """Finish the file and move it into place; returns its path"""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        os.replace(self.temp_path, self.path)
+        return self.path
+    
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def read_dataset_schema(parquet_path: str) -> Dict[str, Any]:
+    """Schema of a cached dataset as stored on its document row: path, row
+    count, label and columns (name, Arrow type, label)"""
+    import pyarrow.parquet as pq
+    
+    parquet_file = pq.ParquetFile(parquet_path)
+    schema = parquet_file.schema_arrow
+    extra = json.loads((schema.metadata or {}).get(_METADATA_KEY, b"{}"))
+    labels = extra.get("column_labels", {})
+    return {
+        "parquet_path": parquet_path,
+        "rows": parquet_file.metadata.num_rows,
+        "row_groups": parquet_file.metadata.num_row_groups,
+        "label": extra.get("label", ""),
+        "columns": [
+            {"name": field.name, "type": str(field.type), "label": labels.get(field.name) or ""}
+            for field in schema
+        ],
+    }
+
+def remove_dataset_cache(file_path: str) -> None:
+    path = dataset_cache_path(file_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,171 @@
+"""On-disk cache of extracted document text, keyed by content hash and extractor"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+from langchain_core.documents import Document
+
+logger = logging.getLogger("DocumentIntelligence.ExtractionCache")
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=6, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _temp_path(path: str) -> str:
+    # Keeps the .gz extension, so _open compresses the file it's renamed to
+    root, ext = os.path.splitext(path)
+    return f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+
+def _serialize(doc: Document) -> str:
+    return json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, default=str) + "\n"
+
+def write_documents(path: str, documents: Iterable[Document], header: Optional[Dict[str, Any]] = None) -> int:
+    """Write documents as JSON lines (gzip-compressed for a .gz path) after a
+    header line, atomically. Returns the number of documents written."""
+    temp_path = _temp_path(path)
+    count = 0
+    try:
+        with _open(temp_path, 'wt') as f:
+            f.write(json.dumps(header or {}) + "\n")
+            for doc in documents:
+                f.write(_serialize(doc))
+                count += 1
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+def read_header(path: str) -> Dict[str, Any]:
+    with _open(path, 'rt') as f:
+        return json.loads(f.readline())
+
+# What reading a truncated or corrupt entry raises
+_READ_ERRORS = (OSError, EOFError, zlib.error, ValueError, KeyError)
+
+class CorruptEntryError(Exception):
+    """A cache entry turned out to be truncated or corrupt while it was read"""
+
+def iter_documents(path: str) -> Iterator[Document]:
+    """Documents written by write_documents, read one line at a time"""
+    with _open(path, 'rt') as f:
+        f.readline()
+        for line in f:
+            entry = json.loads(line)
+            yield Document(page_content=entry["page_content"], metadata=entry["metadata"])
+
+class ExtractionCache:
+    """Extracted pages/sections stored as gzip-compressed JSON lines.
+    
+    Entries are keyed by the file's SHA-256 plus an extractor id that includes
+    its version and the settings its output depends on, so changing an
+    extractor's output (bumping its version) or one of those settings
+    invalidates exactly that extractor's entries. Writes are atomic, so
+    concurrent workers can share one cache directory.
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+    
+    def _path(self, content_hash: str, extractor: str) -> str:
+        safe_extractor = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in extractor)
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}.{safe_extractor}.jsonl.gz")
+    
+    def _discard(self, path: str, error: Exception) -> None:
+        logger.warning(f"Removing unreadable extraction cache entry {path}: {error}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def open(self, content_hash: str, extractor: str) -> Optional[Iterator[Document]]:
+        """Stream cached documents, or None on a miss.
+        
+        An entry whose header can't be read is removed and is a miss. One
+        that turns out to be truncated or corrupt further on is removed and
+        raises CorruptEntryError from the stream, after the documents read
+        before the damage.
+        """
+        path = self._path(content_hash, extractor)
+        if not os.path.exists(path):
+            return None
+        try:
+            header = read_header(path)
+        except _READ_ERRORS as e:
+            self._discard(path, e)
+            return None
+        if header.get("content_hash") != content_hash or header.get("extractor") != extractor:
+            return None
+        return self._read(path)
+    
+    def _read(self, path: str) -> Iterator[Document]:
+        try:
+            yield from iter_documents(path)
+        except _READ_ERRORS as e:
+            self._discard(path, e)
+            raise CorruptEntryError(path) from e
+    
+    def write_through(self, content_hash: str, extractor: str, documents: Iterable[Document]) -> Iterator[Document]:
+        """Pass documents through, writing them to the cache on the way.
+        
+        The entry is only stored once the stream is exhausted and non-empty;
+        an extractor error or a consumer that stops early leaves no entry.
+        Neither does an extractor generator that returns False, its way of
+        marking output this environment could only produce in part (such
+        as scanned pages without OCR installed).
+        """
+        path = self._path(content_hash, extractor)
+        temp_path = _temp_path(path)
+        f = None
+        count = 0
+        try:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                f = _open(temp_path, 'wt')
+                f.write(json.dumps({"content_hash": content_hash, "extractor": extractor, "created_at": time.time()}) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write extraction cache entry {path}: {e}")
+                f = None
+            
+            documents = iter(documents)
+            while True:
+                try:
+                    doc = next(documents)
+                except StopIteration as stop:
+                    complete = stop.value is not False
+                    break
+                if f is not None:
+                    try:
+                        f.write(_serialize(doc))
+                    except OSError as e:
+                        logger.warning(f"Could not write extraction cache entry {path}: {e}")
+                        f.close()
+                        f = None
+                count += 1
+                yield doc
+            
+            if f is not None:
+                f.close()
+                f = None
+                # Empty or partial results aren't cached, so a later run (e.g. with OCR installed) can retry
+                if count and complete:
+                    os.replace(temp_path, path)
+        finally:
+            if f is not None:
+                f.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -2,11 +2,12 @@
 """Persistent vector store implementation with change tracking"""
 import os
 import logging
+import threading
 import time
+import uuid
 from typing import List, Dict, Set, Optional, Tuple, Any
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
-from langchain_community.vectorstores import FAISS
 
 from app.rag.store_utils import save_json_safely, load_json_safely, create_backup
 from app.rag.background_processor import BackgroundProcessor
@@ -26,9 +27,11 @@ class PersistentVectorStore:
         self.storage_dir = storage_dir
         self.debug = debug
         self.vector_store = None
+        # Guards the FAISS index against concurrent adds and saves
+        self._lock = threading.RLock()
         
         # File tracking
-        self.document_hashes = {}
+        self.document_hashes = {}       # content hash -> filename it was indexed from
         self.processed_files = set()
         
         # Create storage directory
@@ -82,37 +85,40 @@ class PersistentVectorStore:
             logger.warning("No vector store to save")
             return
         
-        try:
-            start_time = time.time()
-            logger.info("Saving vector store to disk...")
-            
-            # Create backup
-            backup_dir = os.path.join(self.storage_dir, "backups")
-            if os.path.exists(self.vector_store_path):
-                create_backup(self.vector_store_path, backup_dir)
-                create_backup(self.vector_store_pkl_path, backup_dir)
-            
-            # Save to temporary files first
-            temp_base = os.path.join(self.storage_dir, "vector_store.temp")
-            self.vector_store.save_local(self.storage_dir, "vector_store.temp")
-            
-            # If successful, rename to final destination
-            temp_faiss = f"{temp_base}.faiss"
-            temp_pkl = f"{temp_base}.pkl"
-            if os.path.exists(temp_faiss) and os.path.exists(temp_pkl):
-                os.replace(temp_faiss, self.vector_store_path)
-                os.replace(temp_pkl, self.vector_store_pkl_path)
-            
-            save_time = time.time() - start_time
-            logger.info(f"Saved vector store in {save_time:.2f} seconds")
-            
-        except Exception as e:
-            logger.error(f"Error saving vector store: {e}")
+        with self._lock:
+            try:
+                start_time = time.time()
+                logger.info("Saving vector store to disk...")
+                
+                # Create backup
+                backup_dir = os.path.join(self.storage_dir, "backups")
+                if os.path.exists(self.vector_store_path):
+                    create_backup(self.vector_store_path, backup_dir)
+                    create_backup(self.vector_store_pkl_path, backup_dir)
+                
+                # Save to temporary files first
+                temp_base = os.path.join(self.storage_dir, "vector_store.temp")
+                self.vector_store.save_local(self.storage_dir, "vector_store.temp")
+                
+                # If successful, rename to final destination
+                temp_faiss = f"{temp_base}.faiss"
+                temp_pkl = f"{temp_base}.pkl"
+                if os.path.exists(temp_faiss) and os.path.exists(temp_pkl):
+                    os.replace(temp_faiss, self.vector_store_path)
+                    os.replace(temp_pkl, self.vector_store_pkl_path)
+                
+                save_time = time.time() - start_time
+                logger.info(f"Saved vector store in {save_time:.2f} seconds")
+                
+            except Exception as e:
+                logger.error(f"Error saving vector store: {e}")
     
     def load_vector_store(self) -> bool:
         """Load existing vector store from disk"""
         if os.path.exists(self.vector_store_path) and os.path.exists(self.vector_store_pkl_path):
             try:
+                from langchain_community.vectorstores import FAISS
+                
                 start_time = time.time()
                 logger.info("Loading vector store from disk...")
                 
@@ -159,6 +165,72 @@ class PersistentVectorStore:
             logger.error(f"Error performing similarity search with score: {e}")
             return []
     
+    def is_indexed(self, content_hash: str) -> bool:
+        """Check if content with this hash already has chunks in the vector store"""
+        return content_hash in self.document_hashes
+    
+    def mark_indexed(self, filename: str, content_hash: str) -> None:
+        """Record that a file's chunks are in the vector store"""
+        with self._lock:
+            self.document_hashes.setdefault(content_hash, filename)
+            self.processed_files.add(filename)
+            self.save_metadata()
+    
+    def forget_content(self, content_hash: str) -> int:
+        """Drop the chunks and hash entry of content no document uses any more.
+        
+        Returns the number of chunks removed.
+        """
+        with self._lock:
+            filename = self.document_hashes.pop(content_hash, None)
+            if filename is not None and filename not in self.document_hashes.values():
+                self.processed_files.discard(filename)
+            ids = []
+            if self.vector_store is not None:
+                docstore = self.vector_store.docstore
+                ids = [
+                    doc_id for doc_id in self.vector_store.index_to_docstore_id.values()
+                    if docstore.search(doc_id).metadata.get("content_hash") == content_hash
+                ]
+                if ids:
+                    self.vector_store.delete(ids)
+                    self.save_vector_store()
+            self.save_metadata()
+        logger.info(f"Removed {len(ids)} chunks of content {content_hash[:12]}")
+        return len(ids)
+    
+    def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        """Embed document chunks (one batched call to the embeddings model)"""
+        return self.embeddings.embed_documents([doc.page_content for doc in documents])
+    
+    def add_embedded_documents(self, documents: List[Document], vectors: List[List[float]]) -> List[str]:
+        """Add already-embedded chunks to the index, creating it on first use.
+        
+        Returns the ids of the added chunks (see remove_documents).
+        """
+        from langchain_community.vectorstores import FAISS
+        
+        text_embeddings = [(doc.page_content, vector) for doc, vector in zip(documents, vectors)]
+        metadatas = [dict(doc.metadata) for doc in documents]
+        ids = [str(uuid.uuid4()) for _ in documents]
+        with self._lock:
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return ids
+    
+    def remove_documents(self, ids: List[str]) -> None:
+        """Drop chunks added by add_embedded_documents (e.g. of a failed ingestion)"""
+        with self._lock:
+            if self.vector_store is not None and ids:
+                self.vector_store.delete(ids)
+    
+    def add_documents(self, documents: List[Document]) -> None:
+        """Embed and index document chunks"""
+        if documents:
+            self.add_embedded_documents(documents, self.embed_documents(documents))
+    
     def get_processed_files(self) -> Set[str]:
         """Get set of processed files"""
         return self.processed_files
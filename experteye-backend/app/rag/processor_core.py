@@ -2,24 +2,190 @@
 """Core document processor implementation"""
 import os
 import logging
-from typing import List, Dict
+import time
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from langchain_core.documents import Document
 
+from app.core.config import settings
+from app.rag.extraction_cache import CorruptEntryError, ExtractionCache, file_sha256, write_documents
+from app.rag.store_utils import save_json_safely
 from app.rag.processors.text_extraction import (
-    process_pdf,
-    process_text_file,
-    EXCEL_SUPPORT,
-    WORD_SUPPORT
+    iter_pdf_pages,
+    iter_text_file,
+    OCR_AVAILABLE,
+    PDF_EXTRACTOR_VERSION,
+    TEXT_EXTRACTOR_VERSION
+)
+from app.rag.processors.office_extraction import (
+    iter_docx,
+    iter_xlsx,
+    iter_pptx,
+    DOCX_EXTRACTOR_VERSION,
+    XLSX_EXTRACTOR_VERSION,
+    PPTX_EXTRACTOR_VERSION
 )
 from app.rag.processors.sas_processor import (
-    process_sas_data,
-    process_sas_program
+    iter_sas_data,
+    iter_sas_program,
+    SAS_DATA_EXTRACTOR_VERSION,
+    SAS_PROGRAM_EXTRACTOR_VERSION
 )
-from app.rag.processors.document_chunking import split_documents
+from app.rag.processors.document_chunking import iter_split_documents
 from app.rag.persistent_store import PersistentVectorStore
 
 logger = logging.getLogger("DocumentIntelligence.Processor")
 
+def _extractor_id(version: str, **options: Any) -> str:
+    """Extraction cache id: the extractor's version plus the settings (and
+    installed features) its output depends on, so changing one re-extracts"""
+    return "+".join([version] + [f"{key}-{value}" for key, value in options.items()])
+
+_TEXT_EXTRACTOR = _extractor_id(TEXT_EXTRACTOR_VERSION, section=settings.TEXT_SECTION_CHARS)
+
+# Extension -> (extractor id, streaming extraction function)
+EXTRACTORS = {
+    '.pdf': (_extractor_id(PDF_EXTRACTOR_VERSION, ocr=settings.OCR_DPI if OCR_AVAILABLE else "none"), iter_pdf_pages),
+    '.txt': (_TEXT_EXTRACTOR, iter_text_file),
+    '.md': (_TEXT_EXTRACTOR, iter_text_file),
+    '.csv': (_TEXT_EXTRACTOR, iter_text_file),
+    '.json': (_TEXT_EXTRACTOR, iter_text_file),
+    '.docx': (_extractor_id(DOCX_EXTRACTOR_VERSION, section=settings.TEXT_SECTION_CHARS), iter_docx),
+    '.xlsx': (_extractor_id(XLSX_EXTRACTOR_VERSION, rows=settings.SPREADSHEET_ROWS_PER_BLOCK), iter_xlsx),
+    '.pptx': (PPTX_EXTRACTOR_VERSION, iter_pptx),
+    '.sas7bdat': (
+        _extractor_id(
+            SAS_DATA_EXTRACTOR_VERSION,
+            rows=int(settings.SAS_INCLUDE_ROWS),
+            max=settings.SAS_MAX_ROWS,
+            block=settings.SAS_ROWS_PER_BLOCK,
+            sample=settings.SAS_SAMPLE_ROWS,
+            top=settings.SAS_PROFILE_TOP_K,
+            card=settings.SAS_CARD_COLUMNS
+        ),
+        iter_sas_data
+    ),
+    '.sas': (SAS_PROGRAM_EXTRACTOR_VERSION, iter_sas_program),
+}
+
+# File types extract_document knows how to read
+SUPPORTED_EXTENSIONS = list(EXTRACTORS)
+
+# extract_and_spool rewrites its progress file at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+
+extraction_cache = ExtractionCache(settings.EXTRACTION_CACHE_DIR) if settings.EXTRACTION_CACHE_DIR else None
+
+def iter_document(
+    file_path: str,
+    filename: str,
+    content_hash: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> Iterator[Document]:
+    """Stream the pages/sections of a file, dispatching on the extension of ``filename``
+    
+    With ``content_hash`` the extraction cache is read from on a hit and
+    written through on a miss. ``stats["extraction_cached"]`` records which
+    happened. An entry found to be corrupt while it's read is a miss: the
+    file is extracted again, past the documents already yielded from the
+    entry. Extraction errors propagate.
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in EXTRACTORS:
+        logger.warning(f"Unsupported file type: {file_ext}")
+        return
+    
+    extractor, extract = EXTRACTORS[file_ext]
+    cached = None
+    if extraction_cache is not None and content_hash:
+        cached = extraction_cache.open(content_hash, extractor)
+    if stats is not None:
+        stats["extraction_cached"] = cached is not None
+    
+    served = 0
+    if cached is not None:
+        try:
+            for doc in cached:
+                # Same content may have been uploaded under another name
+                doc.metadata['source'] = filename
+                served += 1
+                yield doc
+            return
+        except CorruptEntryError:
+            if stats is not None:
+                stats["extraction_cached"] = False
+    
+    documents = extract(file_path, filename)
+    if extraction_cache is not None and content_hash:
+        documents = extraction_cache.write_through(content_hash, extractor, documents)
+    yield from islice(documents, served, None)
+
+def extract_document(file_path: str, filename: str, content_hash: Optional[str] = None) -> List[Document]:
+    """Extract text from a file, dispatching on the extension of ``filename``
+    
+    Materialized form of iter_document; errors are logged and give [].
+    """
+    try:
+        return list(iter_document(file_path, filename, content_hash))
+    except Exception as e:
+        logger.error(f"Error extracting {filename}: {str(e)}")
+        return []
+
+def extract_and_spool(
+    file_path: str,
+    filename: str,
+    spool_path: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+    metadata: Optional[Dict[str, Any]] = None,
+    content_hash: Optional[str] = None,
+    progress_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Extract and chunk one file into ``spool_path``, returning stage stats.
+    
+    Pages stream through the chunker into the spool file (read back with
+    extraction_cache.iter_documents), so memory stays at about one page
+    whatever the file size. Module-level and free of shared state so it can
+    run in a worker process. With ``progress_path``, the pages extracted so
+    far (and the page count, when the format has one) are written there as
+    JSON every PROGRESS_INTERVAL seconds, for the process that waits on it.
+    """
+    stats: Dict[str, Any] = {"pages": 0, "chunks": 0}
+    extract_seconds = 0.0
+    total_pages = None
+    reported = time.monotonic()
+    
+    def pages() -> Iterator[Document]:
+        nonlocal extract_seconds, total_pages, reported
+        documents = iter_document(file_path, filename, content_hash, stats)
+        while True:
+            start = time.perf_counter()
+            page = next(documents, None)
+            extract_seconds += time.perf_counter() - start
+            if page is None:
+                return
+            stats["pages"] += 1
+            total_pages = page.metadata.get("total_pages", total_pages)
+            if progress_path and time.monotonic() - reported >= PROGRESS_INTERVAL:
+                save_json_safely({"pages": stats["pages"], "total_pages": total_pages}, progress_path)
+                reported = time.monotonic()
+            yield page
+    
+    def chunks() -> Iterator[Document]:
+        for chunk in iter_split_documents(pages(), chunk_size, chunk_overlap):
+            if metadata:
+                chunk.metadata.update(metadata)
+            stats["chunks"] += 1
+            yield chunk
+    
+    start = time.perf_counter()
+    write_documents(spool_path, chunks(), {"source": filename})
+    total_seconds = time.perf_counter() - start
+    stats["extract_seconds"] = round(extract_seconds, 4)
+    # Chunking plus writing the spool file
+    stats["chunk_seconds"] = round(total_seconds - extract_seconds, 4)
+    return stats
+
 class DocumentProcessor:
     """Handles document loading and processing with incremental updates"""
     
@@ -36,9 +202,8 @@ class DocumentProcessor:
         self.debug = debug
         self.storage_dir = storage_dir
         
-        # Document storage
-        self.all_document_content = {}  # Maps filename to full content
-        self.document_metadata = {}     # Additional metadata about documents
+        # Additional metadata about documents
+        self.document_metadata = {}
         
         # Initialize vector store
         self.vector_store = PersistentVectorStore(
@@ -47,47 +212,59 @@ class DocumentProcessor:
             debug=debug
         )
 
-    def process_document(self, file_path: str) -> List[Document]:
-        """Process a single document"""
+    def iter_document_chunks(
+        self,
+        file_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Iterator[Document]:
+        """Stream a document's chunks, extracting one page/section at a time
+        
+        ``filename`` names the original upload when ``file_path`` is a
+        content-addressed blob without an extension. Extraction is served
+        from the extraction cache when the content was extracted before.
+        Errors propagate.
+        """
+        filename = filename or os.path.basename(file_path)
+        file_ext = os.path.splitext(filename)[1].lower()
+        pages = 0
+        
+        def counted(documents: Iterable[Document]) -> Iterator[Document]:
+            nonlocal pages
+            for document in documents:
+                pages += 1
+                yield document
+        
+        documents = iter_document(file_path, filename, content_hash or file_sha256(file_path))
+        yield from iter_split_documents(counted(documents), self.chunk_size, self.chunk_overlap)
+        
+        if pages:
+            self.document_metadata[filename] = {
+                'pages': pages,
+                'path': file_path,
+                'size': os.path.getsize(file_path),
+                'last_modified': os.path.getmtime(file_path),
+                'filename': filename,
+                'extension': file_ext,
+                'type': self._get_doc_type(file_ext)
+            }
+    
+    def process_document(
+        self,
+        file_path: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> List[Document]:
+        """Process a single document
+        
+        Materialized form of iter_document_chunks; errors are logged and give [].
+        """
         if not os.path.exists(file_path):
             logger.error(f"File not found: {file_path}")
             return []
-            
-        filename = os.path.basename(file_path)
-        file_ext = os.path.splitext(filename)[1].lower()
         
-        # Process based on file type
-        documents = []
         try:
-            if file_ext == '.pdf':
-                documents = process_pdf(file_path, filename)
-            elif file_ext in ['.txt', '.md', '.csv', '.json']:
-                documents = process_text_file(file_path, filename)
-            elif file_ext == '.sas7bdat':
-                documents = process_sas_data(file_path, filename)
-            elif file_ext == '.sas':
-                documents = process_sas_program(file_path, filename)
-            else:
-                logger.warning(f"Unsupported file type: {file_ext}")
-                return []
-            
-            if documents:
-                # Store document content and metadata
-                self.all_document_content[filename] = "\n\n".join([doc.page_content for doc in documents])
-                self.document_metadata[filename] = {
-                    'pages': len(documents),
-                    'path': file_path,
-                    'size': os.path.getsize(file_path),
-                    'last_modified': os.path.getmtime(file_path),
-                    'filename': filename,
-                    'extension': file_ext,
-                    'type': self._get_doc_type(file_ext)
-                }
-                
-                # Split into chunks
-                return split_documents(documents, self.chunk_size, self.chunk_overlap)
-            
-            return []
+            return list(self.iter_document_chunks(file_path, filename, content_hash))
         except Exception as e:
             logger.error(f"Error processing document {file_path}: {str(e)}")
             return []
@@ -1,6 +1,6 @@
 
 """Document chunking and processing utilities"""
-from typing import List
+from typing import Iterable, Iterator, List
 from langchain_core.documents import Document
 from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
@@ -33,3 +33,13 @@ def split_documents(documents: List[Document], chunk_size: int = 500, chunk_over
     
     text_splitter = create_text_splitter(chunk_size, chunk_overlap)
     return text_splitter.split_documents(documents)
+
+def iter_split_documents(
+    documents: Iterable[Document],
+    chunk_size: int = 500,
+    chunk_overlap: int = 100
+) -> Iterator[Document]:
+    """Split documents into chunks lazily, one input document at a time"""
+    text_splitter = create_text_splitter(chunk_size, chunk_overlap)
+    for document in documents:
+        yield from text_splitter.split_documents([document])
@@ -0,0 +1,208 @@
+
+"""Native extractors for Word, Excel and PowerPoint files"""
+import os
+import logging
+from typing import Any, Iterator, List, Optional
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+logger = logging.getLogger("DocumentIntelligence.OfficeExtraction")
+
+# Bump when an extractor's output changes; cached extractions of older versions are ignored
+DOCX_EXTRACTOR_VERSION = "docx/2"
+XLSX_EXTRACTOR_VERSION = "xlsx/1"
+PPTX_EXTRACTOR_VERSION = "pptx/1"
+
+def _file_metadata(file_path: str, filename: str, doc_type: str, method: str) -> dict:
+    return {
+        'source': filename,
+        'doc_type': doc_type,
+        'extraction_method': method,
+        'file_size': os.path.getsize(file_path),
+        'last_modified': os.path.getmtime(file_path)
+    }
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\n", " ").replace("|", "/").strip()
+
+def _table_rows(rows: List[List[str]]) -> str:
+    return "\n".join("| " + " | ".join(row) + " |" for row in rows)
+
+def _logged(documents: Iterator[Document], filename: str, kind: str) -> Iterator[Document]:
+    emitted = 0
+    for doc in documents:
+        emitted += 1
+        yield doc
+    if emitted:
+        logger.info(f"Successfully processed {kind}: {filename}")
+    else:
+        logger.error(f"Could not extract text from {filename}")
+
+def iter_docx(file_path: str, filename: str, section_chars: Optional[int] = None) -> Iterator[Document]:
+    """Yield a Word document in body order, paragraph by paragraph
+    
+    Consecutive paragraphs under the same heading are grouped up to about
+    ``section_chars`` characters (TEXT_SECTION_CHARS unless given) so that
+    one-line paragraphs don't become chunks of their own; each group starts
+    with its heading path. Each table is a Document of its own. Metadata
+    carries the heading path and the paragraph range. Errors propagate.
+    """
+    return _logged(_iter_docx(file_path, filename, section_chars or settings.TEXT_SECTION_CHARS), filename, "Word document")
+
+def _iter_docx(file_path: str, filename: str, section_chars: int) -> Iterator[Document]:
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    
+    base_metadata = _file_metadata(file_path, filename, 'word', 'python-docx')
+    document = docx.Document(file_path)
+    headings: List[str] = []
+    paragraphs: List[str] = []
+    first_paragraph = 0
+    paragraph_number = 0
+    table_number = 0
+    
+    def block(text: str, **metadata: Any) -> Document:
+        return Document(page_content=text, metadata={**base_metadata, 'heading': " > ".join(headings), **metadata})
+    
+    def paragraph_block() -> Document:
+        # The heading path leads the text, as the slide title does for slides
+        text = "\n\n".join(([" > ".join(headings)] if headings else []) + paragraphs)
+        return block(text, element='paragraphs',
+                     paragraph_start=first_paragraph, paragraph_end=paragraph_number - 1)
+    
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            paragraph = Paragraph(child, document)
+            text = paragraph.text.strip()
+            style = paragraph.style.name if paragraph.style is not None else ""
+            is_heading = style.startswith('Heading') or style == 'Title'
+            if text and (is_heading or sum(map(len, paragraphs)) + len(text) > section_chars) and paragraphs:
+                yield paragraph_block()
+                paragraphs = []
+            if text and is_heading:
+                level = int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+                headings = headings[:level - 1] + [text]
+            elif text:
+                if not paragraphs:
+                    first_paragraph = paragraph_number
+                paragraphs.append(text)
+            paragraph_number += 1
+        elif tag == 'tbl':
+            if paragraphs:
+                yield paragraph_block()
+                paragraphs = []
+            rows = [[_cell_text(cell.text) for cell in row.cells] for row in Table(child, document).rows]
+            if any(any(row) for row in rows):
+                yield block(_table_rows(rows), element='table', table=table_number)
+            table_number += 1
+    
+    if paragraphs:
+        yield paragraph_block()
+
+def iter_xlsx(file_path: str, filename: str, rows_per_block: Optional[int] = None) -> Iterator[Document]:
+    """Yield each worksheet in blocks of ``rows_per_block`` rows
+    (SPREADSHEET_ROWS_PER_BLOCK unless given)
+    
+    The workbook is read in openpyxl's read-only mode, so rows are streamed
+    from the file rather than loaded as a whole. The first non-empty row of a
+    sheet is taken as its header and repeated at the top of every block.
+    Errors propagate.
+    """
+    return _logged(_iter_xlsx(file_path, filename, rows_per_block or settings.SPREADSHEET_ROWS_PER_BLOCK), filename, "Excel workbook")
+
+def _sheet_block(base_metadata: dict, sheet, sheet_index: int, rows: List[List[str]], row_start: int, row_end: int) -> Document:
+    return Document(
+        page_content=f"Sheet: {sheet.title}\n" + _table_rows(rows),
+        metadata={
+            **base_metadata,
+            'sheet': sheet.title,
+            'sheet_index': sheet_index,
+            'row_start': row_start,
+            'row_end': row_end
+        }
+    )
+
+def _iter_xlsx(file_path: str, filename: str, rows_per_block: int) -> Iterator[Document]:
+    import openpyxl
+    
+    base_metadata = _file_metadata(file_path, filename, 'excel', 'openpyxl')
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet_index, sheet in enumerate(workbook.worksheets):
+            header: Optional[List[str]] = None
+            header_row = 0
+            rows: List[List[str]] = []
+            first_row = last_row = 0
+            blocks = 0
+            for row_number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+                cells = [_cell_text(value) for value in values]
+                if not any(cells):
+                    continue
+                if header is None:
+                    header, header_row = cells, row_number
+                    continue
+                if not rows:
+                    first_row = row_number
+                rows.append(cells)
+                last_row = row_number
+                if len(rows) >= rows_per_block:
+                    yield _sheet_block(base_metadata, sheet, sheet_index, [header] + rows, first_row, row_number)
+                    rows = []
+                    blocks += 1
+            if rows:
+                yield _sheet_block(base_metadata, sheet, sheet_index, [header] + rows, first_row, last_row)
+            elif header is not None and not blocks:
+                # A sheet whose only content is one row
+                yield _sheet_block(base_metadata, sheet, sheet_index, [header], header_row, header_row)
+    finally:
+        workbook.close()
+
+def _shape_texts(shapes) -> Iterator[str]:
+    for shape in shapes:
+        if getattr(shape, 'has_text_frame', False) and shape.has_text_frame:
+            text = shape.text_frame.text.strip()
+            if text:
+                yield text
+        elif getattr(shape, 'has_table', False) and shape.has_table:
+            yield _table_rows([[_cell_text(cell.text) for cell in row.cells] for row in shape.table.rows])
+        elif hasattr(shape, 'shapes'):
+            # Grouped shapes
+            yield from _shape_texts(shape.shapes)
+
+def iter_pptx(file_path: str, filename: str) -> Iterator[Document]:
+    """Yield one Document per slide with its title, text, tables and speaker notes; errors propagate"""
+    return _logged(_iter_pptx(file_path, filename), filename, "PowerPoint file")
+
+def _iter_pptx(file_path: str, filename: str) -> Iterator[Document]:
+    from pptx import Presentation
+    
+    base_metadata = _file_metadata(file_path, filename, 'pptx', 'python-pptx')
+    presentation = Presentation(file_path)
+    total_slides = len(presentation.slides)
+    for number, slide in enumerate(presentation.slides, start=1):
+        title_shape = slide.shapes.title
+        title = title_shape.text_frame.text.strip() if title_shape is not None and title_shape.has_text_frame else ""
+        parts = [text for text in _shape_texts(slide.shapes) if text != title]
+        # A notes slide without a notes placeholder has no text frame
+        notes_frame = slide.notes_slide.notes_text_frame if slide.has_notes_slide else None
+        notes = notes_frame.text.strip() if notes_frame is not None else ""
+        if notes:
+            parts.append(f"Notes: {notes}")
+        if not title and not parts:
+            continue
+        
+        heading = f"Slide {number}: {title}" if title else f"Slide {number}"
+        yield Document(
+            page_content="\n\n".join([heading] + parts),
+            metadata={
+                **base_metadata,
+                'slide': number,
+                'total_slides': total_slides,
+                'title': title
+            }
+        )
@@ -1,175 +1,543 @@
 
 """SAS file processing utilities"""
 import os
+import re
 import logging
-from typing import List
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from langchain_core.documents import Document
-import pyreadstat
-import pandas as pd
+
+from app.core.config import settings
+from app.rag.dataset_cache import (
+    PARQUET_SUPPORT,
+    DatasetCacheWriter,
+    dataset_cache_path,
+    read_dataset_schema
+)
+from app.rag.sas_symbol_index import program_symbols
+from app.rag.processors.sas_tokenizer import iter_sas_sections
 
 logger = logging.getLogger("DocumentIntelligence.SASProcessor")
 
-def process_sas_data(file_path: str, filename: str) -> List[Document]:
-    """Process SAS data files (.sas7bdat)"""
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
-        return []
+# Bump when an extractor's output changes; cached extractions of older versions are ignored
+SAS_DATA_EXTRACTOR_VERSION = "sas-data/3"
+SAS_PROGRAM_EXTRACTOR_VERSION = "sas-program/3"
+
+def _dataset_metadata(file_path: str, filename: str) -> dict:
+    return {
+        'source': filename,
+        'extraction_method': 'pyreadstat',
+        'doc_type': 'sas_data',
+        'file_size': os.path.getsize(file_path),
+        'last_modified': os.path.getmtime(file_path)
+    }
+
+class _ColumnProfile:
+    """Running statistics of one column, updated a DataFrame chunk at a time"""
+    
+    # Distinct values tracked per column before only the most frequent are kept
+    MAX_TRACKED_VALUES = 10000
+    # Numeric columns without value labels with more distinct values than
+    # this get no top values, so they stop being counted past it
+    LOW_CARDINALITY = 20
+    
+    def __init__(self, name: str, label: Optional[str], sas_format: Optional[str], value_labels: Optional[dict]):
+        self.name = name
+        self.label = label
+        self.sas_format = sas_format
+        self.value_labels = value_labels or {}
+        self.kind = None
+        self.count = 0
+        self.nulls = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.values_counted = 0
+        self.categories: Counter = Counter()
+        self.truncated = False
+        self.high_cardinality = False
+    
+    def update(self, series) -> None:
+        import pandas as pd
         
-    try:
-        # Read SAS file
-        df, meta = pyreadstat.read_sas7bdat(file_path)
+        if self.kind is None:
+            if pd.api.types.is_bool_dtype(series) or not (
+                    pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)):
+                self.kind = 'character'
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                self.kind = 'datetime'
+            else:
+                self.kind = 'numeric'
         
-        # Get metadata as string
-        meta_str = "\n".join([f"{key}: {value}" for key, value in meta.__dict__.items() 
-                            if not key.startswith('_') and value is not None])
+        self.count += len(series)
+        values = series.dropna()
+        if self.kind == 'character':
+            # SAS stores missing character values as blanks
+            values = values[values.astype(str).str.strip() != ""]
+        self.nulls += len(series) - len(values)
+        if values.empty:
+            return
         
-        # Combine metadata and dataframe
-        text_content = f"Filename: {filename}\n\nMetadata:\n{meta_str}\n\nData:\n{df.to_string(index=True)}"
+        if self.kind != 'character':
+            low, high = values.min(), values.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+        if self.kind == 'numeric':
+            self.total += float(values.sum())
+            self.values_counted += len(values)
+        if self.kind != 'datetime' and not self.high_cardinality:
+            self.categories.update(values.value_counts(sort=False).to_dict())
+            if self.kind == 'numeric' and not self.value_labels and len(self.categories) > self.LOW_CARDINALITY:
+                self.categories.clear()
+                self.high_cardinality = True
+            elif len(self.categories) > self.MAX_TRACKED_VALUES:
+                self.categories = Counter(dict(self.categories.most_common(self.MAX_TRACKED_VALUES // 10)))
+                self.truncated = True
+    
+    def _value(self, value) -> str:
+        label = self.value_labels.get(value)
+        if isinstance(value, float):
+            value = f"{value:.6g}"
+        return f"{value} ({label})" if label is not None else str(value)
+    
+    def summary(self, top_k: int) -> str:
+        """One line of the dataset card"""
+        header = self.name + (f' "{self.label}"' if self.label else "")
+        kind = self.kind or 'empty'
+        if self.sas_format:
+            kind += f", format {self.sas_format}"
+        null_rate = self.nulls / self.count if self.count else 0.0
+        parts = [f"nulls {null_rate:.1%}"]
+        if self.minimum is not None:
+            parts.append(f"min {self._value(self.minimum)}, max {self._value(self.maximum)}")
+        if self.values_counted:
+            parts.append(f"mean {self.total / self.values_counted:.6g}")
         
-        # Create document
-        doc = Document(
-            page_content=text_content,
+        distinct = len(self.categories)
+        most_common = self.categories.most_common(top_k)
+        if self.high_cardinality:
+            parts.append(f"over {self.LOW_CARDINALITY} distinct")
+        elif self.truncated:
+            parts.append(f"over {self.MAX_TRACKED_VALUES} distinct")
+        elif distinct and most_common[0][1] == 1:
+            parts.append(f"{distinct} distinct (all unique)")
+        elif distinct and (self.kind == 'character' or self.value_labels or distinct <= self.LOW_CARDINALITY):
+            # Top values for character columns and for coded or low-cardinality numerics
+            counted = self.count - self.nulls
+            top = ", ".join(f"{self._value(value)} {count / counted:.1%}" for value, count in most_common)
+            parts.append(f"{distinct} distinct, top: {top}")
+        elif distinct:
+            parts.append(f"{distinct} distinct")
+        return f"- {header} ({kind}): " + "; ".join(parts)
+
+def _write_dataset_chunk(writer: DatasetCacheWriter, df) -> Optional[DatasetCacheWriter]:
+    """Write a chunk to the Parquet copy; on failure give up on the copy, not the extraction"""
+    try:
+        writer.write(df)
+        return writer
+    except Exception as e:
+        logger.warning(f"Could not write Parquet copy {writer.path}: {str(e)}")
+        writer.abort()
+        return None
+
+def _row_blocks(
+    df,
+    filename: str,
+    base_metadata: dict,
+    offset: int,
+    rows_per_block: int,
+    max_rows: int,
+    include_rows: bool
+) -> Iterator[Document]:
+    """Raw row blocks of one chunk, numbered across the whole dataset"""
+    if not include_rows:
+        return
+    allowed = max(0, min(len(df), max_rows - offset)) if max_rows else len(df)
+    df = df.set_axis(range(offset, offset + len(df)))
+    for start in range(0, allowed, rows_per_block):
+        block = df.iloc[start:min(start + rows_per_block, allowed)]
+        first, last = offset + start, offset + start + len(block) - 1
+        yield Document(
+            page_content=f"Filename: {filename}\nRows {first}-{last}:\n{block.to_string(index=True)}",
+            metadata={**base_metadata, 'section': 'rows', 'row_start': first, 'row_end': last}
+        )
+
+def iter_sas_data(
+    file_path: str,
+    filename: str,
+    rows_per_block: Optional[int] = None,
+    max_rows: Optional[int] = None,
+    include_rows: Optional[bool] = None
+) -> Iterator[Document]:
+    """Yield the Documents of a SAS data file (.sas7bdat); errors propagate
+    
+    Rather than the cells themselves, the dataset is described by "dataset
+    card" Documents: its label and size plus per-column type, SAS label and
+    format, null rate, min/max/mean and top categories, profiled over all
+    rows read SAS_READ_CHUNK_ROWS at a time. A Document with the first
+    SAS_SAMPLE_ROWS rows follows. With ``include_rows`` (SAS_INCLUDE_ROWS
+    unless given) the rows are also emitted in blocks of ``rows_per_block``
+    (SAS_ROWS_PER_BLOCK) with the column headers, at most ``max_rows``
+    (SAS_MAX_ROWS, 0 = all).
+    
+    The same pass writes the Parquet copy used by the structured query path
+    (SAS_PARQUET_CACHE), unless it already exists.
+    """
+    import pyreadstat
+    
+    rows_per_block = rows_per_block or settings.SAS_ROWS_PER_BLOCK
+    max_rows = settings.SAS_MAX_ROWS if max_rows is None else max_rows
+    include_rows = settings.SAS_INCLUDE_ROWS if include_rows is None else include_rows
+    base_metadata = _dataset_metadata(file_path, filename)
+    
+    _, meta = pyreadstat.read_sas7bdat(file_path, metadataonly=True)
+    labels = meta.column_names_to_labels or {}
+    formats = meta.original_variable_types or {}
+    value_labels = meta.variable_value_labels or {}
+    profiles = {
+        name: _ColumnProfile(name, labels.get(name), formats.get(name), value_labels.get(name))
+        for name in meta.column_names
+    }
+    
+    writer = None
+    if settings.SAS_PARQUET_CACHE and PARQUET_SUPPORT and not os.path.exists(dataset_cache_path(file_path)):
+        writer = DatasetCacheWriter(file_path, labels, meta.file_label)
+    
+    sample = None
+    offset = 0
+    chunks = pyreadstat.read_file_in_chunks(
+        pyreadstat.read_sas7bdat,
+        file_path,
+        chunksize=max(settings.SAS_READ_CHUNK_ROWS, rows_per_block)
+    )
+    try:
+        for df, _ in chunks:
+            for name, profile in profiles.items():
+                if name in df.columns:
+                    profile.update(df[name])
+            if sample is None:
+                # A copy, so the sample doesn't keep the whole chunk alive
+                sample = df.head(settings.SAS_SAMPLE_ROWS).copy()
+            if writer is not None:
+                writer = _write_dataset_chunk(writer, df)
+            
+            yield from _row_blocks(df, filename, base_metadata, offset, rows_per_block, max_rows, include_rows)
+            offset += len(df)
+        
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                logger.warning(f"Could not write Parquet copy {writer.path}: {str(e)}")
+            else:
+                writer = None
+    finally:
+        # The consumer stopped early or reading failed
+        if writer is not None:
+            writer.abort()
+    
+    header = [f"Dataset card: {filename}"]
+    if meta.table_name:
+        header.append(f"Table: {meta.table_name}")
+    if meta.file_label:
+        header.append(f"Label: {meta.file_label}")
+    header.append(f"Rows: {offset}, columns: {len(profiles)}")
+    
+    # Wide datasets get several cards, each repeating the header
+    columns = list(profiles.values())
+    per_card = max(settings.SAS_CARD_COLUMNS, 1)
+    for start in range(0, len(columns), per_card) or [0]:
+        lines = [profile.summary(settings.SAS_PROFILE_TOP_K) for profile in columns[start:start + per_card]]
+        yield Document(
+            page_content="\n".join(header + ["", "Columns:"] + lines),
             metadata={
-                'source': filename,
-                'extraction_method': 'pyreadstat',
-                'doc_type': 'sas_data',
-                'file_size': os.path.getsize(file_path),
-                'last_modified': os.path.getmtime(file_path)
+                **base_metadata,
+                'section': 'dataset_card',
+                'total_rows': offset,
+                'total_columns': len(columns),
+                'column_start': start,
+                'column_end': min(start + per_card, len(columns)) - 1
             }
         )
+    
+    if sample is not None and not sample.empty:
+        yield Document(
+            page_content=f"Filename: {filename}\nSample of the first {len(sample)} rows:\n{sample.to_string(index=True)}",
+            metadata={**base_metadata, 'section': 'sample', 'total_rows': offset}
+        )
+    
+    logger.info(f"Successfully processed SAS data file: {filename} - profiled {offset} rows, {len(columns)} columns")
+
+def ensure_sas_dataset_cache(file_path: str) -> Optional[Dict[str, Any]]:
+    """Schema of the dataset's Parquet copy, writing the copy first if it is
+    missing (e.g. when extraction was served from the extraction cache).
+    None if Parquet support is unavailable or disabled."""
+    if not (settings.SAS_PARQUET_CACHE and PARQUET_SUPPORT):
+        return None
+    
+    path = dataset_cache_path(file_path)
+    if not os.path.exists(path):
+        import pyreadstat
         
-        logger.info(f"Successfully processed SAS data file: {filename}")
-        return [doc]
+        _, meta = pyreadstat.read_sas7bdat(file_path, metadataonly=True)
+        writer = DatasetCacheWriter(file_path, meta.column_names_to_labels, meta.file_label)
+        try:
+            for df, _ in pyreadstat.read_file_in_chunks(
+                    pyreadstat.read_sas7bdat, file_path, chunksize=settings.SAS_READ_CHUNK_ROWS):
+                writer.write(df)
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+    return read_dataset_schema(path)
+
+def process_sas_data(file_path: str, filename: str) -> List[Document]:
+    """Process SAS data files (.sas7bdat)"""
+    if not os.path.exists(file_path):
+        logger.error(f"File not found: {file_path}")
+        return []
+    
+    try:
+        return list(iter_sas_data(file_path, filename))
     except Exception as e:
         logger.error(f"Error processing SAS data file {file_path}: {str(e)}")
         return []
 
+def _section_title(section: Dict[str, Any]) -> str:
+    if section["type"] == "procedure":
+        return f"PROC {section['name'].upper()}"
+    if section["type"] == "data_step":
+        return f"DATA step ({section['name']})" if section["name"] else "DATA step"
+    if section["type"] == "macro":
+        return f"%MACRO {section['name']}"
+    return "Global statements"
+
+def iter_sas_program(file_path: str, filename: str) -> Iterator[Document]:
+    """Yield the Documents of a SAS program file (.sas); errors propagate
+    
+    The first Document outlines the program (its sections and the datasets,
+    macros and includes each one touches); then each PROC, DATA step, macro
+    definition and run of global statements is a Document of its own, with
+    its line range and symbols in the metadata.
+    """
+    with open(file_path, 'rb') as f:
+        code_sections = parse_sas_code(f.read())
+    base_metadata = {
+        'source': filename,
+        'extraction_method': 'sas_code_parser',
+        'doc_type': 'sas_program',
+        'file_size': os.path.getsize(file_path),
+        'last_modified': os.path.getmtime(file_path),
+        'code_language': 'sas',
+        'sections_count': len(code_sections)
+    }
+    
+    outline = [
+        f"Filename: {filename}",
+        "File Type: SAS Program (Code)",
+        f"Size: {os.path.getsize(file_path)} bytes",
+        "",
+        "## SAS Program Structure"
+    ]
+    for i, section in enumerate(code_sections):
+        lines = _symbol_lines(section["symbols"])
+        outline.append(f"{i+1}. {_section_title(section)} (lines {section['line_start']}-{section['line_end']})"
+                       + (" - " + "; ".join(lines) if lines else ""))
+    yield Document(page_content="\n".join(outline), metadata={**base_metadata, 'section': 'outline'})
+    
+    for i, section in enumerate(code_sections):
+        if not section["content"].strip():
+            continue
+        symbols = section["symbols"]
+        header = [
+            f"Filename: {filename}",
+            f"Section {i+1} of {len(code_sections)}: {_section_title(section)} (lines {section['line_start']}-{section['line_end']})"
+        ]
+        header.extend(_symbol_lines(symbols))
+        yield Document(
+            page_content="\n".join(header + ["```sas", section["content"], "```"]),
+            metadata={
+                **base_metadata,
+                'section': i,
+                'section_type': section["type"],
+                'section_name': section["name"],
+                'line_start': section["line_start"],
+                'line_end': section["line_end"],
+                'byte_start': section["byte_start"],
+                'byte_end': section["byte_end"],
+                'datasets_created': ", ".join(symbols["datasets_created"]),
+                'datasets_read': ", ".join(symbols["datasets_read"]),
+                'macros_defined': ", ".join(symbols["macros_defined"])
+            }
+        )
+    
+    logger.info(f"Successfully processed SAS program file: {filename} - {len(code_sections)} sections")
+
 def process_sas_program(file_path: str, filename: str) -> List[Document]:
     """Process SAS program files (.sas)"""
     if not os.path.exists(file_path):
         logger.error(f"File not found: {file_path}")
         return []
-        
+
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
-        
-        # Parse SAS code sections
-        code_sections = parse_sas_code(content)
-        
-        # Prepare structured content
-        structured_content = []
-        structured_content.append(f"Filename: {filename}")
-        structured_content.append(f"File Type: SAS Program (Code)")
-        structured_content.append(f"Size: {os.path.getsize(file_path)} bytes")
-        structured_content.append("")
-        
-        if code_sections:
-            structured_content.append("## SAS Program Structure")
-            for i, section in enumerate(code_sections):
-                if section["type"] == "procedure":
-                    structured_content.append(f"{i+1}. PROC {section['name'].upper()}")
-                elif section["type"] == "data_step":
-                    structured_content.append(f"{i+1}. DATA Step")
-                else:
-                    structured_content.append(f"{i+1}. Other Code Section")
-            structured_content.append("")
-        
-        # Add full code
-        structured_content.append("## Full SAS Code")
-        structured_content.append("```sas")
-        structured_content.append(content)
-        structured_content.append("```")
-        
-        # Create document
-        doc = Document(
-            page_content="\n".join(structured_content),
-            metadata={
-                'source': filename,
-                'extraction_method': 'sas_code_parser',
-                'doc_type': 'sas_program',
-                'file_size': os.path.getsize(file_path),
-                'last_modified': os.path.getmtime(file_path),
-                'code_language': 'sas',
-                'sections_count': len(code_sections)
-            }
-        )
-        
-        logger.info(f"Successfully processed SAS program file: {filename}")
-        return [doc]
+        return list(iter_sas_program(file_path, filename))
     except Exception as e:
         logger.error(f"Error processing SAS program file {file_path}: {str(e)}")
         return []
 
-def parse_sas_code(content: str) -> List[dict]:
-    """Parse SAS code into sections"""
-    code_sections = []
-    current_section = []
-    in_proc = False
-    proc_name = ""
+def sas_program_symbols(file_path: str) -> List[Dict[str, Any]]:
+    """Symbol postings of a SAS program file, for the symbol index"""
+    with open(file_path, 'rb') as f:
+        return program_symbols(parse_sas_code(f.read()))
+
+def _symbol_lines(symbols: Dict[str, List[str]]) -> List[str]:
+    labels = [
+        ("datasets_created", "Creates"),
+        ("datasets_read", "Reads"),
+        ("macros_defined", "Defines macro"),
+        ("macros_called", "Calls macro"),
+        ("includes", "Includes")
+    ]
+    return [f"{label}: {', '.join(symbols[key])}" for key, label in labels if symbols[key]]
+
+# Symbols, matched on the lowercased bytes of a section with its comments
+# blanked out. Names may hold non-ASCII letters (bytes >= 0x80 of UTF-8).
+_NAME_CHAR = rb"[\w&\x80-\xff]"
+_DATASET = rb"(" + _NAME_CHAR + rb"+(?:\." + _NAME_CHAR + rb"+)?)"
+_DATA_STATEMENT = re.compile(rb"data\s+([^;]*);")
+_DATA_INPUTS = re.compile(rb"\b(?:set|merge|update|modify)\s+([^;]*);")
+_DATA_OPTION = re.compile(rb"\bdata\s*=\s*" + _DATASET)
+_OUT_OPTION = re.compile(rb"\bout\s*=\s*" + _DATASET)
+_CREATE_TABLE = re.compile(rb"\bcreate\s+(?:table|view)\s+" + _DATASET)
+_SQL_SOURCE = re.compile(rb"\b(?:from|join)\s+" + _DATASET)
+_INCLUDE = re.compile(rb"%inc(?:lude)?\s+(?:'([^']*)'|\"([^\"]*)\"|(\S+?))\s*;")
+_MACRO_CALL = re.compile(rb"%(" + _NAME_CHAR + rb"+)")
+# Innermost (dataset options) of a DATA/SET list, and the names left in it
+_OPTIONS = re.compile(rb"\([^()]*\)")
+_LIST_NAME = re.compile(rb"(?:" + _NAME_CHAR + rb"|\.)+")
+# Macro language statements and functions, not user macros
+_MACRO_KEYWORDS = {
+    "macro", "mend", "let", "put", "if", "then", "else", "do", "to", "by", "end", "while", "until",
+    "global", "local", "include", "inc", "eval", "sysevalf", "str", "nrstr", "quote", "nrquote",
+    "bquote", "nrbquote", "superq", "unquote", "upcase", "lowcase", "substr", "scan", "index",
+    "length", "sysfunc", "qsysfunc", "symexist", "symglobl", "symlocal", "syscall", "sysexec",
+    "return", "abort", "goto", "label", "window", "display", "input", "symdel", "sysget",
+    "qupcase", "qscan", "qsubstr", "cmpres", "qcmpres", "trim", "qtrim", "left", "qleft", "verify",
+    "datatyp", "sysmacdelete", "sysmstoreclear", "copy"
+}
+# Dataset names that are keywords rather than tables
+_NOT_DATASETS = {"_null_", "_data_", "_last_", "select", "connection"}
+
+def _decoded(names: List[bytearray]) -> List[str]:
+    # The bytes were only ASCII-lowercased; names hold no newlines, so the
+    # list is decoded in one call
+    if not names:
+        return []
+    return b"\n".join(names).decode('utf-8', errors='replace').lower().split("\n")
+
+def _dataset_names(text: bytearray) -> List[str]:
+    """Dataset names in a DATA/SET-style list, without their (options)"""
+    while b"(" in text:
+        text, removed = _OPTIONS.subn(b" ", text)
+        if not removed:
+            break
+    return _decoded(_LIST_NAME.findall(text))
+
+def _unique(names: List[str]) -> List[str]:
+    # Names come lowercased from _decoded(); those that are only a macro
+    # variable (&ds) can't be resolved here
+    return [
+        name for name in dict.fromkeys(names)
+        if name not in _NOT_DATASETS and not name[0].isdigit() and name[0] != "&"
+    ]
+
+def _step_datasets(code: bytearray, step_type: str, name: str, created: List[str], read: List[str]) -> None:
+    """Add the datasets one PROC or DATA step creates and reads"""
+    if step_type == "data_step":
+        # The step starts at its DATA statement (comments are blanked out)
+        match = _DATA_STATEMENT.match(code, code.find(b"data"))
+        if match:
+            created.extend(_dataset_names(match.group(1)))
+        if b"set" in code or b"merge" in code or b"update" in code or b"modify" in code:
+            for match in _DATA_INPUTS.finditer(code):
+                read.extend(_dataset_names(match.group(1)))
+    elif step_type == "procedure":
+        if b"data" in code:
+            read.extend(_decoded(_DATA_OPTION.findall(code)))
+        if b"out" in code:
+            created.extend(_decoded(_OUT_OPTION.findall(code)))
+        if name == "sql":
+            created.extend(_decoded(_CREATE_TABLE.findall(code)))
+            read.extend(_decoded(_SQL_SOURCE.findall(code)))
+
+def _section_symbols(text: bytearray, section: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Symbols of a tokenizer section, from the lowercased program ``text``
+    with comments blanked out.
     
-    for line in content.split('\n'):
-        line_lower = line.lower().strip()
-        
-        if line_lower.startswith('proc '):
-            if in_proc and current_section:
-                code_sections.append({
-                    "type": "procedure",
-                    "name": proc_name,
-                    "content": "\n".join(current_section)
-                })
-                current_section = []
-            
-            in_proc = True
-            parts = line_lower.split()
-            proc_name = parts[1] if len(parts) > 1 else "unknown"
-            current_section.append(line)
-            
-        elif line_lower.startswith('data '):
-            if in_proc and current_section:
-                code_sections.append({
-                    "type": "procedure",
-                    "name": proc_name,
-                    "content": "\n".join(current_section)
-                })
-                current_section = []
-            
-            in_proc = False
-            proc_name = ""
-            current_section.append(line)
-            code_sections.append({
-                "type": "data_step",
-                "content": line
-            })
-            
-        elif line_lower.startswith('quit;') or line_lower == 'run;':
-            if in_proc:
-                current_section.append(line)
-                code_sections.append({
-                    "type": "procedure",
-                    "name": proc_name,
-                    "content": "\n".join(current_section)
-                })
-                current_section = []
-                in_proc = False
-                proc_name = ""
-            else:
-                current_section.append(line)
-        else:
-            current_section.append(line)
-    
-    # Add any remaining content
-    if current_section:
-        if in_proc:
-            code_sections.append({
-                "type": "procedure",
-                "name": proc_name,
-                "content": "\n".join(current_section)
-            })
-        else:
-            code_sections.append({
-                "type": "other",
-                "content": "\n".join(current_section)
-            })
+    A macro's symbols are those of the PROCs and DATA steps in its body (the
+    tokenizer's children), so the body isn't parsed again.
+    """
+    section_type, name = section["type"], section["name"]
+    code = text[section["start"]:section["end"]]
+    created: List[str] = []
+    read: List[str] = []
+    if section_type == "macro":
+        for child in section.get("children", ()):
+            _step_datasets(text[child["start"]:child["end"]], child["type"], child["name"], created, read)
+    else:
+        _step_datasets(code, section_type, name, created, read)
     
+    includes: List[str] = []
+    calls: List[str] = []
+    if b"%" in code:
+        if b"%inc" in code:
+            includes = [
+                next(group for group in match if group).decode('utf-8', errors='replace')
+                for match in _INCLUDE.findall(code)
+            ]
+        calls = [call for call in _decoded(_MACRO_CALL.findall(code)) if call not in _MACRO_KEYWORDS]
+    if section_type == "macro":
+        calls = [call for call in calls if call != name.lower()]
+    return {
+        "datasets_created": _unique(created) if created else [],
+        "datasets_read": _unique(read) if read else [],
+        "macros_defined": [name] if section_type == "macro" else [],
+        "macros_called": _unique(calls) if calls else [],
+        "includes": list(dict.fromkeys(includes))
+    }
+
+def _without_comments(text: bytearray, comments: List[Tuple[int, int]]) -> None:
+    """Blank out the given comments of the lowercased program (same offsets)"""
+    for start, end in comments:
+        text[start:end] = b" " * (end - start)
+
+def parse_sas_code(content: Union[str, bytes]) -> List[dict]:
+    """Parse SAS code into sections
+    
+    Each PROC, DATA step and macro definition (%macro ... %mend, kept whole)
+    is a section; code between them (options, libnames, %let, %include,
+    macro calls) is grouped into "other" sections. Sections carry their
+    type, name (PROC name, first dataset of a DATA step, macro name), content,
+    1-based line range, byte range (of ``content`` as UTF-8, or of the bytes
+    given) and symbols: datasets created and read, macros defined and
+    called and files included.
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    text = bytearray(data.lower())
+    comments: List[Tuple[int, int]] = []
+    code_sections = []
+    for section in iter_sas_sections(data, comments):
+        # Blank out the comments scanned since the last section
+        _without_comments(text, comments)
+        comments.clear()
+        code_sections.append({
+            "type": section["type"],
+            "name": section["name"],
+            "content": data[section["start"]:section["end"]].decode('utf-8', errors='replace'),
+            "line_start": section["line_start"],
+            "line_end": section["line_end"],
+            "byte_start": section["start"],
+            "byte_end": section["end"],
+            "symbols": _section_symbols(text, section)
+        })
     return code_sections
@@ -0,0 +1,368 @@
+
+"""Single-pass tokenizer that splits SAS programs into sections"""
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# PROCs that keep running across RUN statements until QUIT
+INTERACTIVE_PROCS = frozenset({"sql", "datasets", "iml", "catalog", "optmodel", "fcmp"})
+
+def _all_bytes_but(excluded: bytes) -> bytes:
+    # A class of explicit ranges: the regex engine tests it with one bitmap
+    # lookup per byte, where a negated class compares against each member
+    ranges = []
+    low = 0
+    for byte in sorted(set(excluded)) + [256]:
+        if byte > low:
+            ranges.append(rb"\x%02x-\x%02x" % (low, byte - 1))
+        low = byte + 1
+    return b"[" + b"".join(ranges) + b"]"
+
+def _unnamed(pattern: bytes) -> bytes:
+    return re.sub(rb"\(\?P<\w+>", b"(?:", pattern)
+
+def _name(group: bytes) -> bytes:
+    # A name after PROC, DATA or %macro: up to the first blank, ";", "(", "/"
+    # or quote, so names may hold non-ASCII letters
+    return rb"""(?:\s+(?P<""" + group + rb""">[^\s;(/'"]+))?"""
+
+def _keyword(proc_run: bytes = b"", data_run: bytes = b"") -> bytes:
+    """What may follow the blanks after a ";" or newline: a "*" / "%*"
+    comment (without its ";", which then starts the next statement) or a
+    keyword that opens or closes a section, each in its own group so the
+    scan dispatches on lastgroup. RUN and QUIT only count as a statement of
+    their own (followed by ";"), DATA not as the DATA= option. With the
+    optional run patterns, a PROC or DATA step is matched on through its
+    RUN (or QUIT) when it can be, and the match ends in that group."""
+    proc = (rb"(?P<proc>proc\b(?P<interactive>(?=\s+(?:" + "|".join(sorted(INTERACTIVE_PROCS)).encode()
+            + rb""")(?![^\s;(/'"])))?""" + _name(b"proc_name") + rb")")
+    data = rb"(?P<data>data\b(?!\s*=)" + _name(b"data_name") + rb")"
+    if proc_run:
+        proc = rb"(?:" + proc + rb"(?P<proc_run>" + proc_run + rb")?)"
+        data = rb"(?:" + data + rb"(?P<data_run>" + data_run + rb")?)"
+    return rb"""(?:
+        (?P<statement_comment>%?\*[^;]*+)(?=;)
+        | (?P<close>(?:run|quit)\b(?=\s*;))
+        | """ + proc + rb"""
+        | """ + data + rb"""
+        | (?P<macro>%macro\b""" + _name(b"macro_name") + rb""")
+        | (?P<mend>%mend\b)
+        | (?P<datalines>(?:cards|datalines|lines|parmcards)4?\b)
+    )"""
+
+# Everything that can't start a section, skipped in C: runs of plain code,
+# quoted strings (consumed whole, so semicolons and keywords inside them are
+# never seen), slashes that don't open a comment, and semicolons or newlines
+# with the blanks after them that aren't followed by a statement start (most
+# fail on the first letter of the next word). Each takes the plain code after
+# it along, to keep the iterations few.
+_PLAIN = _all_bytes_but(b"'\"/;\n") + b"*+"
+_SKIP = _PLAIN + rb"""(?:
+    [;\n][ \t\r\n]*+(?:(?![%*pdrqcl])|(?!""" + _unnamed(_keyword()) + rb"))" + _PLAIN + rb"""
+    | '[^']*+(?:'|\Z)""" + _PLAIN + rb"""
+    | "[^"]*+(?:"|\Z)""" + _PLAIN + rb"""
+    | /(?!\*)""" + _PLAIN + rb"""
+)*+"""
+_NEXT_STATEMENT = rb"[;\n][ \t\r\n]*+"
+
+# A PROC or DATA step without comments, in-stream data or other steps in it
+# runs to its RUN (QUIT for interactive PROCs) with nothing else to stop at,
+# so the Python loop sees it once; the others end the match after their name
+# and are closed by a later token
+_RUN = _SKIP + _NEXT_STATEMENT + rb"(?:run|quit)\b(?=\s*;)"
+_QUIT = (rb"(?:" + _SKIP + _NEXT_STATEMENT + rb"run\b(?=\s*;))*+"
+         + _SKIP + _NEXT_STATEMENT + rb"quit\b(?=\s*;)")
+_STATEMENT_START = rb"[ \t\r\n]*+" + _keyword(rb"(?(interactive)" + _QUIT + b"|" + _RUN + b")", _RUN)
+
+# Matched over the lowercased program: skips to the next block comment or
+# statement start, the only things the Python loop handles, or to the end
+_TOKEN = re.compile(
+    _SKIP + rb"""(?:
+        (?P<comment>/\*[^*]*+(?:\*(?!/)[^*]*+)*+(?:\*/|\Z))
+        | [;\n]""" + _STATEMENT_START + rb"""
+        | (?P<end>\Z)
+    )""",
+    re.VERBOSE
+)
+# A statement start at the cursor: the first statement, or one right after a comment
+_FOLLOWING_STATEMENT = re.compile(_STATEMENT_START, re.VERBOSE)
+_STATEMENT_END = re.compile(rb"\s*;")
+# In-stream data ends at a line holding only ";" (";;;;" for the *4 forms)
+_DATALINES_END = re.compile(rb"^[ \t]*;", re.MULTILINE)
+_DATALINES4_END = re.compile(rb"^;;;;", re.MULTILINE)
+
+def _starts_statement(data: bytes, offset: int) -> bool:
+    """Whether data[offset:] is the first word of a statement or of a line"""
+    index = offset - 1
+    while index >= 0 and data[index] in b" \t":
+        index -= 1
+    if index < 0 or data[index] in b";\n\r":
+        return True
+    # Right after a block comment
+    return data[index] == 0x2F and index > 0 and data[index - 1] == 0x2A
+
+def _first_code(data: bytes, start: int, end: int) -> Optional[int]:
+    """Offset of the first non-blank byte in data[start:end], None if blank"""
+    stripped = data[start:end].lstrip()
+    return end - len(stripped) if stripped else None
+
+def _last_code(data: bytes, start: int, end: int) -> int:
+    # Walks back over the trailing blanks rather than copying the section
+    while end > start and data[end - 1] in b" \t\r\n\f\v":
+        end -= 1
+    return end
+
+class _LineCounter:
+    """1-based line numbers of increasing offsets, counting each byte once"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+        self.line = 1
+
+    def at(self, offset: int) -> int:
+        if offset < self.offset:
+            return self.data.count(b"\n", 0, offset) + 1
+        self.line += self.data.count(b"\n", self.offset, offset)
+        self.offset = offset
+        return self.line
+
+def iter_sas_sections(data: bytes, comments: Optional[List[Tuple[int, int]]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield the sections of a SAS program in one scan of its bytes
+
+    A section is a PROC (up to RUN or QUIT; QUIT for interactive PROCs
+    such as SQL), a DATA step (up to RUN, in-stream data included), a
+    macro definition (%macro to its matching %mend, nested definitions
+    included) or the code between them ("other": options, libnames, %let,
+    macro calls). PROC, DATA and %macro only open a section as the first
+    word of a statement or of a line, never inside comments (block, "*" and
+    "%*" statement comments) or quoted strings. A comment that directly
+    precedes a section is kept with it.
+
+    Sections are dicts with type, name (PROC name, first dataset of a DATA
+    step, macro name), byte offsets start/end (end exclusive, so the code
+    is data[start:end]) and 1-based line_start/line_end. Macro sections also
+    list the PROCs and DATA steps of their body as children (type, name,
+    start, end), found in the same scan. With a ``comments`` list, the
+    (start, end) offsets of every comment are appended to it as the scan
+    passes them, so before a section is yielded.
+    """
+    lines = _LineCounter(data)
+    size = len(data)
+    pos = 0
+    gap_start = 0           # end of the last section
+    gap_cursor = 0          # end of the last comment in the gap
+    gap_code = False        # the gap holds statements, not just comments
+    section: Optional[Dict[str, Any]] = None
+    macro_depth = 0
+    child: Optional[Dict[str, Any]] = None      # open step inside a macro
+
+    def emit(kind: str, name: str, start: int, end: int) -> Dict[str, Any]:
+        end = _last_code(data, start, end)
+        return {
+            "type": kind,
+            "name": name,
+            "start": start,
+            "end": end,
+            "line_start": lines.at(start),
+            "line_end": lines.at(max(end - 1, start))
+        }
+
+    def emit_section(end: int) -> Dict[str, Any]:
+        emitted = emit(section["type"], section["name"], section["start"], end)
+        if section["type"] == "macro":
+            close_child(end, implicit=True)
+            emitted["children"] = section["children"]
+        return emitted
+
+    def close_child(end: int, implicit: bool = False) -> None:
+        # Implicitly (by the next step or %mend) a step ends at its last statement
+        nonlocal child
+        if child is None:
+            return
+        if implicit:
+            end = data.rfind(b";", child["start"], end) + 1 or end
+        child["end"] = _last_code(data, child["start"], end)
+        section["children"].append(child)
+        child = None
+
+    def nested_step(kind: str, token) -> None:
+        nonlocal child
+        if kind == "close":
+            if child is None:
+                return
+            if text[token.start(kind)] == 0x72 and child["type"] == "procedure" and child["name"] in INTERACTIVE_PROCS:
+                return
+            close_child(text.index(b";", token.end()) + 1)
+        elif kind in ("proc", "data", "proc_run", "data_run"):
+            step = kind[:4]
+            start = token.start(step)
+            close_child(start, implicit=True)
+            if step == "proc":
+                child = {"type": "procedure", "name": name_of(token, "proc_name") or "unknown", "start": start}
+            else:
+                child = {"type": "data_step", "name": name_of(token, "data_name"), "start": start}
+            if kind != step:
+                # Matched through its RUN or QUIT
+                close_child(text.index(b";", token.end()) + 1)
+
+    def open_section(kind: str, name: str, keyword_start: int) -> List[Dict[str, Any]]:
+        nonlocal section, gap_start, gap_cursor, gap_code
+        emitted = []
+        if section is not None:
+            # Ended without RUN/QUIT, at its last statement
+            end = data.rfind(b";", section["start"], keyword_start) + 1 or keyword_start
+            emitted.append(emit_section(end))
+            gap_start = gap_cursor = end
+            gap_code = False
+        if data[gap_cursor:keyword_start].strip():
+            gap_code = True
+        first = _first_code(data, gap_start, keyword_start)
+        start = keyword_start
+        if first is not None and gap_code:
+            emitted.append(emit("other", "", first, keyword_start))
+        elif first is not None:
+            start = first
+        section = {"type": kind, "name": name, "start": start}
+        return emitted
+
+    def close_section(end: int) -> Dict[str, Any]:
+        nonlocal section, gap_start, gap_cursor, gap_code
+        closed = emit_section(end)
+        section = None
+        gap_start = gap_cursor = end
+        gap_code = False
+        return closed
+
+    def name_of(token, group: str, lower: bool = True) -> str:
+        # From the original bytes: the lowercased copy only lowers ASCII
+        start, end = token.span(group)
+        if start < 0:
+            return ""
+        name = data[start:end].decode("utf-8", "replace")
+        return name.lower() if lower else name
+
+    # Matched on a lowercased copy (same offsets); names come from the original
+    text = data.lower()
+    following = _FOLLOWING_STATEMENT.match
+    scan = _TOKEN.finditer(text).__next__
+    scan_end = 0            # where the scan goes on from (end of its last token)
+    # The first statement has nothing in front of it
+    token = following(text)
+    while True:
+        if token is None:
+            if pos != scan_end:
+                # Moved on past in-stream data, a %mend statement or a
+                # statement found after a comment
+                scan = _TOKEN.finditer(text, pos).__next__
+            current = scan()
+            scan_end = current.end()
+        else:
+            current, token = token, None
+        pos = current.end()
+        kind = current.lastgroup
+
+        if (kind == "proc_run" or kind == "data_run") and not macro_depth:
+            step = kind[:4]
+            start = current.start(step)
+            if section is None:
+                # The common case, a whole step right after the last section:
+                # emitted without opening it
+                lead = data[gap_start:start].lstrip()
+                if lead:
+                    if gap_cursor == gap_start or data[gap_cursor:start].strip():
+                        gap_code = True
+                    if gap_code:
+                        yield emit("other", "", start - len(lead), start)
+                    else:
+                        start -= len(lead)
+                end = text.index(b";", pos) + 1
+                # name_of() and lines.at(end - 1), inlined
+                name_start, name_end = current.span(step + "_name")
+                name = data[name_start:name_end].decode("utf-8", "replace").lower()
+                line_start = lines.at(start)
+                lines.line = line_end = line_start + data.count(b"\n", start, end - 1)
+                lines.offset = end - 1
+                yield {
+                    "type": "procedure" if step == "proc" else "data_step",
+                    "name": name or ("unknown" if step == "proc" else ""),
+                    "start": start,
+                    "end": end,
+                    "line_start": line_start,
+                    "line_end": line_end
+                }
+                gap_start = gap_cursor = end
+                gap_code = False
+            else:
+                if step == "proc":
+                    yield from open_section("procedure", name_of(current, "proc_name") or "unknown", start)
+                else:
+                    yield from open_section("data_step", name_of(current, "data_name"), start)
+                yield close_section(text.index(b";", pos) + 1)
+            continue
+        if kind == "close" and section is None and not macro_depth:
+            # RUN or QUIT after a section already closed
+            continue
+
+        if kind == "comment" or kind == "statement_comment":
+            start = current.start(kind)
+            # A statement comment's ";" is left to start the next statement
+            end = pos if kind == "comment" else pos + 1
+            if comments is not None:
+                comments.append((start, end))
+            if section is None:
+                if data[gap_cursor:start].strip():
+                    gap_code = True
+                gap_cursor = end
+            if kind == "comment" and _starts_statement(text, start):
+                # Comments are transparent: a statement may start right after one
+                token = following(text, pos)
+            continue
+        if kind == "end":
+            break
+
+        start = current.start(kind)
+        if macro_depth:
+            if kind == "macro":
+                macro_depth += 1
+            elif kind == "mend":
+                macro_depth -= 1
+                if not macro_depth:
+                    close_child(start, implicit=True)
+                    end = text.find(b";", pos)
+                    pos = size if end == -1 else end + 1
+                    yield close_section(pos)
+                    token = following(text, pos)
+            else:
+                nested_step(kind, current)
+            continue
+
+        if kind == "close":
+            if section is None:
+                continue
+            if text[start] == 0x72 and section["type"] == "procedure" and section["name"] in INTERACTIVE_PROCS:
+                # RUN inside PROC SQL and the like
+                continue
+            # The ";" isn't consumed: it starts the next statement
+            yield close_section(text.index(b";", pos) + 1)
+        elif kind == "proc":
+            yield from open_section("procedure", name_of(current, "proc_name") or "unknown", start)
+        elif kind == "data":
+            yield from open_section("data_step", name_of(current, "data_name"), start)
+        elif kind == "macro":
+            yield from open_section("macro", name_of(current, "macro_name", lower=False), start)
+            section["children"] = []
+            macro_depth = 1
+        elif kind == "datalines":
+            # CARDS; / DATALINES; - skip the in-stream data lines unparsed
+            end = _STATEMENT_END.match(text, pos)
+            if section is None or section["type"] != "data_step" or end is None:
+                continue
+            data_end = (_DATALINES4_END if text[pos - 1] == 0x34 else _DATALINES_END).search(text, end.end())
+            pos = data_end.start() if data_end else size
+
+    if section is not None:
+        yield emit_section(size)
+    elif gap_code or data[gap_cursor:].strip():
+        first = _first_code(data, gap_start, size)
+        if first is not None:
+            yield emit("other", "", first, size)
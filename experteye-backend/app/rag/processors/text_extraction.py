@@ -1,143 +1,313 @@
 
 """Text extraction utilities for different file types"""
 import os
+import re
+import string
 import logging
-import pytesseract
-from typing import List
+import threading
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from importlib.util import find_spec
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
-from langchain_community.document_loaders import (
-    PyMuPDFLoader, 
-    PDFMinerLoader,
-    TextLoader,
-    UnstructuredExcelLoader,
-    Docx2txtLoader,
-    UnstructuredWordDocumentLoader,
-    UnstructuredPowerPointLoader
-)
-from pdf2image import convert_from_path
-from PIL import Image
+
+from app.core.config import settings
+from app.core.executors import in_extraction_worker
 
 logger = logging.getLogger("DocumentIntelligence.TextExtraction")
 
-# Feature detection
-try:
-    import pandas as pd
-    EXCEL_SUPPORT = True
-except ImportError:
-    EXCEL_SUPPORT = False
+# Bump when an extractor's output changes; cached extractions of older versions are ignored
+PDF_EXTRACTOR_VERSION = "pdf/2"
+TEXT_EXTRACTOR_VERSION = "text/2"
 
-try:
-    WORD_SUPPORT = True
-except ImportError:
-    WORD_SUPPORT = False
+# Feature detection. Only checks that the packages are installed; the loaders,
+# OCR and pandas are imported on first use so importing this module stays cheap.
+def _installed(*modules: str) -> bool:
+    return all(find_spec(module) is not None for module in modules)
 
-try:
-    import pytesseract
-    from pdf2image import convert_from_path
-    from PIL import Image
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+EXCEL_SUPPORT = _installed("pandas")
+WORD_SUPPORT = _installed("docx2txt")
+OCR_AVAILABLE = _installed("pytesseract", "pdf2image", "PIL")
+
+# PDFMiner's placeholder for glyphs without a unicode mapping
+_CID_PATTERN = re.compile(r"\(cid:\d+\)")
+_READABLE_CHARS = set(string.printable) | set("\u00a0\u2018\u2019\u201c\u201d\u2013\u2014\u2022")
+
+def _is_unreadable(text: str) -> bool:
+    """True for an empty text layer or one that is mostly broken glyphs"""
+    stripped = text.strip()
+    if not stripped:
+        return True
+    cleaned = _CID_PATTERN.sub("", stripped)
+    if len(cleaned) < len(stripped) / 2:
+        return True
+    readable = sum(1 for ch in cleaned if ch.isalnum() or ch in _READABLE_CHARS)
+    return readable / len(cleaned) < 0.6
+
+def _pdfminer_pages_text(file_path: str, page_numbers: List[int]) -> Dict[int, str]:
+    """Text of some pages (0-based) via PDFMiner, for pages PyMuPDF can't
+    read, in one pass over the file. A page PDFMiner fails on ends the pass;
+    it and the pages after it get no text."""
+    texts: Dict[int, str] = {}
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        
+        # Layouts come back in page order, one per requested page
+        for number, layout in zip(sorted(page_numbers), extract_pages(file_path, page_numbers=set(page_numbers))):
+            texts[number] = "".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+    except Exception as e:
+        logger.warning(f"PDFMiner failed on {file_path} after {len(texts)} of {len(page_numbers)} pages: {str(e)}")
+    return texts
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, str, str]]:
+    """Extract pages [start, stop) as (page number, text, method).
+    
+    Opens the file itself so shards can run in separate processes. The
+    PDFMiner fallback is applied only to the pages whose PyMuPDF text is
+    empty or unreadable, in one PDFMiner pass per shard.
+    """
+    import fitz
+    
+    pages = []
+    with fitz.open(file_path) as pdf:
+        for number in range(start, stop):
+            pages.append((number, pdf[number].get_text(), 'pymupdf'))
+    
+    unreadable = [number for number, text, _ in pages if _is_unreadable(text)]
+    if unreadable:
+        fallback = _pdfminer_pages_text(file_path, unreadable)
+        pages = [
+            (number, fallback[number], 'pdfminer') if not _is_unreadable(fallback.get(number, "")) else (number, text, method)
+            for number, text, method in pages
+        ]
+    return pages
 
-def process_pdf(file_path: str, filename: str) -> List[Document]:
-    """Extract text from PDF files with fallback to OCR"""
+# Page-shard pool, one per process, created the first time a large PDF shows up
+_page_executor = None
+_page_executor_workers = 0
+_page_executor_lock = threading.Lock()
+
+def _get_page_executor(workers: int):
+    global _page_executor, _page_executor_workers
+    with _page_executor_lock:
+        if _page_executor is None or _page_executor_workers != workers:
+            if _page_executor is not None:
+                _page_executor.shutdown(wait=False)
+            _page_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _page_executor_workers = workers
+            # Its processes aren't daemons: an extraction worker that exits
+            # would wait on them forever unless the pool is shut down first,
+            # before multiprocessing closes the queues it talks to them over
+            Finalize(_page_executor, _page_executor.shutdown, kwargs={"cancel_futures": True}, exitpriority=100)
+        return _page_executor
+
+def _page_workers(max_workers: Optional[int]) -> int:
+    """Page-shard processes for one PDF. PDF_PAGE_WORKERS is a budget for the
+    whole extraction pool, so each extraction worker gets its share of it
+    (and extracts serially when its share is one process)."""
+    if max_workers:
+        return max_workers
+    workers = settings.PDF_PAGE_WORKERS or os.cpu_count() or 1
+    if in_extraction_worker():
+        workers //= max(settings.EXTRACTION_WORKERS, 1)
+    return max(workers, 1)
+
+def _iter_pdf_shards(file_path: str, page_count: int, workers: int, pages_per_shard: int) -> Iterator[List[Tuple[int, str, str]]]:
+    """Page shards in page order, extracted across processes for large files.
+    
+    At most two shards per worker are in flight, so memory is bounded by the
+    shard size rather than the page count.
+    """
+    ranges = [(start, min(start + pages_per_shard, page_count)) for start in range(0, page_count, pages_per_shard)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield _extract_page_range(file_path, start, stop)
+        return
+    
+    executor = _get_page_executor(workers)
+    remaining = iter(ranges)
+    futures = deque(
+        executor.submit(_extract_page_range, file_path, start, stop)
+        for start, stop in islice(remaining, workers * 2)
+    )
+    try:
+        while futures:
+            shard = futures.popleft().result()
+            for start, stop in islice(remaining, 1):
+                futures.append(executor.submit(_extract_page_range, file_path, start, stop))
+            yield shard
+    finally:
+        for future in futures:
+            future.cancel()
+
+def iter_pdf_pages(
+    file_path: str,
+    filename: str,
+    max_workers: Optional[int] = None,
+    pages_per_shard: Optional[int] = None
+) -> Iterator[Document]:
+    """Yield one Document per PDF page that has text, a shard at a time
+    
+    Large files are split into page ranges extracted in parallel processes
+    (this extraction worker's share of PDF_PAGE_WORKERS, PDF_PAGES_PER_SHARD
+    unless given), with per-page
+    fallback to PDFMiner. Pages that still have no readable text are OCR'd
+    one by one. Errors propagate to the caller. Returns False (to the
+    extraction cache, which then doesn't store the result) when such pages
+    were left as they are because OCR isn't installed.
+    """
+    import fitz
+    
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+        pdf_metadata = pdf.metadata or {}
+    
+    workers = _page_workers(max_workers)
+    file_size = os.path.getsize(file_path)
+    last_modified = os.path.getmtime(file_path)
+    extracted = 0
+    ocr_count = 0
+    missing_ocr = 0
+    for pages in _iter_pdf_shards(file_path, page_count, workers, pages_per_shard or settings.PDF_PAGES_PER_SHARD):
+        # Scanned pages or broken text layers
+        unreadable = [number for number, text, _ in pages if _is_unreadable(text)]
+        if unreadable and OCR_AVAILABLE:
+            ocr_count += len(unreadable)
+            ocr_texts = _ocr_pages(file_path, unreadable)
+            pages = [
+                (number, ocr_texts[number], 'ocr') if ocr_texts.get(number, "").strip() else (number, text, method)
+                for number, text, method in pages
+            ]
+        elif unreadable:
+            missing_ocr += len(unreadable)
+        
+        for number, text, method in pages:
+            if not text.strip():
+                continue
+            extracted += 1
+            yield Document(
+                page_content=text,
+                metadata={
+                    'source': filename,
+                    'page': number,
+                    'total_pages': page_count,
+                    'title': pdf_metadata.get('title', ''),
+                    'author': pdf_metadata.get('author', ''),
+                    'doc_type': 'pdf',
+                    'extraction_method': method,
+                    'file_size': file_size,
+                    'last_modified': last_modified
+                }
+            )
+    
+    if ocr_count:
+        logger.info(f"OCR for {ocr_count} of {page_count} pages in {filename}")
+    if missing_ocr:
+        logger.warning(f"{missing_ocr} of {page_count} pages in {filename} need OCR, which isn't installed")
+    if extracted:
+        logger.info(f"Successfully processed PDF: {filename} - extracted {extracted} of {page_count} pages")
+    else:
+        logger.error(f"Could not extract text from {filename}")
+    if missing_ocr:
+        return False
+
+def process_pdf(
+    file_path: str,
+    filename: str,
+    max_workers: Optional[int] = None,
+    pages_per_shard: Optional[int] = None
+) -> List[Document]:
+    """Extract text from PDF files with per-page fallback to PDFMiner and OCR
+    
+    Materialized form of iter_pdf_pages; errors are logged and give [].
+    """
     if not os.path.exists(file_path):
         logger.error(f"File not found: {file_path}")
         return []
         
     try:
-        # Use PyMuPDF for faster processing
-        loader = PyMuPDFLoader(file_path)
-        documents = loader.load()
-        
-        if not documents:
-            # If PyMuPDF fails, try PDFMiner
-            logger.info(f"PyMuPDF extracted no text from {filename}. Trying PDFMiner...")
-            loader = PDFMinerLoader(file_path)
-            documents = loader.load()
-        
-        if not documents and OCR_AVAILABLE:
-            # If both fail and OCR is available, try OCR
-            logger.info(f"Standard extraction failed for {filename}. Trying OCR...")
-            documents = _process_with_ocr(file_path)
-        
-        if not documents:
-            logger.error(f"Could not extract text from {filename}")
-            return []
-            
-        # Enhance document metadata
-        for i, doc in enumerate(documents):
-            if not hasattr(doc, 'metadata'):
-                doc.metadata = {}
-            
-            doc.metadata['source'] = filename
-            if 'page' not in doc.metadata:
-                doc.metadata['page'] = i + 1
-            doc.metadata['doc_type'] = 'pdf'
-            doc.metadata['extraction_method'] = 'pymupdf'
-            doc.metadata['file_size'] = os.path.getsize(file_path)
-            doc.metadata['last_modified'] = os.path.getmtime(file_path)
-        
-        logger.info(f"Successfully processed PDF: {filename} - extracted {len(documents)} pages")
-        return documents
+        return list(iter_pdf_pages(file_path, filename, max_workers, pages_per_shard))
     except Exception as e:
         logger.error(f"Error processing PDF {file_path}: {str(e)}")
         return []
 
+def iter_text_file(file_path: str, filename: str, section_chars: Optional[int] = None) -> Iterator[Document]:
+    """Yield a text file as Documents of about ``section_chars`` characters
+    (TEXT_SECTION_CHARS unless given), cut at line breaks where possible.
+    Only about two sections of the file are in memory at once.
+    """
+    section_chars = section_chars or settings.TEXT_SECTION_CHARS
+    file_size = os.path.getsize(file_path)
+    last_modified = os.path.getmtime(file_path)
+    
+    def section(number: int, text: str) -> Document:
+        return Document(
+            page_content=text,
+            metadata={
+                'source': filename,
+                'section': number,
+                'doc_type': 'text',
+                'extraction_method': 'text_stream',
+                'file_size': file_size,
+                'last_modified': last_modified
+            }
+        )
+    
+    number = 0
+    carry = ""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(section_chars), ""):
+            text = carry + block
+            cut = text.rfind("\n")
+            # A section without any line break is cut mid-line
+            cut = cut + 1 if cut > 0 else len(text)
+            text, carry = text[:cut], text[cut:]
+            if text.strip():
+                yield section(number, text)
+                number += 1
+    if carry.strip():
+        yield section(number, carry)
+        number += 1
+    
+    if number:
+        logger.info(f"Successfully processed text file: {filename}")
+    else:
+        logger.error(f"Could not extract text from {filename}")
+
 def process_text_file(file_path: str, filename: str) -> List[Document]:
-    """Process text files (txt, md, etc)"""
+    """Process text files (txt, md, etc)
+    
+    Materialized form of iter_text_file; errors are logged and give [].
+    """
     if not os.path.exists(file_path):
         logger.error(f"File not found: {file_path}")
         return []
         
     try:
-        loader = TextLoader(file_path)
-        documents = loader.load()
-        
-        if not documents:
-            logger.error(f"Could not extract text from {filename}")
-            return []
-        
-        # Add metadata
-        for doc in documents:
-            if not hasattr(doc, 'metadata'):
-                doc.metadata = {}
-            doc.metadata.update({
-                'source': filename,
-                'doc_type': 'text',
-                'extraction_method': 'text_loader',
-                'file_size': os.path.getsize(file_path),
-                'last_modified': os.path.getmtime(file_path)
-            })
-        
-        logger.info(f"Successfully processed text file: {filename}")
-        return documents
+        return list(iter_text_file(file_path, filename))
     except Exception as e:
         logger.error(f"Error processing text file {file_path}: {str(e)}")
         return []
 
-def _process_with_ocr(file_path: str) -> List[Document]:
-    """Process PDF using OCR when text extraction fails"""
+def _ocr_page(file_path: str, page_number: int, dpi: int) -> str:
+    """Rasterize a single page (0-based) and OCR it; only this page is in memory"""
+    import pytesseract
+    from pdf2image import convert_from_path
+    
     try:
-        # Convert PDF to images
-        images = convert_from_path(file_path)
-        documents = []
-        
-        for i, image in enumerate(images):
-            # Extract text using OCR
-            text = pytesseract.image_to_string(image)
-            if text.strip():
-                doc = Document(
-                    page_content=text,
-                    metadata={
-                        'page': i + 1,
-                        'extraction_method': 'ocr',
-                        'doc_type': 'pdf'
-                    }
-                )
-                documents.append(doc)
-        
-        return documents
+        images = convert_from_path(file_path, dpi=dpi, first_page=page_number + 1, last_page=page_number + 1)
+        return "\n".join(pytesseract.image_to_string(image) for image in images)
     except Exception as e:
-        logger.error(f"OCR processing failed: {str(e)}")
-        return []
+        logger.error(f"OCR failed on page {page_number + 1} of {file_path}: {str(e)}")
+        return ""
+
+def _ocr_pages(file_path: str, page_numbers: List[int]) -> Dict[int, str]:
+    """OCR the given pages on OCR_WORKERS threads (poppler and tesseract run as
+    subprocesses), so at most that many rasterized pages exist at once"""
+    with ThreadPoolExecutor(max_workers=settings.OCR_WORKERS, thread_name_prefix="ocr") as executor:
+        texts = executor.map(lambda number: _ocr_page(file_path, number, settings.OCR_DPI), page_numbers)
+        return dict(zip(page_numbers, texts))
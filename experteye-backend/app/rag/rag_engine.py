@@ -1,18 +1,27 @@
 # rag_engine.py - Core RAG system for search and Q&A with persistent vector store
-import streamlit as st
 import re
 import time
 import logging
 import hashlib
 from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 
 # Configure logger
 logger = logging.getLogger("DocumentIntelligence.RAG")
 
+def _streamlit():
+    """Streamlit, when installed, for the debug UI messages (imported on demand)"""
+    try:
+        import streamlit as st
+    except ImportError:
+        return None
+    return st
+
+def _ui_error(message: str) -> None:
+    st = _streamlit()
+    if st is not None:
+        st.error(message)
+
 # Enhanced template for QA
 ENHANCED_QA_PROMPT = """
 # ROLE AND PURPOSE
@@ -202,6 +211,8 @@ class RAGEngine:
         
         # Initialize LLM
         try:
+            from langchain_ollama import OllamaLLM
+            
             self.llm = OllamaLLM(
                 model=llm_model,
                 temperature=temperature,
@@ -210,12 +221,14 @@ class RAGEngine:
             logger.info(f"Initialized LLM model: {llm_model}")
             
             # Only show in sidebar if explicitly debugging
-            if debug and st.session_state.get('show_debug_info', False):
+            st = _streamlit() if debug else None
+            if st is not None and st.session_state.get('show_debug_info', False):
                 st.sidebar.success(f"✅ Connected to LLM model: {llm_model}")
         except Exception as e:
             error_msg = f"Error initializing LLM: {str(e)}"
             logger.error(error_msg)
-            if debug and st.session_state.get('show_debug_info', False):
+            st = _streamlit() if debug else None
+            if st is not None and st.session_state.get('show_debug_info', False):
                 st.error(error_msg)
             self.llm = None
     
@@ -463,7 +476,7 @@ class RAGEngine:
                 error_msg = f"Error in vector search: {str(e)}"
                 logger.error(error_msg)
                 if self.debug:
-                    st.error(error_msg)
+                    _ui_error(error_msg)
             
             # 2. Keyword search (exact matching)
             keyword_results = self.keyword_search(query)
@@ -585,7 +598,7 @@ class RAGEngine:
             error_msg = f"Error in composite search: {str(e)}"
             logger.error(error_msg)
             if self.debug:
-                st.error(error_msg)
+                _ui_error(error_msg)
             return []
 
     def analyze_retrieval_quality(self, query: str, retrieved_docs: List[Document]) -> Dict[str, Any]:
@@ -1264,7 +1277,7 @@ class RAGEngine:
                 error_msg = f"Error generating answer: {str(e)}"
                 logger.error(error_msg)
                 if self.debug:
-                    st.error(error_msg)
+                    _ui_error(error_msg)
                 return f"I encountered an error while generating your answer: {str(e)}. Please try again or rephrase your question."
                 
         except Exception as e:
@@ -0,0 +1,153 @@
+
+"""Inverted index of the symbols SAS programs define and use"""
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SYMBOL_KINDS = ("dataset", "proc", "macro", "include")
+
+def program_symbols(code_sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten parse_sas_code sections into symbol postings: kind, name,
+    role and the section (index, type, name, line range) it occurs in"""
+    postings = []
+    for index, section in enumerate(code_sections):
+        location = {
+            "section": index,
+            "section_type": section["type"],
+            "section_name": section["name"],
+            "line_start": section["line_start"],
+            "line_end": section["line_end"]
+        }
+        symbols = section["symbols"]
+        entries: List[Tuple[str, str, str]] = []
+        entries.extend(("dataset", name, "created") for name in symbols["datasets_created"])
+        entries.extend(("dataset", name, "read") for name in symbols["datasets_read"])
+        entries.extend(("macro", name, "defined") for name in symbols["macros_defined"])
+        entries.extend(("macro", name, "called") for name in symbols["macros_called"])
+        entries.extend(("include", name, "included") for name in symbols["includes"])
+        if section["type"] == "procedure":
+            entries.append(("proc", section["name"], "used"))
+        postings.extend({"kind": kind, "name": name, "role": role, **location} for kind, name, role in entries)
+    return postings
+
+def symbol_keys(kind: str, name: str) -> List[Tuple[str, str]]:
+    """Index keys of a symbol. One-level dataset names live in WORK, and every
+    dataset is also findable by its member name alone (any library)."""
+    name = name.strip().lower()
+    if kind != "dataset":
+        return [(kind, name)]
+    if "." not in name:
+        return [(kind, f"work.{name}"), (kind, name)]
+    return [(kind, name), (kind, name.split(".", 1)[1])]
+
+def _lookup_key(kind: str, name: str) -> Tuple[str, str]:
+    return (kind, name.strip().lower())
+
+class SasSymbolIndex:
+    """Symbol -> postings, kept per document so a document can be replaced
+    or dropped without a rebuild. Lookups are a dict access.
+    
+    The index is filled lazily from ``load`` (an iterable of documents with
+    their postings) on first use and again after invalidate().
+    """
+    
+    def __init__(self, load: Callable[[], Iterable[Dict[str, Any]]]):
+        self._load = load
+        self._lock = threading.RLock()
+        self._postings: Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]] = {}
+        self._keys: Dict[str, List[Tuple[str, str]]] = {}
+        self._built = False
+        self._generation = 0    # bumped by invalidate()
+        # Changes seen while the index is not built, applied on top of the load
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+    
+    def _ensure_built(self) -> None:
+        # ``load`` runs without this lock held: it reads the documents table,
+        # whose change notifications (sent under the table's lock) take this
+        # lock, so holding it here could deadlock against a document update
+        while True:
+            with self._lock:
+                if self._built:
+                    return
+                generation = self._generation
+            documents = list(self._load())
+            with self._lock:
+                if self._built:
+                    return
+                if generation != self._generation:
+                    continue
+                self._postings = {}
+                self._keys = {}
+                for document in documents:
+                    self._add(document)
+                for document_id, document in self._pending.items():
+                    self._remove(document_id)
+                    if document is not None:
+                        self._add(document)
+                self._pending = {}
+                self._built = True
+                return
+    
+    def _add(self, document: Dict[str, Any]) -> None:
+        document_id = document["id"]
+        keys = []
+        for posting in document.get("sas_symbols") or []:
+            entry = {
+                **posting,
+                "document_id": document_id,
+                "user_id": document.get("user_id"),
+                "filename": document.get("filename")
+            }
+            for key in symbol_keys(posting["kind"], posting["name"]):
+                self._postings.setdefault(key, {}).setdefault(document_id, []).append(entry)
+                keys.append(key)
+        if keys:
+            self._keys[document_id] = keys
+    
+    def _remove(self, document_id: str) -> None:
+        for key in self._keys.pop(document_id, ()):
+            documents = self._postings.get(key)
+            if documents is not None:
+                documents.pop(document_id, None)
+                if not documents:
+                    del self._postings[key]
+    
+    def update_document(self, document: Dict[str, Any]) -> None:
+        """Replace a document's postings (none: it is removed from the index)"""
+        with self._lock:
+            if self._built:
+                self._remove(document["id"])
+                self._add(document)
+            else:
+                self._pending[document["id"]] = document
+    
+    def remove_document(self, document_id: str) -> None:
+        with self._lock:
+            if self._built:
+                self._remove(document_id)
+            else:
+                self._pending[document_id] = None
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built = False
+            self._generation += 1
+            self._pending = {}
+    
+    def lookup(
+        self,
+        kind: str,
+        name: str,
+        role: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Where a symbol occurs, optionally only in one role (e.g. datasets
+        "created") and in one user's documents"""
+        self._ensure_built()
+        with self._lock:
+            documents = self._postings.get(_lookup_key(kind, name), {})
+            return [
+                dict(posting)
+                for postings in documents.values()
+                for posting in postings
+                if (not role or posting["role"] == role) and (not user_id or posting["user_id"] == user_id)
+            ]
@@ -0,0 +1,393 @@
+
+"""Structured (filter/aggregate) queries over cached Parquet datasets"""
+import re
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("DocumentIntelligence.StructuredQuery")
+
+AGGREGATIONS = ("count", "count_distinct", "sum", "mean", "min", "max", "stddev")
+FILTER_OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in", "not in", "is null", "not null")
+
+QUERY_PLAN_PROMPT = """You translate questions about a tabular dataset into a JSON query.
+
+Dataset: {label}
+Rows: {rows}
+Columns (name: type, label):
+{columns}
+
+Reply with a single JSON object and nothing else, using only the columns above:
+{{
+  "columns": ["<column>", ...],                      // columns to return when not aggregating
+  "filters": [["<column>", "<operator>", <value>], ...],  // operators: {operators}
+  "group_by": ["<column>", ...],
+  "aggregations": [["<column or *>", "<function>"], ...], // functions: {aggregations}
+  "order_by": [["<column>", "asc" or "desc"], ...],
+  "limit": <number>
+}}
+Omit keys you don't need. Aggregated columns are named "<column>_<function>" ("count" for ["*", "count"]); order_by can only use columns of the result.
+
+Question: {question}
+JSON:"""
+
+ANSWER_PROMPT = """Answer the question using only the result table below, which was computed from the dataset "{label}" ({rows} rows) with this query:
+{query}
+
+Result ({row_count} rows{truncated}):
+{table}
+
+Question: {question}
+Answer:"""
+
+def _columns_text(schema: Dict[str, Any]) -> str:
+    return "\n".join(
+        f"- {column['name']}: {column['type']}" + (f", {column['label']}" if column.get("label") else "")
+        for column in schema["columns"]
+    )
+
+def build_query_plan_prompt(question: str, schema: Dict[str, Any]) -> str:
+    return QUERY_PLAN_PROMPT.format(
+        label=schema.get("label") or "dataset",
+        rows=schema.get("rows"),
+        columns=_columns_text(schema),
+        operators=", ".join(FILTER_OPERATORS),
+        aggregations=", ".join(AGGREGATIONS),
+        question=question
+    )
+
+def build_answer_prompt(question: str, schema: Dict[str, Any], query: Dict[str, Any], result: Dict[str, Any]) -> str:
+    return ANSWER_PROMPT.format(
+        label=schema.get("label") or "dataset",
+        rows=schema.get("rows"),
+        query=json.dumps(query),
+        row_count=result["row_count"],
+        truncated=f" of {result['total_rows']}, first rows shown" if result["truncated"] else "",
+        table=format_result_table(result),
+        question=question
+    )
+
+def parse_query_plan(text: str) -> Dict[str, Any]:
+    """The JSON object in an LLM reply (reasoning blocks and code fences are ignored)"""
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No query found in the model's reply")
+    # Models sometimes copy the // comments from the prompt
+    body = re.sub(r"//[^\n]*", "", text[start:end + 1])
+    try:
+        plan = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Could not parse the model's query: {e}")
+    if not isinstance(plan, dict):
+        raise ValueError("The model's query is not a JSON object")
+    return plan
+
+def validate_query(query: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a query and check it against the dataset schema; raises ValueError"""
+    types = {column["name"]: column["type"] for column in schema["columns"]}
+    
+    def column(name: Any, allow_star: bool = False) -> str:
+        if allow_star and name == "*":
+            return name
+        if name not in types:
+            raise ValueError(f"Unknown column: {name}")
+        return name
+    
+    def pairs(key: str) -> List[List[Any]]:
+        value = query.get(key) or []
+        if not isinstance(value, list) or not all(isinstance(item, (list, tuple)) for item in value):
+            raise ValueError(f"'{key}' must be a list of lists")
+        return [list(item) for item in value]
+    
+    filters = []
+    for item in pairs("filters"):
+        if len(item) == 2:
+            item.append(None)
+        if len(item) != 3:
+            raise ValueError(f"Filters are [column, operator, value], got {item}")
+        name, operator, value = item
+        operator = str(operator).lower()
+        if operator == "=":
+            operator = "=="
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator: {operator}")
+        name = column(name)
+        if operator in ("is null", "not null"):
+            value = None
+        elif operator in ("in", "not in"):
+            values = value if isinstance(value, list) else [value]
+            value = [_checked_filter_value(name, item, types[name]) for item in values]
+        else:
+            value = _checked_filter_value(name, value, types[name], ordered=operator not in ("==", "!="))
+        filters.append([name, operator, value])
+    
+    aggregations = []
+    for item in pairs("aggregations"):
+        if len(item) != 2 or item[1] not in AGGREGATIONS:
+            raise ValueError(f"Aggregations are [column, function] with a function in {', '.join(AGGREGATIONS)}")
+        if item[0] == "*" and item[1] != "count":
+            raise ValueError("Only count can be applied to *")
+        aggregation = [column(item[0], allow_star=True), item[1]]
+        if aggregation not in aggregations:
+            aggregations.append(aggregation)
+    
+    # Repeated names would give the result duplicate column names
+    group_by = list(dict.fromkeys(column(name) for name in query.get("group_by") or []))
+    if group_by and not aggregations:
+        aggregations = [["*", "count"]]
+    columns = list(dict.fromkeys(column(name) for name in query.get("columns") or []))
+    # Sort keys must be columns of the result
+    if aggregations:
+        output_names = group_by + [aggregation_name(name, function) for name, function in aggregations]
+    else:
+        output_names = columns or list(types)
+    order_by = []
+    for item in pairs("order_by"):
+        if not item:
+            raise ValueError("order_by items are [column, direction]")
+        direction = str(item[1]).lower() if len(item) > 1 else "asc"
+        if direction not in ("asc", "desc"):
+            raise ValueError(f"Sort direction must be asc or desc, got {direction}")
+        if item[0] not in output_names:
+            raise ValueError(f"Cannot sort by {item[0]}: the result columns are {', '.join(output_names)}")
+        order_by.append([item[0], direction])
+    
+    limit = query.get("limit")
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise ValueError("limit must be a positive integer")
+    
+    return {
+        "columns": columns,
+        "filters": filters,
+        "group_by": group_by,
+        "aggregations": aggregations,
+        "order_by": order_by,
+        "limit": limit,
+    }
+
+def aggregation_name(name: str, function: str) -> str:
+    """Result column of an aggregation: "count" for [*, count], else <column>_<function>"""
+    return "count" if name == "*" else f"{name}_{function}"
+
+_NUMERIC_TYPES = ("int", "uint", "float", "double", "halffloat", "decimal")
+
+def _checked_filter_value(name: str, value: Any, arrow_type: str, ordered: bool = False) -> Any:
+    """A filter value checked against the column's Arrow type, so a mismatch
+    is a ValueError rather than a failed scan. Numbers given for text columns
+    (e.g. subject IDs) are matched as text, but not range-compared; dates
+    stay ISO strings."""
+    if value is None or isinstance(value, (list, dict)):
+        raise ValueError(f"Filter on {name} needs a single value, got {value!r}")
+    if arrow_type.startswith(_NUMERIC_TYPES):
+        if isinstance(value, bool):
+            raise ValueError(f"{name} is numeric, got {value!r}")
+        if isinstance(value, str):
+            try:
+                number = float(value)
+            except ValueError:
+                raise ValueError(f"{name} is numeric, got {value!r}")
+            return int(number) if number.is_integer() else number
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"{name} is numeric, got {value!r}")
+        return value
+    if arrow_type in ("string", "large_string", "string_view"):
+        if isinstance(value, bool) or (ordered and not isinstance(value, str)):
+            raise ValueError(f"{name} is text, got {value!r}")
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    if arrow_type.startswith(("timestamp", "date")):
+        if not isinstance(value, str):
+            raise ValueError(f"{name} is a date; give it as an ISO string, got {value!r}")
+        try:
+            _filter_value(value, arrow_type)
+        except ValueError:
+            raise ValueError(f"{name} is a date; give it as an ISO string, got {value!r}")
+        return value
+    if arrow_type == "bool":
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if value in (0, 1):
+            return bool(value)
+        raise ValueError(f"{name} is true/false, got {value!r}")
+    return value
+
+def _filter_value(value: Any, arrow_type: str) -> Any:
+    # Dates and timestamps arrive as ISO strings
+    if isinstance(value, str) and arrow_type.startswith("timestamp"):
+        return datetime.fromisoformat(value)
+    if isinstance(value, str) and arrow_type.startswith("date"):
+        return date.fromisoformat(value[:10])
+    return value
+
+def _filter_expression(filters: List[List[Any]], types: Dict[str, str]):
+    import pyarrow.dataset as ds
+    
+    expression = None
+    for name, operator, value in filters:
+        field = ds.field(name)
+        if isinstance(value, list):
+            value = [_filter_value(item, types[name]) for item in value]
+        else:
+            value = _filter_value(value, types[name])
+        condition = {
+            "==": lambda: field == value,
+            "!=": lambda: field != value,
+            "<": lambda: field < value,
+            "<=": lambda: field <= value,
+            ">": lambda: field > value,
+            ">=": lambda: field >= value,
+            "in": lambda: field.isin(value),
+            "not in": lambda: ~field.isin(value),
+            "is null": lambda: field.is_null(),
+            "not null": lambda: field.is_valid(),
+        }[operator]()
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _aggregate(table, group_by: List[str], aggregations: List[List[str]]):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    if group_by:
+        specs = []
+        for name, function in aggregations:
+            if name == "*":
+                specs.append((group_by[0], "count", pc.CountOptions(mode="all")))
+            else:
+                specs.append((name, function))
+        result = table.group_by(group_by).aggregate(specs)
+        # Aggregate columns come back in spec order but may share a name
+        # ([*, count] and [<key>, count] are both "<key>_count"), so rename
+        # them by position rather than by name
+        renamed = iter(aggregation_name(name, function) for name, function in aggregations)
+        result = result.rename_columns([name if name in group_by else next(renamed) for name in result.column_names])
+        return result.select(group_by + [aggregation_name(name, function) for name, function in aggregations])
+    
+    functions = {
+        "count": pc.count,
+        "count_distinct": pc.count_distinct,
+        "sum": pc.sum,
+        "mean": pc.mean,
+        "min": pc.min,
+        "max": pc.max,
+        "stddev": pc.stddev,
+    }
+    values = {}
+    for name, function in aggregations:
+        if name == "*":
+            values["count"] = [table.num_rows]
+        else:
+            values[aggregation_name(name, function)] = [functions[function](table[name]).as_py()]
+    return pa.table(values)
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _sort_keys(order_by: List[List[str]]) -> List[Tuple[str, str]]:
+    return [(name, "ascending" if direction == "asc" else "descending") for name, direction in order_by]
+
+def _top_rows(dataset, columns: List[str], expression, sort_keys: List[Tuple[str, str]], k: int):
+    """The first k matching rows in sort order, keeping only k rows (plus the
+    batch being scanned) in memory"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    top = None
+    for batch in dataset.to_batches(columns=columns, filter=expression):
+        if not batch.num_rows:
+            continue
+        table = pa.Table.from_batches([batch])
+        if top is not None:
+            table = pa.concat_tables([top, table])
+        top = table.take(pc.select_k_unstable(table, k=k, sort_keys=sort_keys))
+    if top is None:
+        return pa.schema([dataset.schema.field(name) for name in columns]).empty_table()
+    return top.sort_by(sort_keys)
+
+def run_dataset_query(parquet_path: str, query: Dict[str, Any], max_rows: int = 50) -> Dict[str, Any]:
+    """Run a validated query against a Parquet dataset; raises ValueError.
+    
+    Only the columns the query touches are read, and filters are pushed
+    down to the scan, so row groups whose statistics rule them out are
+    skipped. Returns at most ``max_rows`` rows (or the query's limit), and
+    row queries stop reading (or keep a running top-k) at that limit.
+    ``row_count`` is the number of rows returned, ``total_rows`` the size
+    of the whole result.
+    """
+    import pyarrow as pa
+    
+    try:
+        return _run_dataset_query(parquet_path, query, max_rows)
+    except pa.ArrowException as e:
+        # Arrow messages can quote table contents; keep the first line
+        message = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+        raise ValueError(f"The query could not be run: {message[:200]}")
+
+def _run_dataset_query(parquet_path: str, query: Dict[str, Any], max_rows: int) -> Dict[str, Any]:
+    import pyarrow.dataset as ds
+    
+    dataset = ds.dataset(parquet_path, format="parquet")
+    types = {field.name: str(field.type) for field in dataset.schema}
+    
+    # Row queries without columns return them all
+    columns = query["columns"] or ([] if query["aggregations"] else list(dataset.schema.names))
+    needed: List[str] = []
+    for name in (columns + [item[0] for item in query["filters"]] + query["group_by"]
+                 + [item[0] for item in query["aggregations"] if item[0] != "*"]):
+        if name not in needed:
+            needed.append(name)
+    if not needed:
+        # A bare count still has to scan something; take the first column
+        needed = [dataset.schema.names[0]]
+    
+    expression = _filter_expression(query["filters"], types)
+    limit = min(query["limit"] or max_rows, max_rows)
+    if query["aggregations"]:
+        table = dataset.to_table(columns=needed, filter=expression)
+        matched_rows = table.num_rows
+        table = _aggregate(table, query["group_by"], query["aggregations"])
+        if query["order_by"]:
+            table = table.sort_by(_sort_keys(query["order_by"]))
+        total_rows = table.num_rows
+        table = table.slice(0, limit)
+    else:
+        # Only the rows that are returned are read; the match count comes
+        # from a scan of the filter columns (row group metadata without filters)
+        if query["order_by"]:
+            table = _top_rows(dataset, needed, expression, _sort_keys(query["order_by"]), limit)
+        else:
+            table = dataset.head(limit, columns=needed, filter=expression)
+        table = table.select(columns)
+        matched_rows = total_rows = dataset.count_rows(filter=expression)
+    
+    # Built column by column: row dicts would merge columns that share a name
+    rows = [[_json_value(value) for value in row] for row in zip(*(column.to_pylist() for column in table.columns))]
+    return {
+        "columns": table.column_names,
+        "rows": rows,
+        "row_count": len(rows),
+        "total_rows": total_rows,
+        "truncated": total_rows > len(rows),
+        "scanned_columns": needed,
+        "matched_rows": matched_rows,
+    }
+
+def format_result_table(result: Dict[str, Any]) -> str:
+    """A query result as a Markdown table"""
+    def cell(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, float):
+            return f"{value:.6g}"
+        return str(value).replace("|", "/")
+    
+    lines = ["| " + " | ".join(result["columns"]) + " |", "|" + "---|" * len(result["columns"])]
+    lines.extend("| " + " | ".join(cell(value) for value in row) + " |" for row in result["rows"])
+    return "\n".join(lines)
@@ -2,8 +2,8 @@
 import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional
-from app.db.session import get_user_db, save_user_db
-from app.core.security import verify_password, get_password_hash
+from app.db.session import users_table
+from app.core.security import verify_password, get_password_hash, password_hash_needs_update, password_fingerprint
 
 # Admin user credentials
 ADMIN_USERNAME = "admin"
@@ -12,12 +12,10 @@ ADMIN_PASSWORD = "admin123"
 
 def ensure_admin_user_exists():
     """Ensure that the admin user exists in the database."""
-    users_db = get_user_db()
-    
     # Check if admin user already exists
-    admin_exists = any(user["username"] == ADMIN_USERNAME for user in users_db)
+    admin_user = get_user_by_username(ADMIN_USERNAME)
     
-    if not admin_exists:
+    if admin_user is None:
         # Create admin user
         admin_user = {
             "id": str(uuid.uuid4()),
@@ -25,34 +23,33 @@ def ensure_admin_user_exists():
             "email": ADMIN_EMAIL,
             "plain_password": ADMIN_PASSWORD,  # Store plain password for admin
             "hashed_password": get_password_hash(ADMIN_PASSWORD),
+            "password_fingerprint": password_fingerprint(ADMIN_PASSWORD),
             "created_at": datetime.utcnow().isoformat(),
             "is_admin": True
         }
         
-        users_db.append(admin_user)
-        save_user_db(users_db)
+        users_table.insert(admin_user)
         print(f"Admin user created: {ADMIN_USERNAME}")
     else:
-        # Re-hash admin password to ensure it works with current hashing algorithm
-        for i, user in enumerate(users_db):
-            if user["username"] == ADMIN_USERNAME:
-                users_db[i]["plain_password"] = ADMIN_PASSWORD  # Update plain password
-                users_db[i]["hashed_password"] = get_password_hash(ADMIN_PASSWORD)
-                save_user_db(users_db)
-                break
+        # Re-hash only when the stored hash predates the current hashing
+        # algorithm or the admin password was changed, not on every boot
+        if (admin_user.get("plain_password") != ADMIN_PASSWORD
+                or password_hash_needs_update(admin_user.get("hashed_password"))):
+            users_table.update(admin_user["id"], {
+                "plain_password": ADMIN_PASSWORD,  # Update plain password
+                "hashed_password": get_password_hash(ADMIN_PASSWORD),
+                "password_fingerprint": password_fingerprint(ADMIN_PASSWORD)
+            })
+            print(f"Admin password re-hashed: {ADMIN_USERNAME}")
         print(f"Admin user already exists: {ADMIN_USERNAME}")
 
 def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
     """Authenticate a user with username and password."""
-    users_db = get_user_db()
-    
     # Debug
     print(f"Authenticating user: {username}")
     
     # Try to find user by username or email (case-insensitive for username)
-    user = next((user for user in users_db if 
-                 user["username"].lower() == username.lower() or 
-                 user["email"] == username), None)
+    user = get_user_by_username(username) or get_user_by_email(username)
     
     if not user:
         print(f"User not found: {username}")
@@ -66,48 +63,50 @@ def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
         # Update password hash if needed
         if not verify_password(password, user["hashed_password"]):
             print("Updating admin password hash")
-            for i, u in enumerate(users_db):
-                if u["username"] == ADMIN_USERNAME:
-                    users_db[i]["plain_password"] = ADMIN_PASSWORD  # Update plain password
-                    users_db[i]["hashed_password"] = get_password_hash(ADMIN_PASSWORD)
-                    save_user_db(users_db)
-                    break
+            users_table.update(user["id"], {
+                "plain_password": ADMIN_PASSWORD,  # Update plain password
+                "hashed_password": get_password_hash(ADMIN_PASSWORD)
+            })
+        _backfill_fingerprint(user, password)
         return user
     
     # Regular password check - we'll check both plain password and hashed password
     if "plain_password" in user and user["plain_password"] == password:
         print("Plain password match")
-        return user
     elif verify_password(password, user["hashed_password"]):
         print("Password verified through hash")
-        return user
+    else:
+        print("Password verification failed")
+        return None
     
-    print("Password verification failed")
-    return None
+    _backfill_fingerprint(user, password)
+    return user
+
+def _backfill_fingerprint(user: Dict[str, Any], password: str) -> None:
+    """Add users created before the fingerprint index to it once their password is known."""
+    fingerprint = password_fingerprint(password)
+    if user.get("password_fingerprint") != fingerprint:
+        users_table.update(user["id"], {"password_fingerprint": fingerprint})
+        user["password_fingerprint"] = fingerprint
 
 def is_password_unique(password: str) -> bool:
-    """Check if a password is unique among all users."""
-    users_db = get_user_db()
-    
-    # Now check both plain password and hashed password
-    for user in users_db:
-        if "plain_password" in user and user["plain_password"] == password:
-            return False
-        elif verify_password(password, user["hashed_password"]):
-            return False
-    
-    return True
+    """Check if a password is unique among all users.
+    
+    A single HMAC and index lookup instead of one key derivation per user.
+    Existing users are fingerprinted by update_existing_users() at startup,
+    or on their next login when only a placeholder password is on record;
+    until then their password isn't counted.
+    """
+    return not users_table.find("password_fingerprint", password_fingerprint(password))
 
 def create_user(username: str, email: str, password: str) -> Dict[str, Any]:
     """Create a new user."""
-    users_db = get_user_db()
-    
     # Check if username already exists (case-insensitive)
-    if any(user["username"].lower() == username.lower() for user in users_db):
+    if users_table.find("username", username):
         raise ValueError("Username already exists")
     
     # Check if email already exists
-    if any(user["email"] == email for user in users_db):
+    if users_table.find("email", email):
         raise ValueError("Email already exists")
     
     # Create new user
@@ -117,44 +116,66 @@ def create_user(username: str, email: str, password: str) -> Dict[str, Any]:
         "email": email,
         "plain_password": password,  # Store plain password
         "hashed_password": get_password_hash(password),
+        "password_fingerprint": password_fingerprint(password),
         "created_at": datetime.utcnow().isoformat(),
         "is_admin": False
     }
     
-    users_db.append(user)
-    save_user_db(users_db)
+    users_table.insert(user)
     print(f"User created: {username}")
     
     return user
 
 def get_user(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user by ID."""
-    users_db = get_user_db()
-    return next((user for user in users_db if user["id"] == user_id), None)
+    return users_table.get(user_id)
 
 def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
     """Get user by username (case-insensitive)."""
-    users_db = get_user_db()
-    return next((user for user in users_db if user["username"].lower() == username.lower()), None)
+    matches = users_table.find("username", username)
+    # Older databases may hold names that only differ by case; prefer the exact one
+    return next((user for user in matches if user["username"] == username), matches[0] if matches else None)
+
+def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    """Get user by email (case-insensitive)."""
+    matches = users_table.find("email", email)
+    return next((user for user in matches if user["email"] == email), matches[0] if matches else None)
+
+# plain_password of users migrated before it was recorded (not their password)
+PLACEHOLDER_PASSWORD_PREFIX = "ChangeMeUser"
+
+def _is_placeholder_password(value: str) -> bool:
+    return value.startswith(PLACEHOLDER_PASSWORD_PREFIX) and value[len(PLACEHOLDER_PASSWORD_PREFIX):].isdigit()
 
 # Add a migration function to update existing users
 def update_existing_users():
     """Update existing users to include plain_password field."""
-    users_db = get_user_db()
     updated = False
     
-    for i, user in enumerate(users_db):
+    for i, user in enumerate(users_table.all()):
         # Skip if plain_password already exists or it's the admin user
         if "plain_password" in user or user.get("username") == ADMIN_USERNAME:
             continue
         
         # Since we can't recover the original password, we'll set a placeholder
         # This is only for demonstration purposes - in a real system, we wouldn't do this
-        placeholder_password = f"ChangeMeUser{i}"
-        users_db[i]["plain_password"] = placeholder_password
+        placeholder_password = f"{PLACEHOLDER_PASSWORD_PREFIX}{i}"
+        users_table.update(user["id"], {"plain_password": placeholder_password})
         updated = True
     
     if updated:
-        save_user_db(users_db)
         print("Updated existing users with plain_password field")
+    
+    # Fingerprint users whose real plain_password is on record; the rest
+    # (placeholders, set now or by an earlier run) are fingerprinted on their
+    # next successful login
+    backfilled = 0
+    for user in users_table.all():
+        if (not user.get("password_fingerprint") and user.get("plain_password")
+                and not _is_placeholder_password(user["plain_password"])):
+            users_table.update(user["id"], {"password_fingerprint": password_fingerprint(user["plain_password"])})
+            backfilled += 1
+    
+    if backfilled:
+        print(f"Added password fingerprints for {backfilled} existing users")
 
@@ -1,14 +1,12 @@
 
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-from app.db.session import get_chat_db, save_chat_db, get_message_db, save_message_db
+from app.db.session import chats_table, messages_table
 
 def create_chat(user_id: str) -> str:
     """Create a new chat for a user."""
-    chats_db = get_chat_db()
-    
     chat = {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
@@ -16,33 +14,49 @@ def create_chat(user_id: str) -> str:
         "created_at": datetime.utcnow().isoformat()
     }
     
-    chats_db.append(chat)
-    save_chat_db(chats_db)
+    chats_table.insert(chat)
     
     return chat["id"]
 
 def get_chats(user_id: str) -> List[Dict[str, Any]]:
     """Get all chats for a user."""
-    chats_db = get_chat_db()
-    return [chat for chat in chats_db if chat["user_id"] == user_id]
+    return chats_table.find("user_id", user_id)
+
+def get_chats_page(user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Get one page of a user's chats (oldest first) and the cursor of the next page."""
+    return chats_table.page("user_id", user_id, limit, cursor)
 
-def get_chat(chat_id: str) -> Optional[Dict[str, Any]]:
+def get_chat(chat_id: str, include_messages: bool = True) -> Optional[Dict[str, Any]]:
     """Get a chat by ID."""
-    chats_db = get_chat_db()
-    chat = next((chat for chat in chats_db if chat["id"] == chat_id), None)
+    chat = chats_table.get(chat_id)
     
-    if chat:
+    if chat and include_messages:
         # Get messages for this chat
-        messages_db = get_message_db()
-        chat_messages = [msg for msg in messages_db if msg["chat_id"] == chat_id]
+        chat_messages = messages_table.find("chat_id", chat_id)
         chat["messages"] = sorted(chat_messages, key=lambda m: m["created_at"])
     
     return chat
 
+def get_messages_page(
+    chat_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    latest: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Get one page of a chat's messages in chronological order.
+    
+    With ``latest`` the page is the newest ``limit`` messages before ``cursor``
+    (or the end of the chat) and the returned cursor walks towards older ones.
+    """
+    if latest:
+        messages, next_cursor = messages_table.page("chat_id", chat_id, limit, cursor, descending=True)
+        messages.reverse()
+        return messages, next_cursor
+    
+    return messages_table.page("chat_id", chat_id, limit, cursor)
+
 def add_message(chat_id: str, role: str, content: str) -> str:
     """Add a message to a chat."""
-    messages_db = get_message_db()
-    
     message = {
         "id": str(uuid.uuid4()),
         "chat_id": chat_id,
@@ -51,33 +65,20 @@ def add_message(chat_id: str, role: str, content: str) -> str:
         "created_at": datetime.utcnow().isoformat()
     }
     
-    messages_db.append(message)
-    save_message_db(messages_db)
+    messages_table.insert(message)
     
     return message["id"]
 
 def rename_chat(chat_id: str, title: str) -> bool:
     """Rename a chat."""
-    chats_db = get_chat_db()
-    
-    for chat in chats_db:
-        if chat["id"] == chat_id:
-            chat["title"] = title
-            save_chat_db(chats_db)
-            return True
-    
-    return False
+    return chats_table.update(chat_id, {"title": title}) is not None
 
 def delete_chat(chat_id: str) -> bool:
     """Delete a chat and its messages."""
     # Delete chat
-    chats_db = get_chat_db()
-    chats_db = [chat for chat in chats_db if chat["id"] != chat_id]
-    save_chat_db(chats_db)
+    chats_table.delete(chat_id)
     
     # Delete messages
-    messages_db = get_message_db()
-    messages_db = [msg for msg in messages_db if msg["chat_id"] != chat_id]
-    save_message_db(messages_db)
+    messages_table.delete_where("chat_id", chat_id)
     
     return True
@@ -1,82 +1,256 @@
 
 import uuid
 import os
-import shutil
+import hashlib
+import mimetypes
+import threading
+import zipfile
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 from fastapi import UploadFile
 
-from app.db.session import get_document_db, save_document_db
+from app.db.session import documents_table
 from app.core.config import settings
+from app.core.executors import run_db
+from app.rag.dataset_cache import remove_dataset_cache
+from app.rag.sas_symbol_index import SasSymbolIndex
+from app.services.rag_service import forget_content
 
-async def save_document(file: UploadFile, user_id: str) -> str:
-    """Save an uploaded document to disk and register in DB."""
+class UploadTooLargeError(Exception):
+    """The upload exceeded settings.MAX_UPLOAD_SIZE"""
+
+# Serializes "does anyone still reference this blob" against new references,
+# so a delete can't remove a blob that an upload is about to share
+_blob_lock = threading.Lock()
+
+# Datasets, PROCs, macros and %include targets of the indexed SAS programs
+sas_symbol_index = SasSymbolIndex(lambda: (row for row in documents_table.all() if row.get("sas_symbols")))
+
+def _sync_sas_symbols(document_id: Optional[str]) -> None:
+    if document_id is None:
+        sas_symbol_index.invalidate()
+        return
+    document = documents_table.get(document_id)
+    if document is None:
+        sas_symbol_index.remove_document(document_id)
+    else:
+        sas_symbol_index.update_document(document)
+
+documents_table.subscribe(_sync_sas_symbols)
+
+def blob_path(content_hash: str) -> str:
+    """Where the content with this SHA-256 is stored"""
+    return os.path.join(settings.BLOBS_DIR, content_hash[:2], content_hash)
+
+def _write_chunk(buffer, digest, chunk: bytes) -> None:
+    # hashlib releases the GIL on large buffers, so both halves run off the loop
+    digest.update(chunk)
+    buffer.write(chunk)
+
+def _remove_file(file_path: str) -> None:
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+async def _stream_to_disk(read: Callable[[int], Awaitable[bytes]], file_path: str) -> Tuple[str, int]:
+    """Copy a stream to ``file_path`` chunk by chunk; returns (sha256 hex, byte count)."""
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_db(open, file_path, "wb")
+    try:
+        while True:
+            chunk = await read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if settings.MAX_UPLOAD_SIZE and size > settings.MAX_UPLOAD_SIZE:
+                raise UploadTooLargeError(
+                    f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes"
+                )
+            await run_db(_write_chunk, buffer, digest, chunk)
+    except BaseException:
+        await run_db(buffer.close)
+        await run_db(_remove_file, file_path)
+        raise
+    await run_db(buffer.close)
+    return digest.hexdigest(), size
+
+def _register_document(temp_path: str, document: Dict[str, Any]) -> None:
+    """Move the upload into its blob (or drop it if the blob exists) and add the row."""
+    file_path = document["file_path"]
+    with _blob_lock:
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(temp_path, file_path)
+        documents_table.insert(document)
+
+async def _save_stream(
+    read: Callable[[int], Awaitable[bytes]],
+    filename: str,
+    mime_type: Optional[str],
+    user_id: str,
+    batch_id: Optional[str] = None
+) -> str:
     document_id = str(uuid.uuid4())
-    file_ext = os.path.splitext(file.filename)[1]
-    file_path = os.path.join(settings.DOCUMENTS_DIR, f"{document_id}{file_ext}")
+    temp_path = os.path.join(settings.BLOBS_DIR, f"upload-{document_id}.tmp")
     
     # Save file to disk
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    content_hash, file_size = await _stream_to_disk(read, temp_path)
     
     # Register in database
-    documents_db = get_document_db()
-    
     document = {
         "id": document_id,
         "user_id": user_id,
-        "filename": file.filename,
-        "file_path": file_path,
-        "file_size": os.path.getsize(file_path),
-        "mime_type": file.content_type or "application/octet-stream",
+        "filename": filename,
+        "file_path": blob_path(content_hash),
+        "file_size": file_size,
+        "content_hash": content_hash,
+        "mime_type": mime_type or "application/octet-stream",
         "created_at": datetime.utcnow().isoformat(),
         "processed": False,
         "processing_status": "pending"
     }
+    if batch_id:
+        document["batch_id"] = batch_id
     
-    documents_db.append(document)
-    save_document_db(documents_db)
+    await run_db(_register_document, temp_path, document)
     
     return document_id
 
+async def save_document(file: UploadFile, user_id: str, batch_id: Optional[str] = None) -> str:
+    """Save an uploaded document to disk and register in DB.
+    
+    The content hash and size are computed while the file is written, so
+    nothing downstream has to read it again to fingerprint it. Identical
+    uploads share one blob.
+    """
+    return await _save_stream(file.read, file.filename, file.content_type, user_id, batch_id)
+
+async def save_zip_documents(
+    file: UploadFile,
+    user_id: str,
+    batch_id: str,
+    allowed_extensions: List[str],
+    max_files: int
+) -> Tuple[List[str], List[Dict[str, str]]]:
+    """Save every supported member of an uploaded zip archive as a document.
+    
+    Members are decompressed straight into their blobs, one at a time, and each
+    is held to MAX_UPLOAD_SIZE by its decompressed size. Returns the new
+    document ids and the members that were skipped (with the reason).
+    """
+    document_ids: List[str] = []
+    skipped: List[Dict[str, str]] = []
+    try:
+        archive = await run_db(zipfile.ZipFile, file.file)
+    except zipfile.BadZipFile:
+        return document_ids, [{"filename": file.filename, "reason": "Not a valid zip archive"}]
+    
+    with archive:
+        for info in archive.infolist():
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or not filename or filename.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            if os.path.splitext(filename)[1].lower() not in allowed_extensions:
+                skipped.append({"filename": info.filename, "reason": "File type not allowed"})
+                continue
+            if len(document_ids) >= max_files:
+                skipped.append({"filename": info.filename, "reason": "Batch file limit reached"})
+                continue
+            
+            member = await run_db(archive.open, info)
+            try:
+                document_ids.append(await _save_stream(
+                    lambda size: run_db(member.read, size),
+                    filename,
+                    mimetypes.guess_type(filename)[0],
+                    user_id,
+                    batch_id
+                ))
+            except UploadTooLargeError as e:
+                skipped.append({"filename": info.filename, "reason": str(e)})
+            finally:
+                await run_db(member.close)
+    
+    return document_ids, skipped
+
 def list_documents(user_id: str) -> List[Dict[str, Any]]:
     """List all documents for a user."""
-    documents_db = get_document_db()
-    return [doc for doc in documents_db if doc["user_id"] == user_id]
+    return documents_table.find("user_id", user_id)
+
+def list_documents_page(user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """List one page of a user's documents (oldest first) and the cursor of the next page."""
+    return documents_table.page("user_id", user_id, limit, cursor)
 
 def get_document(document_id: str) -> Optional[Dict[str, Any]]:
     """Get a document by ID."""
-    documents_db = get_document_db()
-    return next((doc for doc in documents_db if doc["id"] == document_id), None)
+    return documents_table.get(document_id)
+
+def find_documents_by_hash(content_hash: str) -> List[Dict[str, Any]]:
+    """All document rows (any user) that reference this content."""
+    return documents_table.find("content_hash", content_hash)
 
 def delete_document(document_id: str) -> bool:
-    """Delete a document."""
-    documents_db = get_document_db()
-    document = next((doc for doc in documents_db if doc["id"] == document_id), None)
-    
-    if not document:
-        return False
-    
-    # Remove from disk if exists
-    if os.path.exists(document["file_path"]):
-        os.remove(document["file_path"])
-    
-    # Remove from database
-    documents_db = [doc for doc in documents_db if doc["id"] != document_id]
-    save_document_db(documents_db)
+    """Delete a document, and its blob and indexed chunks once no other document references them."""
+    with _blob_lock:
+        document = documents_table.get(document_id)
+        
+        if not document:
+            return False
+        
+        # Remove from database
+        documents_table.delete(document_id)
+        
+        # Keep the blob while other documents still point at it. Documents
+        # uploaded before content addressing own their file outright.
+        content_hash = document.get("content_hash")
+        copies = find_documents_by_hash(content_hash) if content_hash else []
+        if any(other["file_path"] == document["file_path"] for other in copies):
+            return True
+        
+        # Remove from disk if exists
+        if os.path.exists(document["file_path"]):
+            os.remove(document["file_path"])
+        remove_dataset_cache(document["file_path"])
+        
+        # Last copy of the content: its chunks go too, so a later upload of
+        # the same bytes is indexed again rather than skipped. Done under the
+        # lock so such an upload cannot register in between.
+        if content_hash and not copies:
+            try:
+                forget_content(content_hash)
+            except Exception as e:
+                print(f"Error removing indexed chunks of {document_id}: {str(e)}")
     
     return True
 
-def update_document_status(document_id: str, status: str, processed: bool = None) -> bool:
-    """Update document processing status."""
-    documents_db = get_document_db()
-    
-    for doc in documents_db:
-        if doc["id"] == document_id:
-            doc["processing_status"] = status
-            if processed is not None:
-                doc["processed"] = processed
-            save_document_db(documents_db)
-            return True
+def update_document_status(
+    document_id: str,
+    status: str,
+    processed: bool = None,
+    timings: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None
+) -> bool:
+    """Update document processing status, and optionally its stage timings / error."""
+    changes = {"processing_status": status}
+    if processed is not None:
+        changes["processed"] = processed
+    if timings is not None:
+        changes["processing_timings"] = timings
+    if error is not None:
+        changes["processing_error"] = error
     
-    return False
+    return documents_table.update(document_id, changes) is not None
+
+def register_dataset(document_id: str, dataset: Dict[str, Any]) -> bool:
+    """Record the schema and Parquet location of a tabular document."""
+    return documents_table.update(document_id, {"dataset": dataset}) is not None
+
+def register_sas_symbols(document_id: str, symbols: List[Dict[str, Any]]) -> bool:
+    """Record the symbol postings of a SAS program (indexed on update)."""
+    return documents_table.update(document_id, {"sas_symbols": symbols}) is not None
+
+def find_sas_symbol(user_id: str, kind: str, name: str, role: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Where a user's SAS programs define or use a symbol (e.g. which section creates a dataset)."""
+    return sas_symbol_index.lookup(kind, name, role=role, user_id=user_id)
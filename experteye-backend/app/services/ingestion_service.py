@@ -0,0 +1,413 @@
+
+import asyncio
+import os
+import tempfile
+import time
+from itertools import islice
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.executors import run_db, run_extraction, run_indexing
+from app.core.progress import progress_bus
+from app.rag.extraction_cache import iter_documents
+from app.rag.processor_core import PROGRESS_INTERVAL, extract_and_spool
+from app.rag.store_utils import load_json_safely
+from app.rag.processors.sas_processor import ensure_sas_dataset_cache, sas_program_symbols
+from app.services.document_service import get_document, register_dataset, register_sas_symbols, update_document_status
+from app.services.rag_service import get_document_processor, is_content_indexed
+
+# Most recent batch uploads and their per-document status (in memory only)
+MAX_TRACKED_BATCHES = 100
+_batches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+FINAL_STATUSES = ("completed", "failed")
+
+def document_progress_event(
+    document_id: str,
+    status: str,
+    timings: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None,
+    progress: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Progress event for one document, as published on "document:<id>".
+
+    ``progress`` holds the live counters of a running ingestion: pages
+    extracted (of total_pages, for formats that have a page count) and
+    chunks embedded so far, and the seconds the current stage still needs
+    at the rate observed so far (None until there is a rate to go by).
+    """
+    timings = timings or {}
+    progress = progress or {}
+    event = {
+        "document_id": document_id,
+        "status": status,
+        "pages_extracted": progress.get("pages", timings.get("pages")),
+        "total_pages": progress.get("total_pages"),
+        "chunks": timings.get("chunks"),
+        "chunks_embedded": progress.get(
+            "chunks_embedded", timings.get("chunks") if status in ("indexing", "completed") else 0
+        ),
+        "eta_seconds": 0.0 if status in FINAL_STATUSES else progress.get("eta_seconds"),
+        "timings": timings,
+    }
+    if error:
+        event["error"] = error
+    return event
+
+def is_final_document_event(event: Dict[str, Any]) -> bool:
+    return event["status"] in FINAL_STATUSES
+
+def is_final_batch_event(event: Dict[str, Any]) -> bool:
+    return event["finished"]
+
+def create_batch(batch_id: str, user_id: str, document_ids: List[str]) -> Dict[str, Any]:
+    """Start tracking a batch upload."""
+    batch = {
+        "id": batch_id,
+        "user_id": user_id,
+        "created_at": datetime.utcnow().isoformat(),
+        "started": time.monotonic(),
+        "finished": None,
+        "documents": {document_id: "pending" for document_id in document_ids},
+        "pages_extracted": 0,
+        "chunks_embedded": 0,
+    }
+    _batches[batch_id] = batch
+    while len(_batches) > MAX_TRACKED_BATCHES:
+        _batches.popitem(last=False)
+    return batch
+
+def get_batch_progress(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Aggregate progress of a batch upload, or None if it isn't tracked."""
+    batch = _batches.get(batch_id)
+    if batch is None:
+        return None
+
+    counts: Dict[str, int] = {}
+    for status in batch["documents"].values():
+        counts[status] = counts.get(status, 0) + 1
+    total = len(batch["documents"])
+    done = counts.get("completed", 0) + counts.get("failed", 0)
+    end = batch["finished"] or time.monotonic()
+    elapsed = end - batch["started"]
+    # Naive ETA from the average time per finished document so far
+    eta = None
+    if batch["finished"] is not None:
+        eta = 0.0
+    elif done:
+        eta = round(elapsed / done * (total - done), 1)
+    return {
+        "batch_id": batch["id"],
+        "user_id": batch["user_id"],
+        "created_at": batch["created_at"],
+        "total": total,
+        "done": done,
+        "status_counts": counts,
+        "pages_extracted": batch["pages_extracted"],
+        "chunks_embedded": batch["chunks_embedded"],
+        "elapsed_seconds": round(elapsed, 2),
+        "eta_seconds": eta,
+        "finished": batch["finished"] is not None,
+    }
+
+def _publish_batch(batch_id: Optional[str]) -> None:
+    progress = get_batch_progress(batch_id) if batch_id else None
+    if progress is not None:
+        progress_bus.publish(f"batch:{batch_id}", progress)
+
+def _count_in_batch(document: Dict[str, Any], field: str, amount: int) -> None:
+    batch = _batches.get(document.get("batch_id"))
+    if batch is not None:
+        batch[field] += amount
+
+def _eta(done: int, total: Optional[int], started: float) -> Optional[float]:
+    """Seconds until ``total`` units are done, at the rate observed since ``started``"""
+    if not done or not total:
+        return None
+    return round((time.monotonic() - started) / done * max(total - done, 0), 1)
+
+async def _set_status(
+    document: Dict[str, Any],
+    status: str,
+    processed: bool = None,
+    timings: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None,
+    progress: Optional[Dict[str, Any]] = None
+) -> None:
+    await run_db(update_document_status, document["id"], status, processed, timings, error)
+    progress_bus.publish(
+        f"document:{document['id']}", document_progress_event(document["id"], status, timings, error, progress)
+    )
+    batch = _batches.get(document.get("batch_id"))
+    if batch is not None:
+        batch["documents"][document["id"]] = status
+        _publish_batch(batch["id"])
+
+async def ingest_document(document_id: str) -> None:
+    """Extract, chunk, embed and index an uploaded document."""
+    await ingest_documents([document_id])
+
+async def ingest_documents(document_ids: List[str], batch_id: Optional[str] = None) -> None:
+    """Extract, chunk, embed and index uploaded documents.
+
+    Extraction fans out over the worker processes, which stream chunks into
+    spool files; as documents finish, their chunks are read back and embedded
+    in EMBEDDING_BATCH_SIZE calls shared across documents, so memory is
+    bounded by the batch size rather than the size of the files.
+    Status moves through extracting -> embedding -> indexing -> completed (or
+    failed), with per-stage timings recorded on each document row. Documents
+    whose content is already indexed, or repeated within the batch, reuse it.
+    """
+    documents = [document for document in await run_db(lambda: [get_document(i) for i in document_ids]) if document]
+
+    # One extraction per distinct content; identical files follow the first
+    leaders: Dict[str, Dict[str, Any]] = {}
+    followers: Dict[str, List[Dict[str, Any]]] = {}
+    to_extract: List[Dict[str, Any]] = []
+    for document in documents:
+        content_hash = document.get("content_hash")
+        if content_hash and content_hash in leaders:
+            followers.setdefault(content_hash, []).append(document)
+        elif await run_db(is_content_indexed, content_hash):
+            await _set_status(document, "completed", True, {"reused": True})
+        else:
+            if content_hash:
+                leaders[content_hash] = document
+            to_extract.append(document)
+
+    if to_extract:
+        try:
+            processor = await run_db(get_document_processor)
+        except Exception as e:
+            print(f"Error loading document processor: {str(e)}")
+            for document in to_extract:
+                await _set_status(document, "failed", False, None, str(e))
+        else:
+            await _run_pipeline(processor, to_extract)
+
+    # Duplicates within the batch share the outcome of the copy that was processed
+    for content_hash, copies in followers.items():
+        leader = await run_db(get_document, leaders[content_hash]["id"])
+        for document in copies:
+            if leader and leader.get("processed"):
+                await _set_status(document, "completed", True, {"reused": True})
+            else:
+                error = leader.get("processing_error") if leader else "Document was deleted"
+                await _set_status(document, "failed", False, None, error)
+
+    # Structured side data: columnar copies of SAS datasets for structured
+    # queries, symbol postings of SAS programs for the symbol index
+    for document in documents:
+        if document["filename"].lower().endswith((".sas7bdat", ".sas")):
+            await _register_structure(document)
+    
+    batch = _batches.get(batch_id)
+    if batch is not None:
+        batch["finished"] = time.monotonic()
+        _publish_batch(batch_id)
+
+async def _register_structure(document: Dict[str, Any]) -> None:
+    current = await run_db(get_document, document["id"])
+    if not current or not current.get("processed"):
+        return
+    try:
+        if document["filename"].lower().endswith(".sas"):
+            symbols = await run_extraction(sas_program_symbols, document["file_path"])
+            await run_db(register_sas_symbols, document["id"], symbols)
+            return
+        # Usually just reads the schema: extraction already wrote the Parquet copy
+        dataset = await run_extraction(ensure_sas_dataset_cache, document["file_path"])
+        if dataset:
+            await run_db(register_dataset, document["id"], dataset)
+    except Exception as e:
+        print(f"Error registering structure of {document['id']}: {str(e)}")
+
+def _take(chunks: Iterator[Any], count: int) -> List[Any]:
+    return list(islice(chunks, count))
+
+def _iter_spooled(group: List[Tuple[Dict[str, Any], str, int]]) -> Iterator[Any]:
+    for _, spool_path, _ in group:
+        yield from iter_documents(spool_path)
+
+def _remove_spool(spool_path: str) -> None:
+    if os.path.exists(spool_path):
+        os.remove(spool_path)
+
+def _publish_progress(document: Dict[str, Any], status: str, timings: Dict[str, Any], progress: Dict[str, Any]) -> None:
+    """Publish live counters between status changes (not written to the document row)"""
+    progress_bus.publish(
+        f"document:{document['id']}", document_progress_event(document["id"], status, timings, None, progress)
+    )
+    _publish_batch(document.get("batch_id"))
+
+async def _run_pipeline(processor, documents: List[Dict[str, Any]]) -> None:
+    timings: Dict[str, Dict[str, Any]] = {document["id"]: {} for document in documents}
+    # Live counters of each document, for its progress events
+    progress: Dict[str, Dict[str, Any]] = {document["id"]: {"pages": 0} for document in documents}
+    # (document, spool file with its chunks, number of chunks)
+    extracted: "asyncio.Queue[Optional[Tuple[Dict[str, Any], str, int]]]" = asyncio.Queue()
+    
+    async def extract(document: Dict[str, Any]) -> None:
+        fd, spool_path = tempfile.mkstemp(prefix="experteye-chunks-", suffix=".jsonl")
+        os.close(fd)
+        # The worker reports the pages it has extracted here
+        progress_path = spool_path + ".progress"
+        live = progress[document["id"]]
+        try:
+            await _set_status(document, "extracting", progress=live)
+            started = time.monotonic()
+            extraction = asyncio.ensure_future(run_extraction(
+                extract_and_spool,
+                document["file_path"],
+                document["filename"],
+                spool_path,
+                processor.chunk_size,
+                processor.chunk_overlap,
+                {"document_id": document["id"], "content_hash": document.get("content_hash")},
+                document.get("content_hash"),
+                progress_path
+            ))
+            while not extraction.done():
+                await asyncio.wait({extraction}, timeout=PROGRESS_INTERVAL)
+                reported = load_json_safely(progress_path)
+                if reported.get("pages", 0) > live["pages"]:
+                    _count_in_batch(document, "pages_extracted", reported["pages"] - live["pages"])
+                    live["pages"] = reported["pages"]
+                    live["total_pages"] = reported.get("total_pages")
+                    live["eta_seconds"] = _eta(live["pages"], live["total_pages"], started)
+                    _publish_progress(document, "extracting", timings[document["id"]], live)
+            stats = extraction.result()
+            timings[document["id"]].update(stats)
+            _count_in_batch(document, "pages_extracted", stats["pages"] - live["pages"])
+            live.update(pages=stats["pages"], chunks_embedded=0, eta_seconds=None)
+            if not stats["chunks"]:
+                _remove_spool(spool_path)
+                await _set_status(
+                    document, "failed", False, timings[document["id"]], "No text could be extracted", live
+                )
+                await extracted.put(None)
+                return
+            await _set_status(document, "embedding", None, timings[document["id"]], None, live)
+            await extracted.put((document, spool_path, stats["chunks"]))
+        except Exception as e:
+            print(f"Error extracting document {document['id']}: {str(e)}")
+            _remove_spool(spool_path)
+            await _set_status(document, "failed", False, timings[document["id"]], str(e), live)
+            await extracted.put(None)
+        finally:
+            _remove_spool(progress_path)
+    
+    # The pool bounds how many extractions actually run at once
+    producers = [asyncio.create_task(extract(document)) for document in documents]
+    
+    pending: List[Tuple[Dict[str, Any], str, int]] = []
+    pending_chunks = 0
+    for _ in documents:
+        item = await extracted.get()
+        if item is None:
+            continue
+        pending.append(item)
+        pending_chunks += item[2]
+        if pending_chunks >= settings.EMBEDDING_BATCH_SIZE:
+            await _embed_and_index(processor, pending, timings, progress)
+            pending, pending_chunks = [], 0
+    if pending:
+        await _embed_and_index(processor, pending, timings, progress)
+    
+    await asyncio.gather(*producers)
+
+def _publish_embedded(
+    group: List[Tuple[Dict[str, Any], str, int]],
+    timings: Dict[str, Dict[str, Any]],
+    progress: Dict[str, Dict[str, Any]],
+    embedded: int,
+    started: float
+) -> None:
+    """Publish chunks_embedded and the ETA of each document in ``group`` after a batch.
+
+    The group's chunks are embedded in document order, so a document is done
+    once the group gets past its last chunk.
+    """
+    end = 0
+    for document, _, count in group:
+        start, end = end, end + count
+        live = progress[document["id"]]
+        if live["chunks_embedded"] == count:
+            continue
+        done = min(max(embedded - start, 0), count)
+        _count_in_batch(document, "chunks_embedded", done - live["chunks_embedded"])
+        live["chunks_embedded"] = done
+        live["eta_seconds"] = _eta(embedded, end, started)
+        _publish_progress(document, "embedding", timings[document["id"]], live)
+
+async def _embed_and_index(
+    processor,
+    group: List[Tuple[Dict[str, Any], str, int]],
+    timings: Dict[str, Dict[str, Any]],
+    progress: Dict[str, Dict[str, Any]]
+) -> None:
+    """Embed the spooled chunks of several documents in shared batches, index and persist them.
+    
+    Only one EMBEDDING_BATCH_SIZE slice of chunks is in memory at a time.
+    Each document's chunks_embedded and ETA are published after every
+    batch. If anything fails, chunks already added for the group are
+    removed again.
+    """
+    store = processor.vector_store
+    total_chunks = sum(count for _, _, count in group)
+    chunks = _iter_spooled(group)
+    added_ids: List[str] = []
+    try:
+        embed_seconds = 0.0
+        index_seconds = 0.0
+        started = time.monotonic()
+        embedded_chunks = 0
+        while True:
+            batch = await run_indexing(_take, chunks, settings.EMBEDDING_BATCH_SIZE)
+            if not batch:
+                break
+            start = time.perf_counter()
+            vectors = await run_indexing(store.embed_documents, batch)
+            embedded = time.perf_counter()
+            added_ids.extend(await run_indexing(store.add_embedded_documents, batch, vectors))
+            embed_seconds += embedded - start
+            index_seconds += time.perf_counter() - embedded
+            embedded_chunks += len(batch)
+            _publish_embedded(group, timings, progress, embedded_chunks, started)
+        
+        for document, _, _ in group:
+            timings[document["id"]]["embed_seconds"] = round(embed_seconds, 4)
+            timings[document["id"]]["embed_batch_chunks"] = total_chunks
+            progress[document["id"]]["eta_seconds"] = None
+            await _set_status(document, "indexing", None, timings[document["id"]], None, progress[document["id"]])
+        
+        start = time.perf_counter()
+        await run_indexing(store.save_vector_store)
+        for document, _, _ in group:
+            if document.get("content_hash"):
+                await run_indexing(store.mark_indexed, document["filename"], document["content_hash"])
+        index_seconds += time.perf_counter() - start
+    except Exception as e:
+        print(f"Error embedding/indexing documents: {str(e)}")
+        try:
+            await run_indexing(store.remove_documents, added_ids)
+        except Exception as cleanup_error:
+            print(f"Error removing partially indexed chunks: {str(cleanup_error)}")
+        for document, _, _ in group:
+            # Its chunks are out of the index again
+            live = progress[document["id"]]
+            _count_in_batch(document, "chunks_embedded", -live["chunks_embedded"])
+            live["chunks_embedded"] = 0
+            await _set_status(document, "failed", False, timings[document["id"]], str(e), live)
+        return
+    finally:
+        chunks.close()
+        for _, spool_path, _ in group:
+            _remove_spool(spool_path)
+    
+    for document, _, count in group:
+        timings[document["id"]]["index_seconds"] = round(index_seconds, 4)
+        await _set_status(document, "completed", True, timings[document["id"]], None, progress[document["id"]])
+        print(f"Processed document {document['id']}: {timings[document['id']]}")
@@ -1,17 +1,23 @@
 
 import os
 import json
+import time
 import httpx
 import asyncio
 from typing import Dict, Any, List, Optional
 from app.core.config import settings
 
-OLLAMA_BASE_URL = "http://localhost:11434"  # Default Ollama API address
+OLLAMA_BASE_URL = settings.OLLAMA_BASE_URL  # Ollama API address
+
+def _model_tag(name: str) -> str:
+    # Ollama lists untagged models as "<name>:latest"
+    return name if ":" in name else f"{name}:latest"
 
 class OllamaService:
     def __init__(self, base_url: str = OLLAMA_BASE_URL):
         self.base_url = base_url
-        self.model_name = "deepseek:1.5b"  # Default model
+        self.model_name = settings.LLM_MODEL
+        self.embedding_model = settings.EMBEDDING_MODEL
         self.client = httpx.AsyncClient(timeout=60.0)  # Longer timeout for model operations
 
     async def check_model_availability(self) -> bool:
@@ -25,6 +31,39 @@ class OllamaService:
             print(f"Error checking model availability: {str(e)}")
             return False
 
+    async def warm_up(self) -> Dict[str, Any]:
+        """Load the LLM and embedding models into memory ahead of the first request.
+        
+        Raises if Ollama is unreachable or a model isn't installed.
+        """
+        response = await self.client.get(f"{self.base_url}/api/tags")
+        response.raise_for_status()
+        available = {_model_tag(model["name"]) for model in response.json().get("models", [])}
+        missing = sorted(
+            name for name in {self.model_name, self.embedding_model} if _model_tag(name) not in available
+        )
+        if missing:
+            raise RuntimeError(f"Models not available in Ollama: {', '.join(missing)}")
+        
+        timings = {}
+        # An empty prompt only loads the model
+        start = time.perf_counter()
+        response = await self.client.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.model_name, "prompt": "", "stream": False}
+        )
+        response.raise_for_status()
+        timings["llm_seconds"] = round(time.perf_counter() - start, 4)
+        
+        start = time.perf_counter()
+        response = await self.client.post(
+            f"{self.base_url}/api/embeddings",
+            json={"model": self.embedding_model, "prompt": "warm-up"}
+        )
+        response.raise_for_status()
+        timings["embedding_seconds"] = round(time.perf_counter() - start, 4)
+        return timings
+
     async def pull_model(self) -> Dict[str, Any]:
         """Pull the deepseek model if not already available."""
         try:
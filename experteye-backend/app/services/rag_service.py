@@ -0,0 +1,87 @@
+
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.executors import run_db, run_indexing
+from app.core.readiness import readiness
+from app.services.ollama_service import ollama_service
+
+_processor = None
+_processor_lock = threading.Lock()
+
+def get_document_processor():
+    """Shared DocumentProcessor (vector store + embeddings), created on first use."""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                # Heavy imports (FAISS, loaders) only happen here
+                from langchain_ollama import OllamaEmbeddings
+                from app.rag.processor_core import DocumentProcessor
+                
+                embeddings = OllamaEmbeddings(model=settings.EMBEDDING_MODEL, base_url=settings.OLLAMA_BASE_URL)
+                _processor = DocumentProcessor(
+                    embeddings,
+                    storage_dir=settings.VECTOR_STORE_DIR,
+                    chunk_size=settings.CHUNK_SIZE,
+                    chunk_overlap=settings.CHUNK_OVERLAP
+                )
+    return _processor
+
+def is_content_indexed(content_hash: Optional[str]) -> bool:
+    """True if identical content already has chunks and vectors in the store."""
+    return bool(content_hash) and get_document_processor().vector_store.is_indexed(content_hash)
+
+def forget_content(content_hash: str) -> int:
+    """Remove the vectors of content that no document references any more."""
+    return get_document_processor().vector_store.forget_content(content_hash)
+
+def _load_vector_index() -> Dict[str, Any]:
+    store = get_document_processor().vector_store
+    return {
+        "index_loaded": store.vector_store is not None,
+        "processed_files": len(store.processed_files),
+    }
+
+async def warm_up(retry_seconds: Optional[float] = None) -> bool:
+    """Run the vector index and model warm-up stages.
+    
+    With ``retry_seconds`` failed stages are retried at that interval until
+    everything is ready; otherwise a single pass is made. Returns readiness.
+    """
+    stages = {
+        "vector_index": lambda: run_db(_load_vector_index),
+        "models": ollama_service.warm_up,
+    }
+    while True:
+        for name, start_stage in stages.items():
+            if readiness.status(name) == "ready":
+                continue
+            try:
+                await readiness.run(name, start_stage())
+            except Exception as e:
+                print(f"Warm-up stage {name} failed: {str(e)}")
+        
+        if readiness.is_ready() or retry_seconds is None:
+            return readiness.is_ready()
+        await asyncio.sleep(retry_seconds)
+
+async def answer_dataset_question(document: Dict[str, Any], question: str) -> Dict[str, Any]:
+    """Answer a question about a tabular document from its Parquet copy.
+    
+    The LLM turns the question into a filter/aggregate query over the
+    registered schema; the (small) result table, not retrieved text, is then
+    the context for the answer. Raises ValueError for an unusable query.
+    """
+    from app.rag.structured_query import (
+        build_answer_prompt, build_query_plan_prompt, parse_query_plan, run_dataset_query, validate_query
+    )
+    
+    schema = document["dataset"]
+    reply = await ollama_service.generate_response(build_query_plan_prompt(question, schema))
+    query = validate_query(parse_query_plan(reply), schema)
+    result = await run_indexing(run_dataset_query, schema["parquet_path"], query, settings.STRUCTURED_QUERY_MAX_ROWS)
+    answer = await ollama_service.generate_response(build_answer_prompt(question, schema, query, result))
+    return {"answer": answer, "query": query, "result": result}
@@ -0,0 +1,133 @@
+"""Latency of GET /api/chat/ while a large database write is in progress.
+
+Runs the FastAPI app in-process through httpx's ASGI transport against a
+throwaway JSON database and compares two ways of issuing a large write
+(replacing the documents collection with --rows rows):
+
+  inline    the write runs directly on the event loop (the old behaviour)
+  executor  the write goes through run_db onto the bounded storage pool
+
+For each mode it reports p50/p99/max latency of --requests concurrent
+GET /api/chat/ calls issued while the write is running.
+
+Usage (from experteye-backend/):
+    python -m benchmarks.bench_async_storage --rows 200000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+def _configure_environment() -> str:
+    """Point the app at an empty scratch database before it is imported"""
+    root = tempfile.mkdtemp(prefix="experteye-bench-")
+    os.environ["DATA_DIR"] = os.path.join(root, "data")
+    os.environ["DOCUMENTS_DIR"] = os.path.join(root, "data", "documents")
+    os.environ["DATABASE_DIR"] = os.path.join(root, "database")
+    os.environ["STORAGE_BACKEND"] = "json"
+    # Write-through so the "large write" includes the disk flush
+    os.environ["DB_COMMIT_WINDOW_MS"] = "0"
+    # No Ollama needed; don't hold up startup on model warm-up
+    os.environ["WARMUP_IN_BACKGROUND"] = "true"
+    return root
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def _run_mode(mode: str, client, token: str, rows, requests: int) -> dict:
+    from app.core.executors import run_db
+    from app.db.session import save_document_db
+
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+
+    async def timed_get():
+        start = time.perf_counter()
+        response = await client.get("/api/chat/", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+    async def large_write():
+        if mode == "inline":
+            save_document_db(rows)
+        else:
+            await run_db(save_document_db, rows)
+
+    write_task = asyncio.create_task(large_write())
+    # Let the write get going before the readers arrive
+    await asyncio.sleep(0)
+    write_start = time.perf_counter()
+    await asyncio.gather(*(timed_get() for _ in range(requests)))
+    await write_task
+    return {
+        "mode": mode,
+        "write_seconds": time.perf_counter() - write_start,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in the large write")
+    parser.add_argument("--requests", type=int, default=200, help="concurrent GET /api/chat/ calls")
+    parser.add_argument("--chats", type=int, default=100, help="chats owned by the benchmark user")
+    args = parser.parse_args(argv)
+
+    root = _configure_environment()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from main import app
+
+    # ASGITransport doesn't drive the lifespan, so run startup/shutdown here
+    async with app.router.lifespan_context(app):
+        return await _run_benchmark(app, args, root)
+
+async def _run_benchmark(app, args, root) -> int:
+    import httpx
+    from app.core.security import create_access_token
+    from app.services.auth_service import create_user
+    from app.services.chat_service import create_chat
+
+    user = create_user(f"bench{uuid.uuid4().hex[:6]}", "bench@experteye.com", "Benchmark1")
+    for _ in range(args.chats):
+        create_chat(user["id"])
+    token = create_access_token({"sub": user["username"]})
+
+    now = datetime.utcnow().isoformat()
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user["id"],
+            "filename": f"report-{i}.pdf",
+            "file_path": f"/tmp/report-{i}.pdf",
+            "file_size": 1024,
+            "mime_type": "application/pdf",
+            "created_at": now,
+            "processed": False,
+            "processing_status": "pending",
+        }
+        for i in range(args.rows)
+    ]
+
+    print(f"Scratch database: {root}")
+    print(f"{'mode':<10}{'write s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up routing, auth and the thread pools
+        await _run_mode("executor", client, token, rows[:10], 10)
+        for mode in ("inline", "executor"):
+            result = await _run_mode(mode, client, token, rows, args.requests)
+            print(f"{result['mode']:<10}{result['write_seconds']:>10.2f}{result['p50_ms']:>10.1f}"
+                  f"{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,123 @@
+"""Extraction throughput of the native DOCX/XLSX/PPTX extractors against the
+Unstructured loaders on the same files.
+
+Generates a Word document (--paragraphs paragraphs under headings, plus a
+table), an Excel workbook (--rows rows) and a PowerPoint deck (--slides
+slides), or measures the files given with --docx/--xlsx/--pptx. For each file
+it reports seconds, extracted characters and the speed-up of the native
+extractor. The Unstructured column shows n/a when the unstructured package
+is not installed.
+
+Usage (from experteye-backend/):
+    python -m benchmarks.bench_office_extraction --paragraphs 5000 --rows 50000 --slides 300
+    python -m benchmarks.bench_office_extraction --docx protocol.docx --repeat 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SENTENCE = ("The sponsor reviewed the interim safety data and agreed that enrolment can continue "
+            "under the amended protocol without changes to the visit schedule. ")
+
+def _make_docx(path: str, paragraphs: int) -> None:
+    import docx
+
+    document = docx.Document()
+    for number in range(paragraphs):
+        if number % 20 == 0:
+            document.add_heading(f"Section {number // 20 + 1}", level=1)
+        document.add_paragraph(SENTENCE * 2)
+    table = document.add_table(rows=20, cols=4)
+    for row_number, row in enumerate(table.rows):
+        for col_number, cell in enumerate(row.cells):
+            cell.text = f"r{row_number}c{col_number}"
+    document.save(path)
+
+def _make_xlsx(path: str, rows: int) -> None:
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Visits")
+    sheet.append(["subject", "visit", "date", "systolic", "diastolic", "comment"])
+    for number in range(rows):
+        sheet.append([f"S{number % 500:04d}", number % 12, "2024-03-01", 120 + number % 30, 80 + number % 15, "no findings"])
+    workbook.save(path)
+
+def _make_pptx(path: str, slides: int) -> None:
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    for number in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Finding {number + 1}"
+        slide.placeholders[1].text = SENTENCE * 2
+        slide.shapes.add_textbox(Inches(1), Inches(5), Inches(6), Inches(1)).text_frame.text = SENTENCE
+        slide.notes_slide.notes_text_frame.text = "Discuss with the safety board."
+    presentation.save(path)
+
+def _unstructured_loader(kind: str):
+    try:
+        from langchain_community.document_loaders import (
+            UnstructuredExcelLoader,
+            UnstructuredPowerPointLoader,
+            UnstructuredWordDocumentLoader
+        )
+        import unstructured  # noqa: F401
+    except ImportError:
+        return None
+    return {"docx": UnstructuredWordDocumentLoader, "xlsx": UnstructuredExcelLoader, "pptx": UnstructuredPowerPointLoader}[kind]
+
+def _best(run, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docx", help="Word document to extract (default: generate one)")
+    parser.add_argument("--xlsx", help="Excel workbook to extract (default: generate one)")
+    parser.add_argument("--pptx", help="PowerPoint deck to extract (default: generate one)")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="paragraphs in the generated document")
+    parser.add_argument("--rows", type=int, default=20000, help="rows in the generated workbook")
+    parser.add_argument("--slides", type=int, default=200, help="slides in the generated deck")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per extractor (best is reported)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.rag.processors.office_extraction import iter_docx, iter_pptx, iter_xlsx
+
+    root = tempfile.mkdtemp(prefix="experteye-bench-")
+    files = {
+        "docx": (args.docx, _make_docx, args.paragraphs, iter_docx),
+        "xlsx": (args.xlsx, _make_xlsx, args.rows, iter_xlsx),
+        "pptx": (args.pptx, _make_pptx, args.slides, iter_pptx),
+    }
+
+    print(f"{'file':>6}{'native s':>10}{'docs':>7}{'chars':>11}{'unstructured s':>16}{'chars':>11}{'speed-up':>10}")
+    for kind, (path, make, size, extract) in files.items():
+        if path is None:
+            path = os.path.join(root, f"synthetic.{kind}")
+            make(path, size)
+
+        native_seconds, documents = _best(lambda: list(extract(path, os.path.basename(path))), args.repeat)
+        native_chars = sum(len(doc.page_content) for doc in documents)
+        line = f"{kind:>6}{native_seconds:>10.2f}{len(documents):>7}{native_chars:>11}"
+
+        loader = _unstructured_loader(kind)
+        if loader is None:
+            print(f"{line}{'n/a':>16}{'':>11}{'':>10}")
+            continue
+        loader_seconds, loaded = _best(lambda: loader(path).load(), args.repeat)
+        loaded_chars = sum(len(doc.page_content) for doc in loaded)
+        print(f"{line}{loader_seconds:>16.2f}{loaded_chars:>11}{loader_seconds / native_seconds:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""PDF extraction throughput (pages/second) against the number of worker processes.
+
+Extracts the same PDF with process_pdf at increasing PDF_PAGE_WORKERS counts
+(1, 2, 4, ... up to the CPU count) and reports pages per second and the
+speed-up over a single process. Without --pdf a synthetic text PDF of --pages
+pages is generated with PyMuPDF.
+
+Usage (from experteye-backend/):
+    python -m benchmarks.bench_pdf_extraction --pages 1000
+    python -m benchmarks.bench_pdf_extraction --pdf contract.pdf --repeat 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+def _make_pdf(path: str, pages: int) -> None:
+    import fitz
+
+    paragraph = ("This agreement is entered into by the parties named below and sets out the terms "
+                 "under which services are provided, invoiced and accepted. ") * 6
+    with fitz.open() as pdf:
+        for number in range(pages):
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Section {number + 1}\n\n{paragraph * 3}", fontsize=9)
+        pdf.save(path)
+
+def _worker_counts(limit: int):
+    count = 1
+    while count < limit:
+        yield count
+        count *= 2
+    yield limit
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to extract (default: generate one)")
+    parser.add_argument("--pages", type=int, default=500, help="pages in the generated PDF")
+    parser.add_argument("--pages-per-shard", type=int, default=50)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per worker count (best is reported)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.rag.processors.text_extraction import process_pdf
+
+    path = args.pdf
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="experteye-bench-"), "synthetic.pdf")
+        _make_pdf(path, args.pages)
+
+    print(f"PDF: {path}")
+    print(f"{'workers':>8}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'speed-up':>10}")
+    baseline = None
+    for workers in _worker_counts(args.max_workers):
+        # The first call per worker count also pays for starting the pool
+        process_pdf(path, os.path.basename(path), max_workers=workers, pages_per_shard=args.pages_per_shard)
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            documents = process_pdf(path, os.path.basename(path), max_workers=workers, pages_per_shard=args.pages_per_shard)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        pages_per_second = len(documents) / best if best else 0.0
+        baseline = baseline or pages_per_second
+        print(f"{workers:>8}{len(documents):>8}{best:>10.2f}{pages_per_second:>10.1f}"
+              f"{pages_per_second / baseline if baseline else 0:>9.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
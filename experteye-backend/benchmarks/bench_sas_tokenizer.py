@@ -0,0 +1,182 @@
+"""Throughput and accuracy of the SAS section tokenizer on generated programs.
+
+Generates SAS programs of --lines lines built from a fixed mix of blocks:
+DATA steps (some with in-stream data), PROCs, PROC SQL with quoted
+semicolons, macro definitions with nested steps, macro calls, global
+statements, and block and "*" comments that contain decoy DATA/PROC code.
+The number of real sections is known by construction.
+
+For each size it reports MB/s and the sections found by
+
+  line parser   the previous line-by-line parser (lowercases and splits
+                every line; sees DATA/PROC inside comments and strings)
+  tokenizer     iter_sas_sections, the single-pass byte scanner
+  parse_sas_code  the tokenizer plus content decoding and symbol extraction
+
+"expected" is the number of PROC, DATA step and macro sections in the
+program; "other" sections (code between them) are not counted.
+
+Usage (from experteye-backend/):
+    python -m benchmarks.bench_sas_tokenizer --lines 50000,200000
+    python -m benchmarks.bench_sas_tokenizer --file analysis.sas --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+BLOCKS = [
+    # (code, real PROC/DATA/macro sections in it)
+    ("""/* Derive the population.
+   data decoy; set nothing; run;  */
+data work.adsl_{n} (keep=usubjid age sex) work.rejects_{n};
+    set raw.dm(where=(age >= 18)) raw.ex;
+    length note $ 40;
+    note = "proc print; data x;";
+    if age > 65 then output work.rejects_{n};
+    else output work.adsl_{n};
+run;
+""", 1),
+    ("""proc sort data=work.adsl_{n} out=work.sorted_{n} nodupkey;
+    by usubjid;
+run;
+
+* proc print data=work.sorted_{n}; run;
+""", 1),
+    ("""proc sql noprint;
+    create table adam.adae_{n} as
+    select a.*, b.age from raw.ae a left join work.adsl_{n} b
+    on a.usubjid = b.usubjid and a.term ne 'run; quit;';
+    run;
+quit;
+""", 1),
+    ("""%macro summarize_{n}(ds=, var=);
+    %* data commented; set out; run;
+    proc means data=&ds noprint;
+        var &var;
+        output out=stats_&var mean=m;
+    run;
+    data final_{n}; set stats_&var; run;
+%mend summarize_{n};
+
+%summarize_{n}(ds=work.sorted_{n}, var=age)
+""", 1),
+    ("""options nodate nonumber;
+libname adam '/data/adam';
+%let cutoff = '01JAN2024'd;
+data lookup_{n};
+    infile datalines dsd;
+    input code $ label $;
+    datalines;
+A, "proc not a step"
+B, data; run;
+;
+run;
+""", 1),
+]
+
+def generate_program(lines: int) -> tuple:
+    """A SAS program of about ``lines`` lines and its number of real sections"""
+    parts = []
+    expected = 0
+    total = 0
+    n = 0
+    while total < lines:
+        code, sections = BLOCKS[n % len(BLOCKS)]
+        code = code.format(n=n)
+        parts.append(code)
+        expected += sections
+        total += code.count("\n")
+        n += 1
+    return "".join(parts).encode("utf-8"), expected
+
+def line_parser(content: str) -> list:
+    """The previous parse_sas_code (line based), kept as the baseline"""
+    code_sections = []
+    current_section = []
+    in_proc = False
+    proc_name = ""
+    for line in content.split('\n'):
+        line_lower = line.lower().strip()
+        if line_lower.startswith('proc '):
+            if in_proc and current_section:
+                code_sections.append({"type": "procedure", "name": proc_name, "content": "\n".join(current_section)})
+                current_section = []
+            in_proc = True
+            parts = line_lower.split()
+            proc_name = parts[1] if len(parts) > 1 else "unknown"
+            current_section.append(line)
+        elif line_lower.startswith('data '):
+            if in_proc and current_section:
+                code_sections.append({"type": "procedure", "name": proc_name, "content": "\n".join(current_section)})
+                current_section = []
+            in_proc = False
+            proc_name = ""
+            current_section.append(line)
+            code_sections.append({"type": "data_step", "content": line})
+        elif line_lower.startswith('quit;') or line_lower == 'run;':
+            current_section.append(line)
+            if in_proc:
+                code_sections.append({"type": "procedure", "name": proc_name, "content": "\n".join(current_section)})
+                current_section = []
+                in_proc = False
+                proc_name = ""
+        else:
+            current_section.append(line)
+    if current_section:
+        code_sections.append({
+            "type": "procedure" if in_proc else "other",
+            "name": proc_name,
+            "content": "\n".join(current_section)
+        })
+    return code_sections
+
+def _best(run, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _counted(sections) -> int:
+    return sum(1 for section in sections if section["type"] != "other")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="50000,200000", help="comma-separated sizes of the generated programs")
+    parser.add_argument("--file", help="measure this SAS program instead (expected count unknown)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per parser (best is reported)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.rag.processors.sas_processor import parse_sas_code
+    from app.rag.processors.sas_tokenizer import iter_sas_sections
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            programs = [(args.file, f.read(), None)]
+    else:
+        programs = []
+        for lines in (int(value) for value in args.lines.split(",")):
+            data, expected = generate_program(lines)
+            programs.append((f"{lines} lines", data, expected))
+
+    parsers = [
+        ("line parser", lambda data: line_parser(data.decode("utf-8", "replace"))),
+        ("tokenizer", lambda data: list(iter_sas_sections(data))),
+        ("parse_sas_code", parse_sas_code),
+    ]
+    print(f"{'program':>16}{'MB':>7}{'expected':>10}  " + "".join(f"{name + ' MB/s':>22}{'found':>8}" for name, _ in parsers))
+    for label, data, expected in programs:
+        megabytes = len(data) / (1024 * 1024)
+        line = f"{label:>16}{megabytes:>7.1f}{expected if expected is not None else '?':>10}  "
+        for _, parse in parsers:
+            seconds, sections = _best(lambda: parse(data), args.repeat)
+            line += f"{megabytes / seconds:>22.1f}{_counted(sections):>8}"
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Peak ingestion memory (tracemalloc) of materialized against streamed extraction.
+
+For text files of increasing size, measures the Python heap peak of
+
+  materialized  extract the whole file into a list of Documents, keep the
+                joined full text and split everything into one chunk list
+                (what ingestion used to do)
+  streaming     extract_and_spool (pages streamed through the chunker into a
+                spool file), then reading the spool back in batches of
+                --batch-size chunks as the embedding stage does
+
+The streaming peak should stay flat as the file grows; the materialized one
+grows with it. Use --file to measure one existing file of any supported type.
+
+Usage (from experteye-backend/):
+    python -m benchmarks.bench_streaming_memory --sizes 4,16,64
+    python -m benchmarks.bench_streaming_memory --file clinical_report.pdf
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from itertools import islice
+
+def _make_text(path: str, megabytes: int) -> None:
+    line = "Subject 0001 completed visit 3 with no adverse events reported by the investigator.\n"
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(megabytes * 1024 * 1024 // len(line)):
+            f.write(line)
+
+def _peak_mb(run) -> float:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4,16,64", help="comma-separated text file sizes in MiB")
+    parser.add_argument("--file", help="measure this file instead of generated text files")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per embedding batch")
+    args = parser.parse_args(argv)
+
+    # No extraction cache: both paths must actually extract
+    os.environ["EXTRACTION_CACHE_DIR"] = ""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.rag.extraction_cache import iter_documents
+    from app.rag.processor_core import extract_and_spool, extract_document
+    from app.rag.processors.document_chunking import split_documents
+
+    root = tempfile.mkdtemp(prefix="experteye-bench-")
+    spool_path = os.path.join(root, "chunks.jsonl")
+
+    def materialized(path: str) -> None:
+        documents = extract_document(path, os.path.basename(path))
+        full_text = "\n\n".join(doc.page_content for doc in documents)
+        chunks = split_documents(documents, args.chunk_size, args.chunk_overlap)
+        del full_text, chunks
+
+    def streaming(path: str) -> None:
+        extract_and_spool(path, os.path.basename(path), spool_path, args.chunk_size, args.chunk_overlap)
+        chunks = iter_documents(spool_path)
+        while list(islice(chunks, args.batch_size)):
+            pass
+
+    if args.file:
+        files = [(os.path.getsize(args.file) / (1024 * 1024), args.file)]
+    else:
+        files = []
+        for size in (int(value) for value in args.sizes.split(",")):
+            path = os.path.join(root, f"synthetic-{size}mb.txt")
+            _make_text(path, size)
+            files.append((size, path))
+
+    print(f"{'file MiB':>9}{'materialized MiB':>18}{'streaming MiB':>15}")
+    for size, path in files:
+        print(f"{size:>9.1f}{_peak_mb(lambda: materialized(path)):>18.1f}{_peak_mb(lambda: streaming(path)):>15.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,64 @@
 
 import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.api.api import api_router
-from app.db.session import init_db
-from app.services.auth_service import ensure_admin_user_exists, update_existing_users
+import asyncio
+from contextlib import asynccontextmanager
+from app.core.startup import startup_report
 
-# Initialize the database
-init_db()
+# Import cost per subsystem; document extraction, SAS and LLM backends are
+# imported on first use, so they don't show up here
+with startup_report.stage("import fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+with startup_report.stage("import storage"):
+    from app.db.session import init_db, close_db
+    from app.core.executors import run_db, shutdown_executors
+    from app.core.readiness import readiness
+    from app.core.config import settings
+with startup_report.stage("import services"):
+    from app.services.auth_service import ensure_admin_user_exists, update_existing_users
+    from app.services.rag_service import warm_up
+with startup_report.stage("import api"):
+    from app.api.api import api_router
 
-# Create admin user on startup
-ensure_admin_user_exists()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize the database
+    with startup_report.stage("init storage"):
+        await readiness.run("storage", run_db(init_db))
+    
+    # Create admin user on startup
+    with startup_report.stage("admin user"):
+        ensure_admin_user_exists()
+    
+    # Update existing users with plain_password field
+    with startup_report.stage("user migration"):
+        update_existing_users()
+    
+    # Vector index and models. In the background the server takes requests
+    # (liveness is green) while /api/readiness keeps answering 503
+    app.state.warmup_task = None
+    if settings.WARMUP_IN_BACKGROUND:
+        app.state.warmup_task = asyncio.create_task(warm_up(retry_seconds=settings.WARMUP_RETRY_SECONDS))
+    else:
+        with startup_report.stage("warm-up"):
+            ready = await warm_up()
+        if not ready:
+            app.state.warmup_task = asyncio.create_task(warm_up(retry_seconds=settings.WARMUP_RETRY_SECONDS))
+    
+    startup_report.log()
+    app.state.startup_report = startup_report
+    
+    yield
+    
+    if app.state.warmup_task is not None:
+        app.state.warmup_task.cancel()
+    
+    # Flush pending writes before the worker pools go away
+    close_db()
+    shutdown_executors()
 
-# Update existing users with plain_password field
-update_existing_users()
-
-app = FastAPI(title="ExpertEye API")
+app = FastAPI(title="ExpertEye API", lifespan=lifespan)
 
 # Configure CORS - include all relevant origins
 origins = [
@@ -47,6 +90,13 @@ app.include_router(api_router, prefix="/api")
 async def healthcheck():
     return {"status": "healthy", "message": "API server is running"}
 
+# Readiness for load balancers: 503 until storage, vector index and models are warm
+@app.get("/api/readiness")
+async def readiness_check():
+    report = readiness.as_dict()
+    report["startup"] = startup_report.as_dict()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,118 @@
+
+"""Group commit of JSON collections by WriteBehindWriter, and the flush_db barrier"""
+import json
+import time
+
+import pytest
+
+from app.db import session
+from app.db.repository import JsonCollection
+from app.db.writer import WriteBehindWriter
+
+def _collection(tmp_path, name: str, writer: WriteBehindWriter) -> JsonCollection:
+    collection = JsonCollection(str(tmp_path / f"{name}.json"), writer=writer)
+    collection.ensure_file()
+    collection.load()
+    return collection
+
+def _rows_on_disk(collection: JsonCollection) -> list:
+    with open(collection.path) as f:
+        return json.load(f)
+
+def _insert(collection: JsonCollection, count: int) -> None:
+    for number in range(count):
+        collection.insert({"id": f"row-{number}", "created_at": f"2024-01-01T00:00:{number:02d}"})
+
+def _wait_until_flushed(writer: WriteBehindWriter, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while writer.get_metrics()["pending_mutations"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+class FailingTarget:
+    path = "unwritable.json"
+
+    def persist(self) -> None:
+        raise OSError("disk full")
+
+@pytest.fixture
+def writer():
+    writer = WriteBehindWriter(window=0.1)
+    yield writer
+    writer.close(timeout=1.0)
+
+def test_mutations_within_the_window_are_written_once(tmp_path, writer):
+    users = _collection(tmp_path, "users", writer)
+    _insert(users, 20)
+    _wait_until_flushed(writer)
+
+    metrics = writer.get_metrics()
+    assert metrics["mutations"] == 20
+    assert metrics["flushes"] == 1
+    assert metrics["files_written"] == 1
+    assert metrics["max_batch_size"] == 20
+    assert len(_rows_on_disk(users)) == 20
+
+def test_flush_makes_scheduled_writes_durable(tmp_path):
+    writer = WriteBehindWriter(window=60.0)
+    users = _collection(tmp_path, "users", writer)
+    _insert(users, 3)
+    # Still inside the window: nothing written yet
+    assert _rows_on_disk(users) == []
+
+    assert writer.flush(timeout=5.0)
+    assert [row["id"] for row in _rows_on_disk(users)] == ["row-0", "row-1", "row-2"]
+    assert writer.get_metrics()["pending_mutations"] == 0
+    writer.close(timeout=1.0)
+
+def test_flush_db_waits_for_the_session_writer(tmp_path, monkeypatch):
+    writer = WriteBehindWriter(window=60.0)
+    monkeypatch.setattr(session, "db_writer", writer)
+    chats = _collection(tmp_path, "chats", writer)
+    _insert(chats, 2)
+
+    assert session.flush_db(timeout=5.0)
+    assert len(_rows_on_disk(chats)) == 2
+    writer.close(timeout=1.0)
+
+def test_close_drains_pending_writes(tmp_path):
+    writer = WriteBehindWriter(window=60.0)
+    users = _collection(tmp_path, "users", writer)
+    _insert(users, 5)
+
+    start = time.monotonic()
+    writer.close(timeout=5.0)
+    assert time.monotonic() - start < 5.0
+    assert len(_rows_on_disk(users)) == 5
+
+    # After close there is no background thread: mutations write through
+    users.insert({"id": "late", "created_at": "2024-01-02T00:00:00"})
+    assert len(_rows_on_disk(users)) == 6
+
+def test_close_gives_up_on_a_target_that_keeps_failing(tmp_path):
+    writer = WriteBehindWriter(window=0.01)
+    writer.schedule(FailingTarget())
+
+    start = time.monotonic()
+    writer.close(timeout=0.3)
+    # The flush barrier times out, then the thread join is bounded too
+    assert time.monotonic() - start < 5.0
+    metrics = writer.get_metrics()
+    assert metrics["flush_errors"] >= 1
+    assert metrics["pending_mutations"] == 1
+    assert metrics["files_written"] == 0
+
+def test_metrics_count_files_and_fsyncs_per_flush(tmp_path, writer):
+    users = _collection(tmp_path, "users", writer)
+    chats = _collection(tmp_path, "chats", writer)
+    _insert(users, 4)
+    _insert(chats, 6)
+    assert writer.flush(timeout=5.0)
+
+    metrics = writer.get_metrics()
+    assert metrics["mutations"] == 10
+    assert metrics["flushes"] == 1
+    assert metrics["files_written"] == 2
+    assert metrics["fsyncs"] == 2
+    assert metrics["flush_errors"] == 0
+    assert metrics["pending_mutations"] == 0
+    assert metrics["window_seconds"] == 0.1
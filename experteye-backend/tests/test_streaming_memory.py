@@ -0,0 +1,48 @@
+
+"""Peak memory of streamed ingestion, as in benchmarks/bench_streaming_memory.py:
+extract_and_spool, then the spool read back in embedding batches"""
+import tracemalloc
+from itertools import islice
+
+import pytest
+
+from app.rag import processor_core
+from app.rag.extraction_cache import iter_documents
+
+MIB = 1024 * 1024
+LINE = "Subject 0001 completed visit 3 with no adverse events reported by the investigator.\n"
+
+@pytest.fixture(autouse=True)
+def no_extraction_cache(monkeypatch):
+    # Every run has to extract
+    monkeypatch.setattr(processor_core, "extraction_cache", None)
+
+def _text_file(path, megabytes: int) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(megabytes * MIB // len(LINE)):
+            f.write(LINE)
+    return str(path)
+
+def _streaming_peak(tmp_path, file_path: str, batch_size: int) -> int:
+    spool_path = str(tmp_path / "chunks.jsonl")
+    tracemalloc.start()
+    try:
+        processor_core.extract_and_spool(file_path, "report.txt", spool_path, 500, 100)
+        chunks = iter_documents(spool_path)
+        while list(islice(chunks, batch_size)):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_peak_does_not_grow_with_file_size(tmp_path):
+    small = _streaming_peak(tmp_path, _text_file(tmp_path / "small.txt", 1), 32)
+    large = _streaming_peak(tmp_path, _text_file(tmp_path / "large.txt", 4), 32)
+    assert large < small * 1.25 + MIB // 8
+    assert large < 4 * MIB // 4
+
+def test_peak_grows_with_batch_size(tmp_path):
+    file_path = _text_file(tmp_path / "report.txt", 1)
+    small_batches = _streaming_peak(tmp_path, file_path, 32)
+    large_batches = _streaming_peak(tmp_path, file_path, 1024)
+    assert large_batches > 2 * small_batches
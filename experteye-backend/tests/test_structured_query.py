@@ -0,0 +1,51 @@
+
+"""Validation and results of structured dataset queries"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.rag.structured_query import build_answer_prompt, run_dataset_query, validate_query
+
+SCHEMA = {
+    "label": "visits",
+    "rows": 30,
+    "columns": [
+        {"name": "subject", "type": "string"},
+        {"name": "visit", "type": "int64"},
+        {"name": "site", "type": "string"},
+    ],
+}
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    path = str(tmp_path / "visits.parquet")
+    pq.write_table(pa.table({
+        "subject": [f"S{number:02d}" for number in range(30)],
+        "visit": [number % 3 for number in range(30)],
+        "site": ["A" if number % 2 else "B" for number in range(30)],
+    }), path)
+    return path
+
+def test_repeated_columns_are_returned_once(parquet_path):
+    query = validate_query({"columns": ["subject", "visit", "subject"], "limit": 2}, SCHEMA)
+    assert query["columns"] == ["subject", "visit"]
+
+    result = run_dataset_query(parquet_path, query)
+    assert result["columns"] == ["subject", "visit"]
+    assert result["rows"] == [["S00", 0], ["S01", 1]]
+
+def test_row_count_is_the_number_of_rows_returned(parquet_path):
+    query = validate_query({"filters": [["visit", "==", 1]], "limit": 4}, SCHEMA)
+    result = run_dataset_query(parquet_path, query)
+    assert result["row_count"] == len(result["rows"]) == 4
+    assert result["total_rows"] == result["matched_rows"] == 10
+    assert result["truncated"]
+    assert "Result (4 rows of 10, first rows shown)" in build_answer_prompt("?", SCHEMA, query, result)
+
+def test_grouped_result_counts(parquet_path):
+    query = validate_query({"group_by": ["site", "site"], "order_by": [["site", "asc"]]}, SCHEMA)
+    result = run_dataset_query(parquet_path, query)
+    assert result["columns"] == ["site", "count"]
+    assert result["rows"] == [["A", 15], ["B", 15]]
+    assert result["row_count"] == result["total_rows"] == 2
+    assert not result["truncated"]